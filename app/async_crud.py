@@ -0,0 +1,337 @@
+from datetime import datetime, timezone
+from typing import Dict, Any
+
+from sqlalchemy import select, update
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import selectinload
+
+from app.branch_filter import compile_branch_filter
+from app.chat_cache import ChatRef, chat_cache
+from app.metrics import Histogram, timed
+from app.models import Chat, Repo, Subscription, PRThread, WorkflowRunMessage
+from app.rollups import digest_rollup_query, summarize
+from app.routing import bump_routing_version, routing_index
+
+CRUD_SECONDS = Histogram(
+    "notifier_crud_seconds",
+    "Time spent in async_crud functions, including DB round trips",
+    ["function"],
+)
+
+
+@timed(CRUD_SECONDS)
+async def get_or_create_chat(
+    db: AsyncSession,
+    telegram_chat_id: int,
+    title: str | None = None,
+) -> Chat:
+    chat = (
+        await db.execute(select(Chat).where(Chat.telegram_chat_id == telegram_chat_id))
+    ).scalar_one_or_none()
+
+    if chat:
+        if title and chat.title != title:
+            chat.title = title
+            db.add(chat)
+            await db.commit()
+        return chat
+
+    chat = Chat(
+        telegram_chat_id=telegram_chat_id,
+        title=title,
+    )
+    db.add(chat)
+    await db.commit()
+    return chat
+
+
+@timed(CRUD_SECONDS)
+async def resolve_chat(
+    db: AsyncSession,
+    telegram_chat_id: int,
+    title: str | None = None,
+) -> ChatRef:
+    cached = chat_cache.get(telegram_chat_id)
+    if cached is not None:
+        if title and cached.title != title:
+            await db.execute(update(Chat).where(Chat.id == cached.id).values(title=title))
+            await db.commit()
+            cached = chat_cache.put(cached._replace(title=title))
+        return cached
+
+    chat = await get_or_create_chat(db, telegram_chat_id=telegram_chat_id, title=title)
+    return chat_cache.put(ChatRef(chat.id, chat.telegram_chat_id, chat.title))
+
+
+@timed(CRUD_SECONDS)
+async def get_repo_by_full_name(db: AsyncSession, full_name: str) -> Repo | None:
+    return (
+        await db.execute(select(Repo).where(Repo.full_name == full_name.strip()))
+    ).scalar_one_or_none()
+
+
+@timed(CRUD_SECONDS)
+async def get_or_create_repo(db: AsyncSession, full_name: str) -> Repo:
+    full_name = full_name.strip()
+    repo = await get_repo_by_full_name(db, full_name)
+
+    if repo:
+        return repo
+
+    owner = None
+    name = None
+    if "/" in full_name:
+        owner, name = full_name.split("/", 1)
+
+    repo = Repo(
+        provider="github",
+        owner=owner,
+        name=name,
+        full_name=full_name,
+    )
+    db.add(repo)
+    await db.commit()
+    return repo
+
+
+async def _get_subscription(db: AsyncSession, chat_db_id: int, repo_db_id: int) -> Subscription | None:
+    return (
+        await db.execute(
+            select(Subscription).where(
+                Subscription.chat_id == chat_db_id,
+                Subscription.repo_id == repo_db_id,
+            )
+        )
+    ).scalar_one_or_none()
+
+
+@timed(CRUD_SECONDS)
+async def subscribe_chat_to_repo(db: AsyncSession, chat: Chat | ChatRef, repo: Repo) -> Subscription:
+    sub = await _get_subscription(db, chat.id, repo.id)
+
+    if sub:
+        if not sub.is_active:
+            sub.is_active = True
+            db.add(sub)
+            await db.execute(bump_routing_version())
+            await db.commit()
+    else:
+        sub = Subscription(
+            chat_id=chat.id,
+            repo_id=repo.id,
+            is_active=True,
+        )
+        db.add(sub)
+        await db.execute(bump_routing_version())
+        await db.commit()
+
+    routing_index.upsert(
+        repo.full_name,
+        chat_tg_id=chat.telegram_chat_id,
+        chat_db_id=chat.id,
+        repo_db_id=repo.id,
+        branches=sub.branches,
+    )
+    return sub
+
+
+@timed(CRUD_SECONDS)
+async def get_subscriptions_for_chat(db: AsyncSession, chat: Chat | ChatRef) -> list[Subscription]:
+    subs = (
+        await db.execute(
+            select(Subscription)
+            .options(selectinload(Subscription.repo))
+            .where(
+                Subscription.chat_id == chat.id,
+                Subscription.is_active.is_(True),
+            )
+        )
+    ).scalars().all()
+    return list(subs)
+
+
+@timed(CRUD_SECONDS)
+async def unsubscribe_chat_from_repo(db: AsyncSession, chat: Chat | ChatRef, full_name: str) -> bool:
+    repo = await get_repo_by_full_name(db, full_name)
+    if not repo:
+        return False
+
+    sub = await _get_subscription(db, chat.id, repo.id)
+    if not sub or not sub.is_active:
+        return False
+
+    sub.is_active = False
+    db.add(sub)
+    await db.execute(bump_routing_version())
+    await db.commit()
+    routing_index.remove(repo.full_name, chat.id)
+    return True
+
+
+@timed(CRUD_SECONDS)
+async def set_branches_for_subscription(
+    db: AsyncSession,
+    chat: Chat | ChatRef,
+    full_name: str,
+    branches: str,
+) -> bool:
+    compile_branch_filter(branches.strip())
+
+    repo = await get_repo_by_full_name(db, full_name)
+    if not repo:
+        return False
+
+    sub = await _get_subscription(db, chat.id, repo.id)
+    if not sub:
+        return False
+
+    sub.branches = branches.strip()
+    db.add(sub)
+    await db.execute(bump_routing_version())
+    await db.commit()
+    if sub.is_active:
+        routing_index.upsert(
+            repo.full_name,
+            chat_tg_id=chat.telegram_chat_id,
+            chat_db_id=chat.id,
+            repo_db_id=repo.id,
+            branches=sub.branches,
+        )
+    return True
+
+
+@timed(CRUD_SECONDS)
+async def get_digest_rollup_for_chat(
+    db: AsyncSession,
+    chat: Chat | ChatRef,
+    hours: int = 24,
+) -> list[Dict[str, Any]]:
+    rows = (await db.execute(digest_rollup_query(chat.id, hours))).all()
+    return summarize(rows)
+
+
+@timed(CRUD_SECONDS)
+async def set_digest_schedule(
+    db: AsyncSession,
+    chat: Chat | ChatRef,
+    digest_time: str | None,
+    digest_timezone: str | None = None,
+) -> None:
+    await db.execute(
+        update(Chat)
+        .where(Chat.id == chat.id)
+        .values(
+            digest_time=digest_time,
+            digest_timezone=digest_timezone,
+            last_digest_at=datetime.now(timezone.utc) if digest_time else None,
+        )
+    )
+    await db.commit()
+
+
+@timed(CRUD_SECONDS)
+async def get_scheduled_chats(db: AsyncSession) -> list[Chat]:
+    return list(
+        (await db.execute(select(Chat).where(Chat.digest_time.is_not(None)))).scalars().all()
+    )
+
+
+@timed(CRUD_SECONDS)
+async def mark_digests_sent(db: AsyncSession, chat_db_ids: list[int], sent_at: datetime) -> None:
+    if not chat_db_ids:
+        return
+    await db.execute(
+        update(Chat).where(Chat.id.in_(chat_db_ids)).values(last_digest_at=sent_at)
+    )
+    await db.commit()
+
+
+@timed(CRUD_SECONDS)
+async def save_pr_thread_for_ids(
+    db: AsyncSession,
+    chat_db_id: int,
+    repo_db_id: int,
+    pr_number: int,
+    root_message_id: int,
+) -> None:
+    thread = (
+        await db.execute(
+            select(PRThread).where(
+                PRThread.chat_id == chat_db_id,
+                PRThread.repo_id == repo_db_id,
+                PRThread.pr_number == pr_number,
+            )
+        )
+    ).scalar_one_or_none()
+
+    if thread:
+        thread.root_message_id = root_message_id
+    else:
+        thread = PRThread(
+            chat_id=chat_db_id,
+            repo_id=repo_db_id,
+            pr_number=pr_number,
+            root_message_id=root_message_id,
+        )
+    db.add(thread)
+    await db.commit()
+
+
+@timed(CRUD_SECONDS)
+async def get_pr_thread_root_message_id(
+    db: AsyncSession,
+    chat_db_id: int,
+    repo_db_id: int,
+    pr_number: int,
+) -> int | None:
+    return (
+        await db.execute(
+            select(PRThread.root_message_id).where(
+                PRThread.chat_id == chat_db_id,
+                PRThread.repo_id == repo_db_id,
+                PRThread.pr_number == pr_number,
+            )
+        )
+    ).scalar_one_or_none()
+
+
+@timed(CRUD_SECONDS)
+async def get_workflow_run_message(
+    db: AsyncSession,
+    chat_db_id: int,
+    run_id: int,
+) -> WorkflowRunMessage | None:
+    return (
+        await db.execute(
+            select(WorkflowRunMessage).where(
+                WorkflowRunMessage.chat_id == chat_db_id,
+                WorkflowRunMessage.run_id == run_id,
+            )
+        )
+    ).scalar_one_or_none()
+
+
+@timed(CRUD_SECONDS)
+async def save_workflow_run_message(
+    db: AsyncSession,
+    chat_db_id: int,
+    run_id: int,
+    message_id: int,
+    status: str,
+    text_hash: str,
+) -> None:
+    record = await get_workflow_run_message(db, chat_db_id, run_id)
+    if record:
+        record.message_id = message_id
+        record.status = status
+        record.text_hash = text_hash
+    else:
+        record = WorkflowRunMessage(
+            chat_id=chat_db_id,
+            run_id=run_id,
+            message_id=message_id,
+            status=status,
+            text_hash=text_hash,
+        )
+    db.add(record)
+    await db.commit()
@@ -1,6 +1,14 @@
 from aiogram import Bot, Dispatcher
+from aiogram.client.session.aiohttp import AiohttpSession
+from aiogram.client.telegram import TelegramAPIServer
 
-from app.config import TELEGRAM_BOT_TOKEN
+from app.config import TELEGRAM_API_BASE_URL, TELEGRAM_BOT_TOKEN
 
-bot = Bot(token=TELEGRAM_BOT_TOKEN)
-dp = Dispatcher()
\ No newline at end of file
+session = (
+    AiohttpSession(api=TelegramAPIServer.from_base(TELEGRAM_API_BASE_URL))
+    if TELEGRAM_API_BASE_URL
+    else None
+)
+
+bot = Bot(token=TELEGRAM_BOT_TOKEN, session=session)
+dp = Dispatcher()
@@ -0,0 +1,245 @@
+import re
+from functools import lru_cache
+from re import _parser as sre_parse
+from typing import Callable, Iterable
+
+from app.config import BRANCH_FILTER_CACHE_SIZE
+
+BranchMatcher = Callable[[str], bool]
+
+REGEX_PREFIX = "re:"
+GLOB_CHARS = frozenset("*?[")
+
+# Filters run on every webhook in the shared delivery loop, so user regexes are
+# limited to a subset without catastrophic backtracking: no backreferences,
+# lookarounds or named groups, no quantifier or alternation under a repeat, and
+# at most MAX_PATTERN_REPEATS repeats (each adds a factor of the branch length).
+MAX_REGEX_LENGTH = 100
+MAX_PATTERN_REPEATS = 3
+LEADING_FLAGS_RE = re.compile(r"^\(\?([a-zA-Z]+)\)")
+SCOPED_FLAGS = frozenset("ims")
+REPEAT_OPS = frozenset(
+    {sre_parse.MAX_REPEAT, sre_parse.MIN_REPEAT, sre_parse.POSSESSIVE_REPEAT}
+)
+FORBIDDEN_OPS = {
+    sre_parse.GROUPREF: "backreferences",
+    sre_parse.GROUPREF_EXISTS: "conditional groups",
+    sre_parse.ASSERT: "lookarounds",
+    sre_parse.ASSERT_NOT: "lookarounds",
+}
+
+
+class PrefixTrie:
+    def __init__(self, prefixes: Iterable[str] = ()) -> None:
+        self.root: dict = {}
+        self.size = 0
+        for prefix in prefixes:
+            self.add(prefix)
+
+    def add(self, prefix: str) -> None:
+        node = self.root
+        for ch in prefix:
+            node = node.setdefault(ch, {})
+        if None not in node:
+            node[None] = True
+            self.size += 1
+
+    def has_prefix_of(self, value: str) -> bool:
+        node = self.root
+        if None in node:
+            return True
+        for ch in value:
+            node = node.get(ch)
+            if node is None:
+                return False
+            if None in node:
+                return True
+        return False
+
+    def __len__(self) -> int:
+        return self.size
+
+
+def glob_to_regex(pattern: str) -> str:
+    out: list[str] = []
+    i = 0
+    n = len(pattern)
+    while i < n:
+        ch = pattern[i]
+        if ch == "*":
+            if pattern.startswith("**", i):
+                out.append(".*")
+                i += 2
+                continue
+            out.append("[^/]*")
+        elif ch == "?":
+            out.append("[^/]")
+        elif ch == "[":
+            end = pattern.find("]", i + 1)
+            if end == -1:
+                out.append(re.escape(ch))
+            else:
+                body = pattern[i + 1:end]
+                if body.startswith("!"):
+                    body = "^" + body[1:]
+                out.append("[" + body.replace("\\", "\\\\") + "]")
+                i = end + 1
+                continue
+        else:
+            out.append(re.escape(ch))
+        i += 1
+    return "".join(out)
+
+
+def _count_repeats(items, in_repeat: bool = False) -> int:
+    repeats = 0
+    for op, av in items:
+        if op in FORBIDDEN_OPS:
+            raise ValueError(f"{FORBIDDEN_OPS[op]} are not supported")
+        if op in REPEAT_OPS:
+            _, hi, sub = av
+            if hi > 1:
+                if in_repeat:
+                    raise ValueError("nested quantifiers are not supported")
+                repeats += 1
+            repeats += _count_repeats(sub, in_repeat or hi > 1)
+        elif op is sre_parse.BRANCH:
+            if in_repeat:
+                raise ValueError("alternation under a quantifier is not supported")
+            for branch in av[1]:
+                repeats += _count_repeats(branch, in_repeat)
+        elif op is sre_parse.SUBPATTERN:
+            repeats += _count_repeats(av[3], in_repeat)
+        elif op is sre_parse.ATOMIC_GROUP:
+            repeats += _count_repeats(av, in_repeat)
+    return repeats
+
+
+def safe_regex(regex: str, source: str | None = None) -> str:
+    source = source or regex
+    if len(source) > MAX_REGEX_LENGTH:
+        raise ValueError(f"Invalid branch pattern {source!r}: longer than {MAX_REGEX_LENGTH} characters")
+
+    # A leading (?i) would be illegal inside the combined alternation, so it
+    # becomes a scoped (?i:...) group.
+    match = LEADING_FLAGS_RE.match(regex)
+    if match:
+        if not SCOPED_FLAGS.issuperset(match.group(1)):
+            raise ValueError(
+                f"Invalid branch pattern {source!r}: only (?i), (?m), (?s) flags are supported"
+            )
+        regex = f"(?{match.group(1)}:{regex[match.end():]})"
+
+    try:
+        parsed = sre_parse.parse(regex)
+    except re.error as exc:
+        raise ValueError(f"Invalid branch pattern {source!r}: {exc}") from exc
+    if parsed.state.groupdict:
+        raise ValueError(f"Invalid branch pattern {source!r}: named groups are not supported")
+    try:
+        repeats = _count_repeats(parsed)
+    except ValueError as exc:
+        raise ValueError(f"Invalid branch pattern {source!r}: {exc}") from None
+    if repeats > MAX_PATTERN_REPEATS:
+        raise ValueError(
+            f"Invalid branch pattern {source!r}: more than {MAX_PATTERN_REPEATS} quantifiers"
+        )
+    return regex
+
+
+class PatternSet:
+    def __init__(self, patterns: Iterable[str]) -> None:
+        exact: set[str] = set()
+        prefixes: list[str] = []
+        regexes: list[str] = []
+
+        for pattern in patterns:
+            if pattern.startswith(REGEX_PREFIX):
+                regexes.append(safe_regex(pattern[len(REGEX_PREFIX):]))
+                continue
+
+            # Only ** crosses "/", so a single trailing * stays a glob.
+            head = pattern[:-2]
+            if pattern.endswith("**") and not GLOB_CHARS.intersection(head):
+                prefixes.append(head)
+            elif not GLOB_CHARS.intersection(pattern):
+                exact.add(pattern)
+            else:
+                regexes.append(safe_regex(glob_to_regex(pattern), pattern))
+
+        self.exact = frozenset(exact)
+        self.trie = PrefixTrie(prefixes)
+        # One combined pattern: a single fullmatch per branch regardless of how
+        # many regexes and globs the filter has.
+        self.regex = re.compile("|".join(f"(?:{r})" for r in regexes)) if regexes else None
+
+    def matches(self, branch: str) -> bool:
+        if branch in self.exact:
+            return True
+        if self.trie and self.trie.has_prefix_of(branch):
+            return True
+        return self.regex is not None and self.regex.fullmatch(branch) is not None
+
+
+class BranchFilter:
+    def __init__(self, source: str, include: PatternSet | None, exclude: PatternSet | None) -> None:
+        self.source = source
+        self.include = include
+        self.exclude = exclude
+
+    def __call__(self, branch: str) -> bool:
+        branch = branch.strip()
+        if self.exclude is not None and self.exclude.matches(branch):
+            return False
+        return self.include is None or self.include.matches(branch)
+
+    def __repr__(self) -> str:
+        return f"<BranchFilter {self.source!r}>"
+
+
+def split_patterns(source: str) -> list[str]:
+    # Commas inside (), [] and {} or escaped with a backslash belong to the
+    # pattern, so re:^v\d{1,3}$ survives.
+    patterns: list[str] = []
+    current: list[str] = []
+    depth = 0
+    escaped = False
+    for ch in source:
+        if escaped:
+            escaped = False
+        elif ch == "\\":
+            escaped = True
+        elif ch in "([{":
+            depth += 1
+        elif ch in ")]}" and depth:
+            depth -= 1
+        elif ch == "," and not depth:
+            patterns.append("".join(current))
+            current = []
+            continue
+        current.append(ch)
+    patterns.append("".join(current))
+    return [p.strip() for p in patterns if p.strip()]
+
+
+def _match_all(branch: str) -> bool:
+    return True
+
+
+@lru_cache(maxsize=BRANCH_FILTER_CACHE_SIZE)
+def compile_branch_filter(branches_filter: str | None) -> BranchMatcher:
+    if not branches_filter:
+        return _match_all
+
+    patterns = split_patterns(branches_filter)
+    if not patterns:
+        return _match_all
+
+    include = [p for p in patterns if not p.startswith("!")]
+    exclude = [p[1:].strip() for p in patterns if p.startswith("!") and p[1:].strip()]
+
+    return BranchFilter(
+        branches_filter,
+        include=PatternSet(include) if include else None,
+        exclude=PatternSet(exclude) if exclude else None,
+    )
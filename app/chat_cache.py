@@ -0,0 +1,64 @@
+import time
+from collections import OrderedDict
+from typing import Any, NamedTuple
+
+from app.config import CHAT_CACHE_MAX_SIZE, CHAT_CACHE_TTL
+
+
+class ChatRef(NamedTuple):
+    id: int
+    telegram_chat_id: int
+    title: str | None
+
+
+class ChatCache:
+    def __init__(self, *, ttl: float, maxsize: int) -> None:
+        self.ttl = ttl
+        self.maxsize = max(1, maxsize)
+        self._entries: OrderedDict[int, tuple[ChatRef, float]] = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, telegram_chat_id: int) -> ChatRef | None:
+        entry = self._entries.get(telegram_chat_id)
+        if entry is None:
+            self.misses += 1
+            return None
+        chat, expires_at = entry
+        if expires_at <= time.monotonic():
+            del self._entries[telegram_chat_id]
+            self.misses += 1
+            return None
+        self._entries.move_to_end(telegram_chat_id)
+        self.hits += 1
+        return chat
+
+    def put(self, chat: ChatRef) -> ChatRef:
+        if self.ttl <= 0:
+            return chat
+        self._entries[chat.telegram_chat_id] = (chat, time.monotonic() + self.ttl)
+        self._entries.move_to_end(chat.telegram_chat_id)
+        while len(self._entries) > self.maxsize:
+            self._entries.popitem(last=False)
+            self.evictions += 1
+        return chat
+
+    def invalidate(self, telegram_chat_id: int) -> None:
+        self._entries.pop(telegram_chat_id, None)
+
+    def clear(self) -> None:
+        self._entries.clear()
+
+    def stats(self) -> dict[str, Any]:
+        lookups = self.hits + self.misses
+        return {
+            "size": len(self._entries),
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_ratio": round(self.hits / lookups, 3) if lookups else None,
+            "evictions": self.evictions,
+        }
+
+
+chat_cache = ChatCache(ttl=CHAT_CACHE_TTL, maxsize=CHAT_CACHE_MAX_SIZE)
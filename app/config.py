@@ -4,11 +4,68 @@ from dotenv import load_dotenv
 load_dotenv()
 
 TELEGRAM_BOT_TOKEN = os.getenv("TELEGRAM_BOT_TOKEN")
+TELEGRAM_API_BASE_URL = os.getenv("TELEGRAM_API_BASE_URL", "")
 APP_HOST = os.getenv("APP_HOST", "0.0.0.0")
 APP_PORT = int(os.getenv("APP_PORT", "8000"))
 
+TELEGRAM_WEBHOOK_URL = os.getenv("TELEGRAM_WEBHOOK_URL", "")
+TELEGRAM_WEBHOOK_PATH = os.getenv("TELEGRAM_WEBHOOK_PATH", "/webhook/telegram")
+TELEGRAM_WEBHOOK_SECRET = os.getenv("TELEGRAM_WEBHOOK_SECRET", "")
+TELEGRAM_WEBHOOK_MAX_INFLIGHT = int(os.getenv("TELEGRAM_WEBHOOK_MAX_INFLIGHT", "100"))
+
 DEFAULT_CHAT_ID = os.getenv("DEFAULT_CHAT_ID")
 GITHUB_WEBHOOK_SECRET = os.getenv("GITHUB_WEBHOOK_SECRET")
+GITHUB_WEBHOOK_MAX_BODY = int(os.getenv("GITHUB_WEBHOOK_MAX_BODY", str(25 * 1024 * 1024)))
+
+DELIVERY_WORKERS = int(os.getenv("DELIVERY_WORKERS", "4"))
+DELIVERY_QUEUE_MAXSIZE = int(os.getenv("DELIVERY_QUEUE_MAXSIZE", "1000"))
+FANOUT_CONCURRENCY = int(os.getenv("FANOUT_CONCURRENCY", "20"))
+
+SEND_GLOBAL_RATE = float(os.getenv("SEND_GLOBAL_RATE", "30"))
+SEND_CHAT_RATE = float(os.getenv("SEND_CHAT_RATE", "1"))
+SEND_GROUP_RATE_PER_MINUTE = float(os.getenv("SEND_GROUP_RATE_PER_MINUTE", "20"))
+SEND_MAX_RETRIES = int(os.getenv("SEND_MAX_RETRIES", "5"))
+
+EVENT_LOG_BATCH_SIZE = int(os.getenv("EVENT_LOG_BATCH_SIZE", "500"))
+EVENT_LOG_FLUSH_INTERVAL = float(os.getenv("EVENT_LOG_FLUSH_INTERVAL", "1.0"))
+EVENT_LOG_MAX_BUFFER = int(os.getenv("EVENT_LOG_MAX_BUFFER", "50000"))
+
+EVENT_LOG_RETENTION = os.getenv("EVENT_LOG_RETENTION", "")
+EVENT_LOG_PRUNE_INTERVAL = float(os.getenv("EVENT_LOG_PRUNE_INTERVAL", "300"))
+EVENT_LOG_PRUNE_CHUNK_SIZE = int(os.getenv("EVENT_LOG_PRUNE_CHUNK_SIZE", "1000"))
+EVENT_LOG_PRUNE_CHUNK_PAUSE = float(os.getenv("EVENT_LOG_PRUNE_CHUNK_PAUSE", "0.05"))
+EVENT_LOG_PARTITIONING = os.getenv("EVENT_LOG_PARTITIONING", "").lower() in {"1", "true", "yes"}
+EVENT_LOG_PARTITIONS_AHEAD = int(os.getenv("EVENT_LOG_PARTITIONS_AHEAD", "2"))
+
+BRANCH_FILTER_CACHE_SIZE = int(os.getenv("BRANCH_FILTER_CACHE_SIZE", "1024"))
+ROUTING_REFRESH_INTERVAL = float(os.getenv("ROUTING_REFRESH_INTERVAL", "5"))
+
+CHAT_CACHE_TTL = float(os.getenv("CHAT_CACHE_TTL", "300"))
+CHAT_CACHE_MAX_SIZE = int(os.getenv("CHAT_CACHE_MAX_SIZE", "10000"))
+
+SQL_INSTRUMENTATION = os.getenv("SQL_INSTRUMENTATION", "").lower() in {"1", "true", "yes"}
+SQL_SLOW_QUERY_MS = float(os.getenv("SQL_SLOW_QUERY_MS", "100"))
+SQL_N_PLUS_ONE_THRESHOLD = int(os.getenv("SQL_N_PLUS_ONE_THRESHOLD", "5"))
+SQL_PROFILE_HISTORY = int(os.getenv("SQL_PROFILE_HISTORY", "50"))
+
+DIGEST_DEFAULT_TIMEZONE = os.getenv("DIGEST_DEFAULT_TIMEZONE", "UTC")
+DIGEST_SCHEDULER_INTERVAL = float(os.getenv("DIGEST_SCHEDULER_INTERVAL", "60"))
+DIGEST_WINDOW_HOURS = int(os.getenv("DIGEST_WINDOW_HOURS", "24"))
+
+WEBHOOK_DEDUP_TTL = float(os.getenv("WEBHOOK_DEDUP_TTL", "86400"))
+WEBHOOK_DEDUP_MAX_SIZE = int(os.getenv("WEBHOOK_DEDUP_MAX_SIZE", "100000"))
+WEBHOOK_DEDUP_FLUSH_INTERVAL = float(os.getenv("WEBHOOK_DEDUP_FLUSH_INTERVAL", "1.0"))
+
+WEBHOOK_INBOX_ENABLED = os.getenv("WEBHOOK_INBOX_ENABLED", "true").lower() in {"1", "true", "yes"}
+WEBHOOK_INBOX_COMMIT_DELAY = float(os.getenv("WEBHOOK_INBOX_COMMIT_DELAY", "0.005"))
+WEBHOOK_INBOX_FLUSH_INTERVAL = float(os.getenv("WEBHOOK_INBOX_FLUSH_INTERVAL", "0.2"))
+WEBHOOK_INBOX_MAX_ATTEMPTS = int(os.getenv("WEBHOOK_INBOX_MAX_ATTEMPTS", "5"))
+
+APP_MODE = os.getenv("APP_MODE", "all")
+APP_WORKERS = int(os.getenv("APP_WORKERS", "1"))
+WORKER_POLL_INTERVAL = float(os.getenv("WORKER_POLL_INTERVAL", "0.5"))
+WORKER_CLAIM_TTL = float(os.getenv("WORKER_CLAIM_TTL", "60"))
+LEASE_TTL = float(os.getenv("LEASE_TTL", "30"))
 
 if not TELEGRAM_BOT_TOKEN:
     raise RuntimeError("TELEGRAM_BOT_TOKEN is not set in .env")
@@ -1,23 +1,37 @@
 import os
 
-from sqlalchemy import create_engine
+from sqlalchemy.engine import make_url
+from sqlalchemy.ext.asyncio import async_sessionmaker
 from sqlalchemy.orm import declarative_base, sessionmaker
 from dotenv import load_dotenv
 
+from app.sql_profiler import sql_profiler
+from app.storage import create_async_db_engine, create_sync_engine, resolve_profile
+
 load_dotenv()
 
 DATABASE_URL = os.getenv("DATABASE_URL", "sqlite:///./devteam_notifier.db")
 
-connect_args = {}
-if DATABASE_URL.startswith("sqlite"):
-    connect_args = {"check_same_thread": False}
+ASYNC_DRIVERS = {
+    "sqlite": "sqlite+aiosqlite",
+    "postgresql": "postgresql+asyncpg",
+}
 
-engine = create_engine(
-    DATABASE_URL,
-    echo=False,
-    future=True,
-    connect_args=connect_args,
-)
+
+def to_async_url(url: str) -> str:
+    parsed = make_url(url)
+    driver = ASYNC_DRIVERS.get(parsed.get_backend_name())
+    if driver is None or parsed.drivername == driver:
+        return url
+    return parsed.set(drivername=driver).render_as_string(hide_password=False)
+
+
+ASYNC_DATABASE_URL = os.getenv("ASYNC_DATABASE_URL") or to_async_url(DATABASE_URL)
+
+storage_profile = resolve_profile(DATABASE_URL)
+
+engine = create_sync_engine(DATABASE_URL, storage_profile)
+sql_profiler.install(engine)
 
 SessionLocal = sessionmaker(
     bind=engine,
@@ -25,10 +39,22 @@ SessionLocal = sessionmaker(
     autocommit=False,
 )
 
+async_engine = create_async_db_engine(ASYNC_DATABASE_URL, storage_profile)
+sql_profiler.install(async_engine.sync_engine)
+
+AsyncSessionLocal = async_sessionmaker(
+    bind=async_engine,
+    autoflush=False,
+    expire_on_commit=False,
+)
+
 Base = declarative_base()
 
 
 def init_db():
     from app import models  # noqa: F401
+    from app.migrations import migration_lock, run_migrations
 
-    Base.metadata.create_all(bind=engine)
+    with migration_lock(engine):
+        Base.metadata.create_all(bind=engine)
+        run_migrations(engine)
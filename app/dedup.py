@@ -0,0 +1,219 @@
+import asyncio
+import logging
+import time
+from collections import OrderedDict
+from datetime import datetime, timedelta, timezone
+from typing import Any
+
+from sqlalchemy import delete, select
+from sqlalchemy.dialects import postgresql, sqlite
+
+from app.config import WEBHOOK_DEDUP_FLUSH_INTERVAL, WEBHOOK_DEDUP_MAX_SIZE, WEBHOOK_DEDUP_TTL
+from app.db import AsyncSessionLocal
+from app.models import WebhookDelivery
+
+logger = logging.getLogger(__name__)
+
+DIALECT_INSERTS = {
+    "sqlite": sqlite.insert,
+    "postgresql": postgresql.insert,
+}
+
+PURGE_INTERVAL = 60.0
+
+
+class DeliveryDeduplicator:
+    def __init__(self, *, ttl: float, maxsize: int, flush_interval: float) -> None:
+        self.ttl = ttl
+        self.maxsize = max(1, maxsize)
+        self.flush_interval = flush_interval
+        self._seen: OrderedDict[str, float] = OrderedDict()
+        self._pending: list[dict[str, Any]] = []
+        self._claims: list[tuple[str, asyncio.Future]] = []
+        self._next_purge = 0.0
+        self._task: asyncio.Task | None = None
+        self._stop: asyncio.Event | None = None
+        self._wakeup: asyncio.Event | None = None
+        self.duplicates = 0
+        self.claimed = 0
+        self.persisted = 0
+        self.warmed = 0
+
+    def _evict(self, now: float) -> None:
+        while self._seen:
+            delivery_id, expires_at = next(iter(self._seen.items()))
+            if expires_at > now and len(self._seen) <= self.maxsize:
+                return
+            del self._seen[delivery_id]
+
+    def is_duplicate(self, delivery_id: str) -> bool:
+        expires_at = self._seen.get(delivery_id)
+        if expires_at is not None and expires_at > time.time():
+            self.duplicates += 1
+            return True
+        return False
+
+    def remember(self, delivery_id: str) -> None:
+        now = time.time()
+        self._seen[delivery_id] = now + self.ttl
+        self._seen.move_to_end(delivery_id)
+        self._evict(now)
+
+    async def claim(self, delivery_id: str) -> bool:
+        # The in-memory set only covers this process; a miss is settled by the
+        # primary key of webhook_deliveries so a retry that reaches another
+        # worker is still caught. Claims are group-committed like inbox appends.
+        if self.is_duplicate(delivery_id):
+            return False
+        if self._wakeup is None:
+            [claimed] = await self._claim_batch([delivery_id])
+        else:
+            future = asyncio.get_running_loop().create_future()
+            self._claims.append((delivery_id, future))
+            self._wakeup.set()
+            claimed = await future
+        if claimed:
+            self.claimed += 1
+        else:
+            self.duplicates += 1
+        return claimed
+
+    async def _claim_batch(self, delivery_ids: list[str]) -> list[bool]:
+        now = datetime.now(timezone.utc)
+        rows = [{"delivery_id": d, "received_at": now} for d in dict.fromkeys(delivery_ids)]
+        try:
+            async with AsyncSessionLocal() as db:
+                stmt = DIALECT_INSERTS[db.bind.dialect.name](WebhookDelivery).values(rows)
+                # Expired rows that flush() has not purged yet are taken over.
+                stmt = stmt.on_conflict_do_update(
+                    index_elements=[WebhookDelivery.delivery_id],
+                    set_={"received_at": stmt.excluded.received_at},
+                    where=WebhookDelivery.received_at < now - timedelta(seconds=self.ttl),
+                ).returning(WebhookDelivery.delivery_id)
+                fresh = set((await db.execute(stmt)).scalars())
+                await db.commit()
+        except Exception:
+            logger.exception("Failed to claim %d webhook deliveries, relying on memory", len(rows))
+            self._pending.extend(rows)
+            fresh = {row["delivery_id"] for row in rows}
+
+        results = []
+        for delivery_id in delivery_ids:
+            results.append(delivery_id in fresh)
+            fresh.discard(delivery_id)
+        return results
+
+    async def _flush_claims(self) -> None:
+        claims, self._claims = self._claims, []
+        if not claims:
+            return
+        results = await self._claim_batch([delivery_id for delivery_id, _ in claims])
+        for (_, future), claimed in zip(claims, results):
+            if not future.done():
+                future.set_result(claimed)
+
+    async def release(self, delivery_id: str) -> None:
+        self._seen.pop(delivery_id, None)
+        self._pending = [row for row in self._pending if row["delivery_id"] != delivery_id]
+        try:
+            async with AsyncSessionLocal() as db:
+                await db.execute(
+                    delete(WebhookDelivery).where(WebhookDelivery.delivery_id == delivery_id)
+                )
+                await db.commit()
+        except Exception:
+            logger.exception("Failed to release webhook delivery %s", delivery_id)
+
+    async def warm(self) -> int:
+        since = datetime.now(timezone.utc) - timedelta(seconds=self.ttl)
+        async with AsyncSessionLocal() as db:
+            rows = (
+                await db.execute(
+                    select(WebhookDelivery.delivery_id, WebhookDelivery.received_at)
+                    .where(WebhookDelivery.received_at >= since)
+                    .order_by(WebhookDelivery.received_at.desc())
+                    .limit(self.maxsize)
+                )
+            ).all()
+
+        for delivery_id, received_at in reversed(rows):
+            if received_at.tzinfo is None:
+                received_at = received_at.replace(tzinfo=timezone.utc)
+            self._seen[delivery_id] = received_at.timestamp() + self.ttl
+        self._evict(time.time())
+        self.warmed = len(rows)
+        return len(rows)
+
+    async def flush(self) -> int:
+        purge = time.monotonic() >= self._next_purge
+        if not self._pending and not purge:
+            return 0
+        rows, self._pending = self._pending, []
+        try:
+            async with AsyncSessionLocal() as db:
+                if rows:
+                    make_insert = DIALECT_INSERTS[db.bind.dialect.name]
+                    await db.execute(make_insert(WebhookDelivery).on_conflict_do_nothing(), rows)
+                if purge:
+                    await db.execute(
+                        delete(WebhookDelivery).where(
+                            WebhookDelivery.received_at
+                            < datetime.now(timezone.utc) - timedelta(seconds=self.ttl)
+                        )
+                    )
+                await db.commit()
+        except Exception:
+            self._pending[:0] = rows
+            logger.exception("Failed to persist %d webhook delivery ids", len(rows))
+            return 0
+        if purge:
+            self._next_purge = time.monotonic() + PURGE_INTERVAL
+        self.persisted += len(rows)
+        return len(rows)
+
+    async def start(self) -> None:
+        if self._task is not None:
+            return
+        await self.warm()
+        self._stop = asyncio.Event()
+        self._wakeup = asyncio.Event()
+        self._task = asyncio.create_task(self._run(), name="webhook-dedup")
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            assert self._stop is not None and self._wakeup is not None
+            self._stop.set()
+            self._wakeup.set()
+            await self._task
+            self._task = None
+            self._wakeup = None
+        await self.flush()
+
+    def stats(self) -> dict[str, Any]:
+        return {
+            "tracked": len(self._seen),
+            "pending": len(self._pending),
+            "duplicates": self.duplicates,
+            "claimed": self.claimed,
+            "persisted": self.persisted,
+            "warmed": self.warmed,
+        }
+
+    async def _run(self) -> None:
+        assert self._stop is not None and self._wakeup is not None
+        while not self._stop.is_set():
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout=self.flush_interval)
+            except asyncio.TimeoutError:
+                pass
+            self._wakeup.clear()
+            await self._flush_claims()
+            await self.flush()
+        await self._flush_claims()
+
+
+delivery_deduplicator = DeliveryDeduplicator(
+    ttl=WEBHOOK_DEDUP_TTL,
+    maxsize=WEBHOOK_DEDUP_MAX_SIZE,
+    flush_interval=WEBHOOK_DEDUP_FLUSH_INTERVAL,
+)
@@ -0,0 +1,148 @@
+import asyncio
+import logging
+import zlib
+from contextvars import ContextVar
+from dataclasses import dataclass, field
+from typing import Any, Awaitable, Callable, TypeVar
+
+from app.config import DELIVERY_QUEUE_MAXSIZE, DELIVERY_WORKERS
+from app.inbox import webhook_inbox
+from app.sql_profiler import sql_profiler
+
+logger = logging.getLogger(__name__)
+
+T = TypeVar("T")
+
+DeliveryHandler = Callable[[Any], Awaitable[None]]
+
+
+@dataclass
+class DeliveryJob:
+    event: str
+    payload: Any
+    handler: DeliveryHandler
+    inbox_id: int | None = None
+    done_targets: frozenset[int] = field(default_factory=frozenset)
+
+
+current_job: ContextVar[DeliveryJob | None] = ContextVar("current_job", default=None)
+
+
+def unfinished(targets: list[T]) -> list[T]:
+    job = current_job.get()
+    if job is None or not job.done_targets:
+        return targets
+    return [t for t in targets if t.chat_db_id not in job.done_targets]
+
+
+def track_targets(send: Callable[[T], Awaitable[Any]]) -> Callable[[T], Awaitable[Any]]:
+    job = current_job.get()
+    if job is None or job.inbox_id is None:
+        return send
+    inbox_id = job.inbox_id
+
+    async def tracked(target: T) -> Any:
+        result = await send(target)
+        webhook_inbox.mark_target_done(inbox_id, target.chat_db_id)
+        return result
+
+    return tracked
+
+
+def ordering_key(job: DeliveryJob) -> str | None:
+    repository = getattr(job.payload, "repository", None)
+    return getattr(repository, "full_name", None)
+
+
+class DeliveryQueue:
+    # Each worker owns a queue; jobs for one repository always land on the
+    # same worker so a chat receives that repository's events in order.
+    def __init__(self, workers: int, maxsize: int = 0) -> None:
+        self.workers = max(1, workers)
+        self.maxsize = maxsize
+        self._queues: list[asyncio.Queue[DeliveryJob]] = []
+        self._tasks: list[asyncio.Task] = []
+        self._next = 0
+        self._busy = 0
+        self.processed = 0
+        self.failed = 0
+
+    @property
+    def running(self) -> bool:
+        return bool(self._tasks)
+
+    @property
+    def depth(self) -> int:
+        return sum(q.qsize() for q in self._queues)
+
+    async def start(self) -> None:
+        if self.running:
+            return
+        shard_size = -(-self.maxsize // self.workers) if self.maxsize > 0 else 0
+        self._queues = [asyncio.Queue(maxsize=shard_size) for _ in range(self.workers)]
+        self._tasks = [
+            asyncio.create_task(self._worker(i), name=f"delivery-worker-{i}")
+            for i in range(self.workers)
+        ]
+
+    async def stop(self, drain: bool = True) -> None:
+        if not self.running:
+            return
+        if drain:
+            for queue in self._queues:
+                await queue.join()
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+
+    def _shard(self, job: DeliveryJob) -> asyncio.Queue[DeliveryJob]:
+        if not self._queues:
+            raise RuntimeError("Delivery queue is not started")
+        key = ordering_key(job)
+        if key is None:
+            self._next += 1
+            return self._queues[self._next % len(self._queues)]
+        return self._queues[zlib.crc32(key.encode("utf-8")) % len(self._queues)]
+
+    def submit(self, job: DeliveryJob) -> None:
+        self._shard(job).put_nowait(job)
+
+    async def put(self, job: DeliveryJob) -> None:
+        await self._shard(job).put(job)
+
+    def stats(self) -> dict[str, Any]:
+        return {
+            "workers": len(self._tasks),
+            "busy": self._busy,
+            "queue_depth": self.depth,
+            "queue_maxsize": self.maxsize,
+            "processed": self.processed,
+            "failed": self.failed,
+        }
+
+    async def _worker(self, index: int) -> None:
+        queue = self._queues[index]
+        while True:
+            job = await queue.get()
+            self._busy += 1
+            token = current_job.set(job)
+            try:
+                with sql_profiler.unit("delivery", job.event):
+                    await job.handler(job.payload)
+                self.processed += 1
+                if job.inbox_id is not None:
+                    webhook_inbox.mark_done(job.inbox_id)
+            except Exception:
+                self.failed += 1
+                logger.exception("Delivery of %s event failed", job.event)
+            finally:
+                current_job.reset(token)
+                self._busy -= 1
+                queue.task_done()
+
+
+delivery_queue = DeliveryQueue(
+    workers=DELIVERY_WORKERS,
+    maxsize=DELIVERY_QUEUE_MAXSIZE,
+)
@@ -0,0 +1,181 @@
+from datetime import datetime, timedelta, timezone
+from typing import Any, AsyncIterator, NamedTuple
+
+from sqlalchemy import select, tuple_
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.models import EventLog, Repo
+
+MESSAGE_LIMIT = 4096
+PAGE_ROW_LIMIT = 500
+CALLBACK_PREFIX = "dg"
+EPOCH = datetime(1970, 1, 1, tzinfo=timezone.utc)
+
+
+class DigestCursor(NamedTuple):
+    hours: int
+    since: datetime
+    after_ts: datetime | None = None
+    after_id: int | None = None
+
+    @classmethod
+    def start(cls, hours: int, now: datetime | None = None) -> "DigestCursor":
+        now = now or datetime.now(timezone.utc)
+        return cls(hours=hours, since=now - timedelta(hours=hours))
+
+    def encode(self) -> str:
+        return ":".join(
+            [
+                CALLBACK_PREFIX,
+                str(self.hours),
+                str(_to_micros(self.since)),
+                str(_to_micros(self.after_ts)) if self.after_ts else "",
+                str(self.after_id or ""),
+            ]
+        )
+
+    @classmethod
+    def decode(cls, data: str) -> "DigestCursor":
+        prefix, hours, since, after_ts, after_id = data.split(":")
+        if prefix != CALLBACK_PREFIX:
+            raise ValueError(f"Not a digest cursor: {data!r}")
+        return cls(
+            hours=int(hours),
+            since=_from_micros(int(since)),
+            after_ts=_from_micros(int(after_ts)) if after_ts else None,
+            after_id=int(after_id) if after_id else None,
+        )
+
+
+def _to_micros(ts: datetime) -> int:
+    if ts.tzinfo is None:
+        ts = ts.replace(tzinfo=timezone.utc)
+    return (ts - EPOCH) // timedelta(microseconds=1)
+
+
+def _from_micros(value: int) -> datetime:
+    return EPOCH + timedelta(microseconds=value)
+
+
+def digest_page_query(chat_db_id: int, cursor: DigestCursor, limit: int = PAGE_ROW_LIMIT):
+    stmt = (
+        select(
+            EventLog.id,
+            EventLog.timestamp,
+            EventLog.event_type,
+            EventLog.event_subtype,
+            EventLog.payload_summary,
+            Repo.full_name,
+        )
+        .join(Repo, EventLog.repo_id == Repo.id)
+        .where(
+            EventLog.chat_id == chat_db_id,
+            EventLog.timestamp >= cursor.since,
+        )
+        .order_by(EventLog.timestamp.asc(), EventLog.id.asc())
+        .limit(limit)
+    )
+    if cursor.after_ts is not None and cursor.after_id is not None:
+        stmt = stmt.where(
+            tuple_(EventLog.timestamp, EventLog.id) > tuple_(cursor.after_ts, cursor.after_id)
+        )
+    return stmt
+
+
+async def stream_digest_rows(
+    db: AsyncSession,
+    chat_db_id: int,
+    cursor: DigestCursor,
+    limit: int = PAGE_ROW_LIMIT,
+) -> AsyncIterator[Any]:
+    result = await db.stream(digest_page_query(chat_db_id, cursor, limit))
+    try:
+        async for row in result:
+            yield row
+    finally:
+        await result.close()
+
+
+def split_message(lines: list[str], limit: int = MESSAGE_LIMIT) -> list[str]:
+    chunks: list[str] = []
+    current: list[str] = []
+    size = 0
+    for line in lines:
+        if len(line) > limit:
+            line = line[: limit - 1] + "…"
+        if current and size + 1 + len(line) > limit:
+            chunks.append("\n".join(current))
+            current, size = [], 0
+        size += len(line) + (1 if current else 0)
+        current.append(line)
+    if current:
+        chunks.append("\n".join(current))
+    return chunks
+
+
+def render_digest_line(row: Any) -> str:
+    ts = row.timestamp.strftime("%Y-%m-%d %H:%M")
+    st = row.event_subtype or ""
+    summary = row.payload_summary or ""
+    return f"• [{ts}] <code>{row.full_name}</code> — {row.event_type}/{st}: {summary}"
+
+
+async def render_digest_page(
+    db: AsyncSession,
+    chat_db_id: int,
+    cursor: DigestCursor,
+    limit: int = MESSAGE_LIMIT,
+) -> tuple[str | None, DigestCursor | None]:
+    if cursor.after_id is None:
+        header = f"📊 Дайджест за последние {cursor.hours} ч:"
+    else:
+        header = f"📊 Дайджест за последние {cursor.hours} ч (продолжение):"
+
+    lines = [header]
+    size = len(header)
+    last = None
+    has_more = False
+
+    # One extra row tells whether a next page exists.
+    rows = stream_digest_rows(db, chat_db_id, cursor, PAGE_ROW_LIMIT + 1)
+    try:
+        async for row in rows:
+            if len(lines) - 1 == PAGE_ROW_LIMIT:
+                has_more = True
+                break
+            line = render_digest_line(row)
+            if size + 1 + len(line) > limit:
+                if last is None:
+                    line = line[: limit - size - 2] + "…"
+                else:
+                    has_more = True
+                    break
+            lines.append(line)
+            size += 1 + len(line)
+            last = row
+    finally:
+        await rows.aclose()
+
+    if last is None:
+        return None, None
+
+    next_cursor = None
+    if has_more:
+        next_cursor = cursor._replace(after_ts=last.timestamp, after_id=last.id)
+    return "\n".join(lines), next_cursor
+
+
+def render_rollup_digest(groups: list[dict[str, Any]], hours: int) -> list[str]:
+    total = sum(g["count"] for g in groups)
+    lines = [f"📊 Сводка за последние {hours} ч: {total} событий"]
+
+    for g in groups:
+        ts = g["last_timestamp"].strftime("%Y-%m-%d %H:%M")
+        st = g["event_subtype"] or ""
+        summary = g["last_summary"] or ""
+        lines.append(
+            f"• <code>{g['repo_full_name']}</code> — {g['event_type']}/{st}: "
+            f"{g['count']} (последнее [{ts}]: {summary})"
+        )
+
+    return lines
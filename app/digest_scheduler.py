@@ -0,0 +1,158 @@
+import asyncio
+import logging
+import re
+from collections import defaultdict
+from datetime import datetime, timedelta, timezone, tzinfo
+from typing import Any
+from zoneinfo import ZoneInfo, ZoneInfoNotFoundError
+
+from app import async_crud
+from app.config import DIGEST_DEFAULT_TIMEZONE, DIGEST_SCHEDULER_INTERVAL, DIGEST_WINDOW_HOURS
+from app.db import AsyncSessionLocal
+from app.digest import render_rollup_digest, split_message
+from app.fanout import fan_out
+from app.models import Chat
+from app.rollups import as_utc, digest_rollups_for_chats_query, summarize
+from app.sender import send_scheduler
+
+logger = logging.getLogger(__name__)
+
+TIME_RE = re.compile(r"^([01]?\d|2[0-3]):([0-5]\d)$")
+QUERY_BATCH_SIZE = 500
+
+
+def parse_digest_time(value: str) -> str:
+    match = TIME_RE.match(value.strip())
+    if not match:
+        raise ValueError(f"Invalid digest time {value!r}, expected HH:MM")
+    return f"{int(match.group(1)):02d}:{match.group(2)}"
+
+
+def resolve_timezone(name: str | None) -> tzinfo:
+    try:
+        return ZoneInfo(name or DIGEST_DEFAULT_TIMEZONE)
+    except (ZoneInfoNotFoundError, ValueError):
+        raise ValueError(f"Unknown timezone {name!r}") from None
+
+
+def last_scheduled_at(digest_time: str, tz: tzinfo, now: datetime) -> datetime:
+    hour, minute = map(int, digest_time.split(":"))
+    local_now = now.astimezone(tz)
+    scheduled = local_now.replace(hour=hour, minute=minute, second=0, microsecond=0)
+    if scheduled > local_now:
+        scheduled = (scheduled - timedelta(days=1)).replace(hour=hour, minute=minute)
+    return scheduled.astimezone(timezone.utc)
+
+
+def is_due(chat: Chat, now: datetime) -> bool:
+    try:
+        tz = resolve_timezone(chat.digest_timezone)
+    except ValueError:
+        logger.warning("Chat %s has an invalid digest timezone %r", chat.id, chat.digest_timezone)
+        tz = timezone.utc
+    scheduled = last_scheduled_at(chat.digest_time, tz, now)
+    return chat.last_digest_at is None or as_utc(chat.last_digest_at) < scheduled
+
+
+class DigestScheduler:
+    def __init__(self, *, interval: float, window_hours: int) -> None:
+        self.interval = interval
+        self.window_hours = window_hours
+        self._task: asyncio.Task | None = None
+        self._stop: asyncio.Event | None = None
+        self.runs = 0
+        self.sent = 0
+        self.failed = 0
+        self.partial = 0
+        self.last_run: datetime | None = None
+
+    async def run_once(self, now: datetime | None = None) -> int:
+        now = now or datetime.now(timezone.utc)
+
+        async with AsyncSessionLocal() as db:
+            due = [c for c in await async_crud.get_scheduled_chats(db) if is_due(c, now)]
+            rows_by_chat: dict[int, list[tuple]] = defaultdict(list)
+            for i in range(0, len(due), QUERY_BATCH_SIZE):
+                ids = [c.id for c in due[i : i + QUERY_BATCH_SIZE]]
+                for chat_id, *row in (
+                    await db.execute(digest_rollups_for_chats_query(ids, self.window_hours))
+                ).all():
+                    rows_by_chat[chat_id].append(tuple(row))
+
+        digests = [
+            (chat, summarize(rows_by_chat[chat.id])) for chat in due if rows_by_chat.get(chat.id)
+        ]
+
+        async def send_to(item: tuple[Chat, list[dict[str, Any]]]) -> None:
+            chat, groups = item
+            chunks = split_message(render_rollup_digest(groups, self.window_hours))
+            for i, chunk in enumerate(chunks):
+                try:
+                    await send_scheduler.send_message(chat_id=chat.telegram_chat_id, text=chunk)
+                except Exception:
+                    if i == 0:
+                        raise
+                    # Retrying would resend the chunks the chat already has.
+                    self.partial += 1
+                    logger.exception(
+                        "Scheduled digest for chat %s stopped after %d of %d messages",
+                        chat.id,
+                        i,
+                        len(chunks),
+                    )
+                    return
+
+        result = await fan_out(digests, send_to, label="scheduled digest")
+
+        # Chats whose first message failed stay unmarked so the next tick retries them.
+        sent_ids = [c.id for c in due if not rows_by_chat.get(c.id)]
+        sent_ids.extend(outcome.target[0].id for outcome in result.succeeded)
+        async with AsyncSessionLocal() as db:
+            await async_crud.mark_digests_sent(db, sent_ids, now)
+
+        self.runs += 1
+        self.sent += len(result.succeeded)
+        self.failed += len(result.failed)
+        self.last_run = now
+        return len(result.succeeded)
+
+    async def start(self) -> None:
+        if self._task is not None:
+            return
+        self._stop = asyncio.Event()
+        self._task = asyncio.create_task(self._run(), name="digest-scheduler")
+
+    async def stop(self) -> None:
+        if self._task is None:
+            return
+        assert self._stop is not None
+        self._stop.set()
+        await self._task
+        self._task = None
+
+    def stats(self) -> dict[str, Any]:
+        return {
+            "runs": self.runs,
+            "sent": self.sent,
+            "failed": self.failed,
+            "partial": self.partial,
+            "last_run": self.last_run.isoformat() if self.last_run else None,
+        }
+
+    async def _run(self) -> None:
+        assert self._stop is not None
+        while not self._stop.is_set():
+            try:
+                await self.run_once()
+            except Exception:
+                logger.exception("Scheduled digest run failed")
+            try:
+                await asyncio.wait_for(self._stop.wait(), timeout=self.interval)
+            except asyncio.TimeoutError:
+                pass
+
+
+digest_scheduler = DigestScheduler(
+    interval=DIGEST_SCHEDULER_INTERVAL,
+    window_hours=DIGEST_WINDOW_HOURS,
+)
@@ -0,0 +1,147 @@
+import asyncio
+import logging
+from datetime import datetime, timezone
+from typing import Any
+
+from sqlalchemy import insert
+
+from app.config import EVENT_LOG_BATCH_SIZE, EVENT_LOG_FLUSH_INTERVAL, EVENT_LOG_MAX_BUFFER
+from app.db import AsyncSessionLocal
+from app.models import EventLog
+from app.rollups import apply_rollups
+
+logger = logging.getLogger(__name__)
+
+
+class EventLogWriter:
+    def __init__(self, *, batch_size: int, flush_interval: float, max_buffer: int) -> None:
+        self.batch_size = max(1, batch_size)
+        self.flush_interval = flush_interval
+        self.max_buffer = max(self.batch_size, max_buffer)
+        self._buffer: list[dict[str, Any]] = []
+        self._wakeup: asyncio.Event | None = None
+        self._task: asyncio.Task | None = None
+        self._stopping = False
+        self._flush_lock: asyncio.Lock | None = None
+        self.flushed = 0
+        self.flushes = 0
+        self.failed_flushes = 0
+        self.dropped = 0
+
+    @property
+    def buffered(self) -> int:
+        return len(self._buffer)
+
+    def _trim(self) -> int:
+        overflow = len(self._buffer) - self.max_buffer
+        if overflow <= 0:
+            return 0
+        del self._buffer[:overflow]
+        self.dropped += overflow
+        return overflow
+
+    def add(
+        self,
+        *,
+        chat_db_id: int,
+        repo_db_id: int,
+        event_type: str,
+        event_subtype: str | None,
+        payload_summary: str | None,
+        ts: datetime | None = None,
+    ) -> None:
+        self._buffer.append(
+            {
+                "chat_id": chat_db_id,
+                "repo_id": repo_db_id,
+                "event_type": event_type,
+                "event_subtype": event_subtype,
+                "payload_summary": payload_summary,
+                "timestamp": ts or datetime.now(timezone.utc),
+            }
+        )
+        self._trim()
+        if len(self._buffer) >= self.batch_size and self._wakeup is not None:
+            self._wakeup.set()
+
+    async def start(self) -> None:
+        if self._task is not None:
+            return
+        self._stopping = False
+        self._wakeup = asyncio.Event()
+        self._flush_lock = asyncio.Lock()
+        self._task = asyncio.create_task(self._run(), name="event-log-writer")
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._stopping = True
+            assert self._wakeup is not None
+            self._wakeup.set()
+            await self._task
+            self._task = None
+        await self.flush()
+        if self._buffer or self.dropped:
+            logger.error(
+                "Event log writer stopped with %d unwritten rows; %d rows were dropped on overflow",
+                len(self._buffer),
+                self.dropped,
+            )
+
+    async def flush(self) -> int:
+        if self._flush_lock is None:
+            self._flush_lock = asyncio.Lock()
+
+        async with self._flush_lock:
+            if not self._buffer:
+                return 0
+            rows, self._buffer = self._buffer, []
+            try:
+                await self._write(rows)
+            except Exception:
+                self.failed_flushes += 1
+                self._buffer[:0] = rows
+                logger.exception("Failed to flush %d event log rows", len(rows))
+                dropped = self._trim()
+                if dropped:
+                    logger.warning(
+                        "Event log buffer is over %d rows, dropped the %d oldest",
+                        self.max_buffer,
+                        dropped,
+                    )
+                return 0
+            self.flushed += len(rows)
+            self.flushes += 1
+            return len(rows)
+
+    def stats(self) -> dict[str, int]:
+        return {
+            "buffered": self.buffered,
+            "flushed": self.flushed,
+            "flushes": self.flushes,
+            "failed_flushes": self.failed_flushes,
+            "dropped": self.dropped,
+        }
+
+    @staticmethod
+    async def _write(rows: list[dict[str, Any]]) -> None:
+        async with AsyncSessionLocal() as db:
+            await db.execute(insert(EventLog), rows)
+            await apply_rollups(db, rows)
+            await db.commit()
+
+    async def _run(self) -> None:
+        assert self._wakeup is not None
+        while not self._stopping:
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout=self.flush_interval)
+            except asyncio.TimeoutError:
+                pass
+            self._wakeup.clear()
+            await self.flush()
+
+
+event_log_writer = EventLogWriter(
+    batch_size=EVENT_LOG_BATCH_SIZE,
+    flush_interval=EVENT_LOG_FLUSH_INTERVAL,
+    max_buffer=EVENT_LOG_MAX_BUFFER,
+)
@@ -0,0 +1,71 @@
+import asyncio
+import logging
+import time
+from dataclasses import dataclass, field
+from typing import Any, Awaitable, Callable, Generic, Iterable, TypeVar
+
+from app.config import FANOUT_CONCURRENCY
+
+logger = logging.getLogger(__name__)
+
+T = TypeVar("T")
+
+
+@dataclass
+class TargetOutcome(Generic[T]):
+    target: T
+    result: Any = None
+    error: BaseException | None = None
+
+    @property
+    def ok(self) -> bool:
+        return self.error is None
+
+
+@dataclass
+class FanOutResult(Generic[T]):
+    outcomes: list[TargetOutcome[T]] = field(default_factory=list)
+    elapsed: float = 0.0
+
+    @property
+    def succeeded(self) -> list[TargetOutcome[T]]:
+        return [o for o in self.outcomes if o.ok]
+
+    @property
+    def failed(self) -> list[TargetOutcome[T]]:
+        return [o for o in self.outcomes if not o.ok]
+
+
+async def fan_out(
+    targets: Iterable[T],
+    send: Callable[[T], Awaitable[Any]],
+    *,
+    concurrency: int = FANOUT_CONCURRENCY,
+    label: str = "event",
+) -> FanOutResult[T]:
+    semaphore = asyncio.Semaphore(max(1, concurrency))
+
+    async def run_one(target: T) -> TargetOutcome[T]:
+        async with semaphore:
+            try:
+                return TargetOutcome(target=target, result=await send(target))
+            except Exception as exc:
+                return TargetOutcome(target=target, error=exc)
+
+    started = time.perf_counter()
+    outcomes = await asyncio.gather(*(run_one(t) for t in targets))
+    result = FanOutResult(outcomes=list(outcomes), elapsed=time.perf_counter() - started)
+
+    for outcome in result.failed:
+        logger.warning(
+            "%s delivery to %r failed: %r", label, outcome.target, outcome.error
+        )
+    logger.info(
+        "%s fan-out: %d targets, %d ok, %d failed in %.3fs",
+        label,
+        len(result.outcomes),
+        len(result.succeeded),
+        len(result.failed),
+        result.elapsed,
+    )
+    return result
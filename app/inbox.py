@@ -0,0 +1,406 @@
+import asyncio
+import logging
+from datetime import datetime, timedelta, timezone
+from typing import Any, AsyncIterator
+
+from sqlalchemy import delete, func, insert, or_, select, update
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.config import (
+    WEBHOOK_INBOX_COMMIT_DELAY,
+    WEBHOOK_INBOX_ENABLED,
+    WEBHOOK_INBOX_FLUSH_INTERVAL,
+    WEBHOOK_INBOX_MAX_ATTEMPTS,
+)
+from app.db import AsyncSessionLocal
+from app.models import WebhookInboxEntry, WebhookInboxProgress
+
+logger = logging.getLogger(__name__)
+
+DIALECT_INSERTS = {
+    "sqlite": sqlite.insert,
+    "postgresql": postgresql.insert,
+}
+MAX_BOOKKEEPING_RETRIES = 5
+
+
+class WebhookInbox:
+    def __init__(
+        self,
+        *,
+        enabled: bool,
+        commit_delay: float,
+        flush_interval: float,
+        max_attempts: int,
+    ) -> None:
+        self.enabled = enabled
+        self.commit_delay = commit_delay
+        self.flush_interval = flush_interval
+        self.max_attempts = max(1, max_attempts)
+        self._appends: list[tuple[dict[str, Any], asyncio.Future]] = []
+        self._progress: list[dict[str, int]] = []
+        self._done: set[int] = set()
+        self._attempts: list[int] = []
+        self._wakeup: asyncio.Event | None = None
+        self._lock: asyncio.Lock | None = None
+        self._task: asyncio.Task | None = None
+        self._stopping = False
+        self.appended = 0
+        self.completed = 0
+        self.commits = 0
+        self.failed_commits = 0
+        self.bookkeeping_failures = 0
+        self.dropped_bookkeeping = 0
+
+    async def append(self, *, event: str, delivery_id: str | None, body: bytes) -> int | None:
+        if not self.enabled:
+            return None
+        if self._task is None:
+            raise RuntimeError("Webhook inbox is not started")
+        assert self._wakeup is not None
+
+        future = asyncio.get_running_loop().create_future()
+        self._appends.append(
+            (
+                {
+                    "delivery_id": delivery_id,
+                    "event": event,
+                    "body": bytes(body),
+                    "received_at": datetime.now(timezone.utc),
+                    "attempts": 0,
+                },
+                future,
+            )
+        )
+        self._wakeup.set()
+        return await future
+
+    def mark_target_done(self, inbox_id: int, chat_db_id: int) -> None:
+        self._progress.append({"inbox_id": inbox_id, "chat_id": chat_db_id})
+
+    def mark_done(self, inbox_id: int) -> None:
+        self._done.add(inbox_id)
+
+    def record_attempt(self, inbox_id: int) -> None:
+        self._attempts.append(inbox_id)
+
+    async def flush(self) -> None:
+        if self._lock is None:
+            self._lock = asyncio.Lock()
+
+        async with self._lock:
+            appends, self._appends = self._appends, []
+            if appends:
+                await self._flush_appends(appends)
+
+            done, self._done = self._done, set()
+            progress = [p for p in self._progress if p["inbox_id"] not in done]
+            attempts = [i for i in self._attempts if i not in done]
+            self._progress, self._attempts = [], []
+            if done or progress or attempts:
+                await self._flush_bookkeeping(progress, attempts, done)
+
+    async def _flush_appends(self, appends: list[tuple[dict[str, Any], asyncio.Future]]) -> None:
+        # Appends commit on their own so a bookkeeping row that cannot be
+        # written never makes new webhooks fail.
+        try:
+            ids = await self._write_appends([row for row, _ in appends])
+        except Exception as exc:
+            self.failed_commits += 1
+            for _, future in appends:
+                if not future.done():
+                    future.set_exception(exc)
+            logger.exception("Failed to commit %d webhook inbox entries", len(appends))
+            return
+
+        for (_, future), inbox_id in zip(appends, ids):
+            if not future.done():
+                future.set_result(inbox_id)
+        self.commits += 1
+        self.appended += len(appends)
+
+    async def _flush_bookkeeping(
+        self,
+        progress: list[dict[str, int]],
+        attempts: list[int],
+        done: set[int],
+    ) -> None:
+        try:
+            await self._write_bookkeeping(progress, attempts, done)
+        except Exception as exc:
+            if isinstance(exc, IntegrityError) and progress:
+                # Progress for an entry another worker already finished
+                # violates the foreign key; retrying it would fail forever.
+                self.dropped_bookkeeping += len(progress)
+                logger.warning(
+                    "Dropping %d webhook inbox progress rows that violate constraints: %s",
+                    len(progress),
+                    exc.orig,
+                )
+                self._requeue([], attempts, done)
+                return
+            self.bookkeeping_failures += 1
+            if self.bookkeeping_failures > MAX_BOOKKEEPING_RETRIES:
+                self.bookkeeping_failures = 0
+                self.dropped_bookkeeping += len(progress) + len(attempts) + len(done)
+                logger.exception(
+                    "Dropping webhook inbox bookkeeping after %d failed commits "
+                    "(%d progress, %d attempts, %d done); unfinished entries will be replayed",
+                    MAX_BOOKKEEPING_RETRIES + 1,
+                    len(progress),
+                    len(attempts),
+                    len(done),
+                )
+                return
+            self._requeue(progress, attempts, done)
+            logger.exception("Failed to commit webhook inbox bookkeeping")
+            return
+
+        self.bookkeeping_failures = 0
+        self.commits += 1
+        self.completed += len(done)
+
+    def _requeue(self, progress: list[dict[str, int]], attempts: list[int], done: set[int]) -> None:
+        self._done |= done
+        self._progress[:0] = progress
+        self._attempts[:0] = attempts
+
+    @staticmethod
+    async def _write_appends(appends: list[dict[str, Any]]) -> list[int]:
+        async with AsyncSessionLocal() as db:
+            ids = list(
+                (
+                    await db.execute(
+                        insert(WebhookInboxEntry).returning(
+                            WebhookInboxEntry.id, sort_by_parameter_order=True
+                        ),
+                        appends,
+                    )
+                ).scalars()
+            )
+            await db.commit()
+        return ids
+
+    @staticmethod
+    async def _write_bookkeeping(
+        progress: list[dict[str, int]],
+        attempts: list[int],
+        done: set[int],
+    ) -> None:
+        async with AsyncSessionLocal() as db:
+            if progress:
+                existing = set(
+                    (
+                        await db.execute(
+                            select(WebhookInboxEntry.id).where(
+                                WebhookInboxEntry.id.in_({p["inbox_id"] for p in progress})
+                            )
+                        )
+                    ).scalars()
+                )
+                progress = [p for p in progress if p["inbox_id"] in existing]
+            if progress:
+                make_insert = DIALECT_INSERTS[db.bind.dialect.name]
+                await db.execute(
+                    make_insert(WebhookInboxProgress).on_conflict_do_nothing(), progress
+                )
+            if attempts:
+                await db.execute(
+                    update(WebhookInboxEntry)
+                    .where(WebhookInboxEntry.id.in_(attempts))
+                    .values(attempts=WebhookInboxEntry.attempts + 1)
+                )
+            if done:
+                await db.execute(
+                    delete(WebhookInboxProgress).where(WebhookInboxProgress.inbox_id.in_(done))
+                )
+                await db.execute(delete(WebhookInboxEntry).where(WebhookInboxEntry.id.in_(done)))
+            await db.commit()
+
+    async def last_id(self) -> int:
+        if not self.enabled:
+            return 0
+        async with AsyncSessionLocal() as db:
+            return (await db.execute(select(func.max(WebhookInboxEntry.id)))).scalar() or 0
+
+    async def backlog(self) -> int:
+        if not self.enabled:
+            return 0
+        async with AsyncSessionLocal() as db:
+            return (await db.execute(select(func.count()).select_from(WebhookInboxEntry))).scalar() or 0
+
+    async def iter_pending(
+        self,
+        upto: int,
+        batch_size: int = 100,
+    ) -> AsyncIterator[tuple[WebhookInboxEntry, frozenset[int]]]:
+        after = 0
+        while True:
+            async with AsyncSessionLocal() as db:
+                entries = list(
+                    (
+                        await db.execute(
+                            select(WebhookInboxEntry)
+                            .where(
+                                WebhookInboxEntry.id > after,
+                                WebhookInboxEntry.id <= upto,
+                            )
+                            .order_by(WebhookInboxEntry.id)
+                            .limit(batch_size)
+                        )
+                    ).scalars()
+                )
+                if not entries:
+                    return
+                done = await self._load_progress(db, [e.id for e in entries])
+
+            for entry in entries:
+                if entry.attempts >= self.max_attempts:
+                    logger.warning(
+                        "Dropping webhook inbox entry %s (%s) after %d attempts",
+                        entry.id,
+                        entry.event,
+                        entry.attempts,
+                    )
+                    self.mark_done(entry.id)
+                    continue
+                self.record_attempt(entry.id)
+                yield entry, frozenset(done.get(entry.id, ()))
+            after = entries[-1].id
+
+    @staticmethod
+    async def _load_progress(db: AsyncSession, ids: list[int]) -> dict[int, set[int]]:
+        done: dict[int, set[int]] = {}
+        for inbox_id, chat_id in (
+            await db.execute(
+                select(WebhookInboxProgress.inbox_id, WebhookInboxProgress.chat_id).where(
+                    WebhookInboxProgress.inbox_id.in_(ids)
+                )
+            )
+        ).all():
+            done.setdefault(inbox_id, set()).add(chat_id)
+        return done
+
+    async def claim(
+        self,
+        holder: str,
+        limit: int,
+        ttl: float,
+    ) -> list[tuple[Any, frozenset[int]]]:
+        now = datetime.now(timezone.utc)
+        available = or_(
+            WebhookInboxEntry.claimed_until.is_(None),
+            WebhookInboxEntry.claimed_until < now,
+        )
+        async with AsyncSessionLocal() as db:
+            exhausted = (
+                await db.execute(
+                    select(WebhookInboxEntry.id, WebhookInboxEntry.event).where(
+                        available, WebhookInboxEntry.attempts >= self.max_attempts
+                    )
+                )
+            ).all()
+            if exhausted:
+                for inbox_id, event in exhausted:
+                    logger.warning(
+                        "Dropping webhook inbox entry %s (%s) after %d attempts",
+                        inbox_id,
+                        event,
+                        self.max_attempts,
+                    )
+                dropped = [inbox_id for inbox_id, _ in exhausted]
+                await db.execute(
+                    delete(WebhookInboxProgress).where(WebhookInboxProgress.inbox_id.in_(dropped))
+                )
+                await db.execute(delete(WebhookInboxEntry).where(WebhookInboxEntry.id.in_(dropped)))
+
+            ids = (
+                select(WebhookInboxEntry.id)
+                .where(available)
+                .order_by(WebhookInboxEntry.id)
+                .limit(limit)
+                .with_for_update(skip_locked=True)
+            )
+            entries = (
+                await db.execute(
+                    update(WebhookInboxEntry)
+                    .where(WebhookInboxEntry.id.in_(ids))
+                    .values(
+                        claimed_by=holder,
+                        claimed_until=now + timedelta(seconds=ttl),
+                        attempts=WebhookInboxEntry.attempts + 1,
+                    )
+                    .returning(
+                        WebhookInboxEntry.id,
+                        WebhookInboxEntry.event,
+                        WebhookInboxEntry.body,
+                    )
+                    .execution_options(synchronize_session=False)
+                )
+            ).all()
+            done = await self._load_progress(db, [e.id for e in entries]) if entries else {}
+            await db.commit()
+
+        entries.sort(key=lambda e: e.id)
+        return [(e, frozenset(done.get(e.id, ()))) for e in entries]
+
+    async def extend(self, holder: str, ids: list[int], ttl: float) -> None:
+        if not ids:
+            return
+        async with AsyncSessionLocal() as db:
+            await db.execute(
+                update(WebhookInboxEntry)
+                .where(WebhookInboxEntry.id.in_(ids), WebhookInboxEntry.claimed_by == holder)
+                .values(claimed_until=datetime.now(timezone.utc) + timedelta(seconds=ttl))
+            )
+            await db.commit()
+
+    async def start(self) -> None:
+        if self._task is not None or not self.enabled:
+            return
+        self._stopping = False
+        self._wakeup = asyncio.Event()
+        self._lock = asyncio.Lock()
+        self._task = asyncio.create_task(self._run(), name="webhook-inbox")
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._stopping = True
+            assert self._wakeup is not None
+            self._wakeup.set()
+            await self._task
+            self._task = None
+        await self.flush()
+
+    def stats(self) -> dict[str, Any]:
+        return {
+            "enabled": self.enabled,
+            "appended": self.appended,
+            "completed": self.completed,
+            "commits": self.commits,
+            "failed_commits": self.failed_commits,
+            "dropped_bookkeeping": self.dropped_bookkeeping,
+            "pending_progress": len(self._progress) + len(self._done) + len(self._attempts),
+        }
+
+    async def _run(self) -> None:
+        assert self._wakeup is not None
+        while not self._stopping:
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout=self.flush_interval)
+            except asyncio.TimeoutError:
+                pass
+            self._wakeup.clear()
+            if self._appends and self.commit_delay > 0:
+                await asyncio.sleep(self.commit_delay)
+            await self.flush()
+
+
+webhook_inbox = WebhookInbox(
+    enabled=WEBHOOK_INBOX_ENABLED,
+    commit_delay=WEBHOOK_INBOX_COMMIT_DELAY,
+    flush_interval=WEBHOOK_INBOX_FLUSH_INTERVAL,
+    max_attempts=WEBHOOK_INBOX_MAX_ATTEMPTS,
+)
@@ -0,0 +1,108 @@
+import asyncio
+import logging
+import os
+import socket
+import uuid
+from datetime import datetime, timedelta, timezone
+from typing import Any, Awaitable, Callable
+
+from sqlalchemy import or_, update
+from sqlalchemy.exc import IntegrityError
+
+from app.config import LEASE_TTL
+from app.db import AsyncSessionLocal
+from app.models import ServiceLease
+
+logger = logging.getLogger(__name__)
+
+PROCESS_ID = f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+
+
+class Lease:
+    def __init__(self, name: str, *, ttl: float = LEASE_TTL, holder: str = PROCESS_ID) -> None:
+        self.name = name
+        self.ttl = ttl
+        self.holder = holder
+        self.held = False
+        self.acquired = 0
+        self.lost = 0
+
+    async def acquire(self) -> bool:
+        now = datetime.now(timezone.utc)
+        expires_at = now + timedelta(seconds=self.ttl)
+        async with AsyncSessionLocal() as db:
+            result = await db.execute(
+                update(ServiceLease)
+                .where(
+                    ServiceLease.name == self.name,
+                    or_(ServiceLease.holder == self.holder, ServiceLease.expires_at < now),
+                )
+                .values(holder=self.holder, expires_at=expires_at)
+            )
+            held = result.rowcount > 0
+            if not held:
+                db.add(ServiceLease(name=self.name, holder=self.holder, expires_at=expires_at))
+                try:
+                    await db.commit()
+                    held = True
+                except IntegrityError:
+                    await db.rollback()
+            else:
+                await db.commit()
+
+        if held and not self.held:
+            self.acquired += 1
+            logger.info("Acquired lease %s as %s", self.name, self.holder)
+        self.held = held
+        return held
+
+    async def release(self) -> None:
+        if not self.held:
+            return
+        async with AsyncSessionLocal() as db:
+            await db.execute(
+                update(ServiceLease)
+                .where(ServiceLease.name == self.name, ServiceLease.holder == self.holder)
+                .values(expires_at=datetime.now(timezone.utc))
+            )
+            await db.commit()
+        self.held = False
+
+    async def try_acquire(self) -> bool:
+        try:
+            return await self.acquire()
+        except Exception:
+            logger.exception("Failed to acquire lease %s", self.name)
+            self.held = False
+            return False
+
+    async def run_while_held(self, work: Callable[[], Awaitable[Any]]) -> Any:
+        while True:
+            if not await self.try_acquire():
+                await asyncio.sleep(self.ttl / 3)
+                continue
+
+            task = asyncio.create_task(work(), name=f"lease-{self.name}")
+            try:
+                while True:
+                    done, _ = await asyncio.wait({task}, timeout=self.ttl / 3)
+                    if done:
+                        return task.result()
+                    if not await self.try_acquire():
+                        self.lost += 1
+                        logger.warning("Lost lease %s, stopping its work", self.name)
+                        break
+            finally:
+                if not task.done():
+                    task.cancel()
+                    await asyncio.gather(task, return_exceptions=True)
+                if self.held:
+                    await self.release()
+
+    def stats(self) -> dict[str, Any]:
+        return {
+            "holder": self.holder,
+            "held": self.held,
+            "acquired": self.acquired,
+            "lost": self.lost,
+        }
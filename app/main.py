@@ -1,29 +1,150 @@
+import argparse
 import asyncio
+from contextlib import asynccontextmanager
 
 import uvicorn
 from fastapi import FastAPI
+from fastapi.responses import Response
 
-from app.config import APP_HOST, APP_PORT
+from app.config import (
+    APP_HOST,
+    APP_MODE,
+    APP_PORT,
+    APP_WORKERS,
+    TELEGRAM_WEBHOOK_URL,
+    WEBHOOK_INBOX_ENABLED,
+)
 from app.bot_instance import bot, dp
-from app.db import init_db
+from app.chat_cache import chat_cache
+from app.db import async_engine, init_db
+from app.dedup import delivery_deduplicator
+from app.delivery import delivery_queue
+from app.digest_scheduler import digest_scheduler
+from app.event_log_writer import event_log_writer
+from app.inbox import webhook_inbox
+from app.leases import Lease
+from app.metrics import CONTENT_TYPE, Gauge, render as render_metrics
+from app.retention import event_log_pruner
+from app.routing import routing_index
+from app.sender import send_scheduler
+from app.sql_profiler import sql_profiler
+from app.worker import inbox_consumer
 from bot.handlers import router as bot_router
-from integrations.github.router import router as github_router
+from bot.middlewares import SqlProfilerMiddleware
+from bot.webhook import router as telegram_router, set_telegram_webhook, update_feeder
+from integrations.github.router import replay_inbox, router as github_router, workflow_run_stats
 
 
-def create_fastapi_app() -> FastAPI:
-    app = FastAPI(title="DevTeam Notifier API")
+MODES = ("all", "api", "bot", "worker", "migrate")
+
+poller_lease = Lease("telegram-poller")
+
+DELIVERY_QUEUE_DEPTH = Gauge(
+    "notifier_delivery_queue_depth",
+    "Jobs waiting in this process's delivery queue",
+    callback=lambda: delivery_queue.depth,
+)
+DELIVERY_BUSY = Gauge(
+    "notifier_delivery_busy_workers",
+    "Delivery workers currently handling a job",
+    callback=lambda: delivery_queue.stats()["busy"],
+)
+WORKER_INFLIGHT = Gauge(
+    "notifier_worker_inflight",
+    "Inbox entries claimed by this process and not yet delivered",
+    callback=lambda: inbox_consumer.stats()["inflight"],
+)
+TELEGRAM_UPDATES_INFLIGHT = Gauge(
+    "notifier_telegram_updates_inflight",
+    "Telegram webhook updates being handled",
+    callback=lambda: update_feeder.stats()["inflight"],
+)
+EVENT_LOG_BUFFERED = Gauge(
+    "notifier_event_log_buffered",
+    "EventLog rows waiting for the next bulk insert",
+    callback=lambda: event_log_writer.stats()["buffered"],
+)
+INBOX_BACKLOG = Gauge(
+    "notifier_inbox_backlog",
+    "Webhook inbox entries not yet fully delivered",
+)
+
+
+def create_fastapi_app(lifespan=None) -> FastAPI:
+    app = FastAPI(title="DevTeam Notifier API", lifespan=lifespan)
 
     @app.get("/health")
     async def health():
-        return {"status": "ok"}
+        return {
+            "status": "ok",
+            "delivery": delivery_queue.stats(),
+            "dedup": delivery_deduplicator.stats(),
+            "inbox": webhook_inbox.stats(),
+            "sender": send_scheduler.stats(),
+            "routing": routing_index.stats(),
+            "chat_cache": chat_cache.stats(),
+            "event_log": event_log_writer.stats(),
+            "retention": event_log_pruner.stats(),
+            "digest_scheduler": digest_scheduler.stats(),
+            "workflow_runs": workflow_run_stats,
+            "worker": inbox_consumer.stats(),
+            "poller": poller_lease.stats(),
+            "telegram_updates": update_feeder.stats(),
+            "sql": sql_profiler.stats(),
+        }
+
+    if sql_profiler.enabled:
+
+        @app.get("/debug/sql")
+        async def debug_sql():
+            return sql_profiler.snapshot()
+
+    @app.get("/metrics")
+    async def metrics():
+        INBOX_BACKLOG.set(await webhook_inbox.backlog())
+        return Response(render_metrics(), media_type=CONTENT_TYPE)
 
     app.include_router(github_router)
+    if TELEGRAM_WEBHOOK_URL:
+        setup_dispatcher()
+        app.include_router(telegram_router)
 
     return app
 
 
+@asynccontextmanager
+async def api_lifespan(app: FastAPI):
+    await delivery_deduplicator.start()
+    await webhook_inbox.start()
+    try:
+        yield
+    finally:
+        await update_feeder.stop()
+        await bot.session.close()
+        await webhook_inbox.stop()
+        await delivery_deduplicator.stop()
+        await async_engine.dispose()
+
+
+def create_api_app() -> FastAPI:
+    return create_fastapi_app(lifespan=api_lifespan)
+
+
+def setup_dispatcher() -> None:
+    if bot_router.parent_router is None:
+        if sql_profiler.enabled:
+            dp.message.middleware(SqlProfilerMiddleware())
+            dp.callback_query.middleware(SqlProfilerMiddleware())
+        dp.include_router(bot_router)
+
+
 async def run_bot():
-    dp.include_router(bot_router)
+    setup_dispatcher()
+    if TELEGRAM_WEBHOOK_URL:
+        await set_telegram_webhook()
+        return
+    # A webhook left over from webhook mode makes getUpdates fail with 409.
+    await bot.delete_webhook()
     await dp.start_polling(bot)
 
 
@@ -35,12 +156,97 @@ async def run_api():
 
 
 async def async_main():
-    await asyncio.gather(
-        run_bot(),
-        run_api(),
+    await routing_index.ensure_loaded()
+    await event_log_writer.start()
+    await delivery_deduplicator.start()
+    await webhook_inbox.start()
+    await delivery_queue.start()
+    replay = asyncio.create_task(replay_inbox(await webhook_inbox.last_id()))
+    await event_log_pruner.start()
+    await digest_scheduler.start()
+    try:
+        await asyncio.gather(
+            run_bot(),
+            run_api(),
+        )
+    finally:
+        await digest_scheduler.stop()
+        await event_log_pruner.stop()
+        await update_feeder.stop()
+        replay.cancel()
+        await asyncio.gather(replay, return_exceptions=True)
+        await delivery_queue.stop()
+        await webhook_inbox.stop()
+        await delivery_deduplicator.stop()
+        await event_log_writer.stop()
+        await async_engine.dispose()
+
+
+async def run_bot_leader():
+    await event_log_pruner.start()
+    await digest_scheduler.start()
+    try:
+        await run_bot()
+        if TELEGRAM_WEBHOOK_URL:
+            await asyncio.Event().wait()
+    finally:
+        await digest_scheduler.stop()
+        await event_log_pruner.stop()
+
+
+async def bot_main():
+    try:
+        await poller_lease.run_while_held(run_bot_leader)
+    finally:
+        await async_engine.dispose()
+
+
+async def worker_main():
+    await routing_index.ensure_loaded()
+    await routing_index.start()
+    await event_log_writer.start()
+    await webhook_inbox.start()
+    await delivery_queue.start()
+    await inbox_consumer.start()
+    try:
+        await asyncio.Event().wait()
+    finally:
+        await inbox_consumer.stop()
+        await delivery_queue.stop()
+        await webhook_inbox.stop()
+        await event_log_writer.stop()
+        await routing_index.stop()
+        await async_engine.dispose()
+
+
+def serve_api(workers: int) -> None:
+    uvicorn.run(
+        "app.main:create_api_app",
+        factory=True,
+        host=APP_HOST,
+        port=APP_PORT,
+        workers=workers,
+        log_level="info",
     )
 
 
 if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="DevTeam Notifier")
+    parser.add_argument("mode", nargs="?", choices=MODES, default=APP_MODE)
+    parser.add_argument("--workers", type=int, default=APP_WORKERS, help="uvicorn workers in api mode")
+    args = parser.parse_args()
+
+    if args.mode in {"api", "worker"} and not WEBHOOK_INBOX_ENABLED:
+        raise SystemExit(f"{args.mode} mode needs WEBHOOK_INBOX_ENABLED=true")
+
     init_db()
-    asyncio.run(async_main())
+    if args.mode == "migrate":
+        pass
+    elif args.mode == "api":
+        serve_api(args.workers)
+    elif args.mode == "bot":
+        asyncio.run(bot_main())
+    elif args.mode == "worker":
+        asyncio.run(worker_main())
+    else:
+        asyncio.run(async_main())
@@ -0,0 +1,257 @@
+import logging
+from contextlib import contextmanager
+from dataclasses import dataclass
+from datetime import datetime, timezone
+from typing import Callable
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+
+from sqlalchemy import (
+    Column,
+    DateTime,
+    Integer,
+    MetaData,
+    String,
+    Table,
+    delete,
+    func,
+    insert,
+    inspect,
+    select,
+    update,
+)
+from sqlalchemy.engine import Connection, Engine
+
+from app.models import (
+    CacheVersion,
+    Chat,
+    EventLog,
+    EventRollup,
+    PRThread,
+    Subscription,
+    WebhookInboxEntry,
+    WorkflowRunMessage,
+)
+from app.rollups import backfill_rollups
+from app.routing import ROUTING_VERSION
+
+logger = logging.getLogger(__name__)
+
+# pg_advisory_lock key shared by every process that runs init_db
+MIGRATION_LOCK_ID = 0x646E6F74
+
+schema_migrations = Table(
+    "schema_migrations",
+    MetaData(),
+    Column("version", Integer, primary_key=True),
+    Column("name", String, nullable=False),
+    Column("applied_at", DateTime(timezone=True), nullable=False),
+)
+
+
+@dataclass(frozen=True)
+class Migration:
+    version: int
+    name: str
+    upgrade: Callable[[Connection], None]
+
+
+MIGRATIONS: list[Migration] = []
+
+
+def migration(version: int, name: str):
+    def decorator(fn: Callable[[Connection], None]):
+        if any(m.version == version for m in MIGRATIONS):
+            raise RuntimeError(f"Duplicate migration version {version}")
+        MIGRATIONS.append(Migration(version=version, name=name, upgrade=fn))
+        return fn
+
+    return decorator
+
+
+def applied_versions(conn: Connection) -> set[int]:
+    return set(conn.execute(select(schema_migrations.c.version)).scalars())
+
+
+@contextmanager
+def migration_lock(engine: Engine):
+    if engine.dialect.name == "postgresql":
+        with engine.connect() as conn:
+            conn.exec_driver_sql(f"SELECT pg_advisory_lock({MIGRATION_LOCK_ID})")
+            conn.commit()
+            try:
+                yield
+            finally:
+                conn.exec_driver_sql(f"SELECT pg_advisory_unlock({MIGRATION_LOCK_ID})")
+                conn.commit()
+        return
+
+    database = engine.url.database
+    if engine.dialect.name != "sqlite" or not database or database == ":memory:" or fcntl is None:
+        yield
+        return
+    with open(f"{database}.migrate.lock", "a") as lock_file:
+        fcntl.flock(lock_file, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+
+def run_migrations(engine: Engine) -> list[int]:
+    schema_migrations.create(engine, checkfirst=True)
+
+    with engine.connect() as conn:
+        applied = applied_versions(conn)
+
+    done: list[int] = []
+    for m in sorted(MIGRATIONS, key=lambda m: m.version):
+        if m.version in applied:
+            continue
+        with engine.begin() as conn:
+            if m.version in applied_versions(conn):
+                continue
+            m.upgrade(conn)
+            conn.execute(
+                insert(schema_migrations).values(
+                    version=m.version,
+                    name=m.name,
+                    applied_at=datetime.now(timezone.utc),
+                )
+            )
+        logger.info("Applied migration %04d_%s", m.version, m.name)
+        done.append(m.version)
+    return done
+
+
+def create_index(conn: Connection, model, name: str) -> None:
+    index = next(i for i in model.__table__.indexes if i.name == name)
+    existing = {i["name"] for i in inspect(conn).get_indexes(model.__tablename__)}
+    if name not in existing:
+        index.create(conn)
+
+
+def add_column(conn: Connection, model, name: str) -> None:
+    existing = {c["name"] for c in inspect(conn).get_columns(model.__tablename__)}
+    if name in existing:
+        return
+    column = model.__table__.c[name]
+    column_type = column.type.compile(dialect=conn.dialect)
+    conn.exec_driver_sql(f"ALTER TABLE {model.__tablename__} ADD COLUMN {name} {column_type}")
+
+
+def merge_duplicate_subscriptions(conn: Connection) -> int:
+    groups = conn.execute(
+        select(Subscription.chat_id, Subscription.repo_id)
+        .group_by(Subscription.chat_id, Subscription.repo_id)
+        .having(func.count() > 1)
+    ).all()
+
+    removed = 0
+    for chat_id, repo_id in groups:
+        rows = conn.execute(
+            select(
+                Subscription.id,
+                Subscription.is_active,
+                Subscription.events,
+                Subscription.branches,
+            )
+            .where(Subscription.chat_id == chat_id, Subscription.repo_id == repo_id)
+            .order_by(Subscription.id)
+        ).all()
+
+        keeper = rows[0]
+        conn.execute(
+            update(Subscription)
+            .where(Subscription.id == keeper.id)
+            .values(
+                is_active=any(r.is_active for r in rows),
+                events=next((r.events for r in reversed(rows) if r.events), None),
+                branches=next((r.branches for r in reversed(rows) if r.branches), None),
+            )
+        )
+        conn.execute(delete(Subscription).where(Subscription.id.in_([r.id for r in rows[1:]])))
+        removed += len(rows) - 1
+    return removed
+
+
+def merge_duplicate_pr_threads(conn: Connection) -> int:
+    groups = conn.execute(
+        select(PRThread.chat_id, PRThread.repo_id, PRThread.pr_number, func.min(PRThread.id))
+        .group_by(PRThread.chat_id, PRThread.repo_id, PRThread.pr_number)
+        .having(func.count() > 1)
+    ).all()
+
+    removed = 0
+    for chat_id, repo_id, pr_number, keeper_id in groups:
+        result = conn.execute(
+            delete(PRThread).where(
+                PRThread.chat_id == chat_id,
+                PRThread.repo_id == repo_id,
+                PRThread.pr_number == pr_number,
+                PRThread.id != keeper_id,
+            )
+        )
+        removed += result.rowcount
+    return removed
+
+
+@migration(1, "hot_query_indexes")
+def _hot_query_indexes(conn: Connection) -> None:
+    create_index(conn, EventLog, "ix_event_logs_chat_id_timestamp")
+    create_index(conn, Subscription, "ix_subscriptions_repo_id_is_active")
+
+    removed = merge_duplicate_subscriptions(conn)
+    if removed:
+        logger.warning("Merged %d duplicate subscription rows", removed)
+    create_index(conn, Subscription, "uq_subscriptions_chat_id_repo_id")
+
+    removed = merge_duplicate_pr_threads(conn)
+    if removed:
+        logger.warning("Removed %d duplicate PR thread rows (kept the original root message)", removed)
+    create_index(conn, PRThread, "uq_pr_threads_chat_id_repo_id_pr_number")
+
+
+@migration(2, "event_logs_timestamp_index")
+def _event_logs_timestamp_index(conn: Connection) -> None:
+    create_index(conn, EventLog, "ix_event_logs_timestamp")
+
+
+@migration(3, "event_rollups_backfill")
+def _event_rollups_backfill(conn: Connection) -> None:
+    rows = backfill_rollups(conn)
+    if rows:
+        logger.info("Backfilled hourly rollups from %d event log rows", rows)
+
+
+@migration(4, "chat_digest_schedule")
+def _chat_digest_schedule(conn: Connection) -> None:
+    add_column(conn, Chat, "digest_time")
+    add_column(conn, Chat, "digest_timezone")
+    add_column(conn, Chat, "last_digest_at")
+
+
+@migration(5, "multi_process_delivery")
+def _multi_process_delivery(conn: Connection) -> None:
+    add_column(conn, WebhookInboxEntry, "claimed_by")
+    add_column(conn, WebhookInboxEntry, "claimed_until")
+    if conn.execute(select(CacheVersion.name).where(CacheVersion.name == ROUTING_VERSION)).first() is None:
+        conn.execute(insert(CacheVersion).values(name=ROUTING_VERSION, version=0))
+
+
+@migration(6, "event_rollups_bucket_start_index")
+def _event_rollups_bucket_start_index(conn: Connection) -> None:
+    create_index(conn, EventRollup, "ix_event_rollups_bucket_start")
+
+
+@migration(7, "workflow_run_messages_updated_at_index")
+def _workflow_run_messages_updated_at_index(conn: Connection) -> None:
+    create_index(conn, WorkflowRunMessage, "ix_workflow_run_messages_updated_at")
+
+
+@migration(8, "chats_digest_time_index")
+def _chats_digest_time_index(conn: Connection) -> None:
+    create_index(conn, Chat, "ix_chats_digest_time")
@@ -6,9 +6,12 @@ from sqlalchemy import (
     Column,
     DateTime,
     ForeignKey,
+    Index,
     Integer,
+    LargeBinary,
     String,
     Text,
+    text,
 )
 from sqlalchemy.orm import relationship
 
@@ -17,11 +20,24 @@ from app.db import Base
 
 class Chat(Base):
     __tablename__ = "chats"
+    # Partial, so the scheduler reads only chats that have a digest time.
+    __table_args__ = (
+        Index(
+            "ix_chats_digest_time",
+            "digest_time",
+            sqlite_where=text("digest_time IS NOT NULL"),
+            postgresql_where=text("digest_time IS NOT NULL"),
+        ),
+    )
 
     id = Column(Integer, primary_key=True, index=True)
     telegram_chat_id = Column(BigInteger, unique=True, index=True, nullable=False)
     title = Column(String, nullable=True)
 
+    digest_time = Column(String, nullable=True)
+    digest_timezone = Column(String, nullable=True)
+    last_digest_at = Column(DateTime(timezone=True), nullable=True)
+
     subscriptions = relationship("Subscription", back_populates="chat")
 
     def __repr__(self) -> str:
@@ -45,6 +61,10 @@ class Repo(Base):
 
 class Subscription(Base):
     __tablename__ = "subscriptions"
+    __table_args__ = (
+        Index("uq_subscriptions_chat_id_repo_id", "chat_id", "repo_id", unique=True),
+        Index("ix_subscriptions_repo_id_is_active", "repo_id", "is_active"),
+    )
 
     id = Column(Integer, primary_key=True, index=True)
     chat_id = Column(Integer, ForeignKey("chats.id"), nullable=False)
@@ -63,6 +83,10 @@ class Subscription(Base):
 
 class EventLog(Base):
     __tablename__ = "event_logs"
+    __table_args__ = (
+        Index("ix_event_logs_chat_id_timestamp", "chat_id", "timestamp"),
+        Index("ix_event_logs_timestamp", "timestamp"),
+    )
 
     id = Column(Integer, primary_key=True, index=True)
     chat_id = Column(Integer, ForeignKey("chats.id"), nullable=False)
@@ -84,8 +108,50 @@ class EventLog(Base):
         return f"<EventLog chat_id={self.chat_id} repo_id={self.repo_id} type={self.event_type}>"
 
 
+class EventRollup(Base):
+    __tablename__ = "event_rollups"
+    __table_args__ = (
+        Index(
+            "uq_event_rollups_chat_bucket_key",
+            "chat_id",
+            "bucket_start",
+            "repo_id",
+            "event_type",
+            "event_subtype",
+            unique=True,
+        ),
+        Index("ix_event_rollups_bucket_start", "bucket_start"),
+    )
+
+    id = Column(Integer, primary_key=True, index=True)
+    chat_id = Column(Integer, ForeignKey("chats.id"), nullable=False)
+    repo_id = Column(Integer, ForeignKey("repos.id"), nullable=False)
+
+    event_type = Column(String, nullable=False)
+    event_subtype = Column(String, nullable=False, default="")
+    bucket_start = Column(DateTime(timezone=True), nullable=False)
+    count = Column(Integer, nullable=False, default=0)
+    last_summary = Column(Text, nullable=True)
+    last_timestamp = Column(DateTime(timezone=True), nullable=False)
+
+    def __repr__(self) -> str:
+        return (
+            f"<EventRollup chat_id={self.chat_id} repo_id={self.repo_id} "
+            f"type={self.event_type}/{self.event_subtype} bucket={self.bucket_start} n={self.count}>"
+        )
+
+
 class PRThread(Base):
     __tablename__ = "pr_threads"
+    __table_args__ = (
+        Index(
+            "uq_pr_threads_chat_id_repo_id_pr_number",
+            "chat_id",
+            "repo_id",
+            "pr_number",
+            unique=True,
+        ),
+    )
 
     id = Column(Integer, primary_key=True, index=True)
     chat_id = Column(Integer, ForeignKey("chats.id"), nullable=False)
@@ -106,3 +172,88 @@ class PRThread(Base):
             f"<PRThread chat_id={self.chat_id} repo_id={self.repo_id} "
             f"pr={self.pr_number} msg={self.root_message_id}>"
         )
+
+
+class WorkflowRunMessage(Base):
+    __tablename__ = "workflow_run_messages"
+    __table_args__ = (
+        Index(
+            "uq_workflow_run_messages_chat_id_run_id",
+            "chat_id",
+            "run_id",
+            unique=True,
+        ),
+        Index("ix_workflow_run_messages_updated_at", "updated_at"),
+    )
+
+    id = Column(Integer, primary_key=True, index=True)
+    chat_id = Column(Integer, ForeignKey("chats.id"), nullable=False)
+    run_id = Column(BigInteger, nullable=False)
+    message_id = Column(Integer, nullable=False)
+    status = Column(String, nullable=False)
+    text_hash = Column(String(64), nullable=False)
+    updated_at = Column(
+        DateTime(timezone=True),
+        nullable=False,
+        default=lambda: datetime.now(timezone.utc),
+        onupdate=lambda: datetime.now(timezone.utc),
+    )
+
+    chat = relationship("Chat")
+
+    def __repr__(self) -> str:
+        return (
+            f"<WorkflowRunMessage chat_id={self.chat_id} run={self.run_id} "
+            f"msg={self.message_id} status={self.status}>"
+        )
+
+
+class WebhookDelivery(Base):
+    __tablename__ = "webhook_deliveries"
+
+    delivery_id = Column(String, primary_key=True)
+    received_at = Column(DateTime(timezone=True), nullable=False, index=True)
+
+    def __repr__(self) -> str:
+        return f"<WebhookDelivery {self.delivery_id} at={self.received_at}>"
+
+
+class WebhookInboxEntry(Base):
+    __tablename__ = "webhook_inbox"
+
+    id = Column(Integer, primary_key=True)
+    delivery_id = Column(String, nullable=True)
+    event = Column(String, nullable=False)
+    body = Column(LargeBinary, nullable=False)
+    received_at = Column(DateTime(timezone=True), nullable=False)
+    attempts = Column(Integer, nullable=False, default=0)
+    claimed_by = Column(String, nullable=True)
+    claimed_until = Column(DateTime(timezone=True), nullable=True)
+
+    def __repr__(self) -> str:
+        return f"<WebhookInboxEntry id={self.id} event={self.event} attempts={self.attempts}>"
+
+
+class WebhookInboxProgress(Base):
+    __tablename__ = "webhook_inbox_progress"
+
+    inbox_id = Column(Integer, ForeignKey("webhook_inbox.id"), primary_key=True)
+    chat_id = Column(Integer, ForeignKey("chats.id"), primary_key=True)
+
+
+class ServiceLease(Base):
+    __tablename__ = "service_leases"
+
+    name = Column(String, primary_key=True)
+    holder = Column(String, nullable=False)
+    expires_at = Column(DateTime(timezone=True), nullable=False)
+
+    def __repr__(self) -> str:
+        return f"<ServiceLease {self.name} holder={self.holder} until={self.expires_at}>"
+
+
+class CacheVersion(Base):
+    __tablename__ = "cache_versions"
+
+    name = Column(String, primary_key=True)
+    version = Column(Integer, nullable=False, default=0)
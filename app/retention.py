@@ -0,0 +1,338 @@
+import argparse
+import asyncio
+import logging
+import re
+from datetime import datetime, timedelta, timezone
+from typing import Any
+
+from sqlalchemy import delete, select, text
+from sqlalchemy.ext.asyncio import AsyncConnection
+
+from app.config import (
+    EVENT_LOG_PARTITIONING,
+    EVENT_LOG_PARTITIONS_AHEAD,
+    EVENT_LOG_PRUNE_CHUNK_PAUSE,
+    EVENT_LOG_PRUNE_CHUNK_SIZE,
+    EVENT_LOG_PRUNE_INTERVAL,
+    EVENT_LOG_RETENTION,
+)
+from app.db import AsyncSessionLocal, async_engine, engine
+from app.models import EventLog, EventRollup, WorkflowRunMessage
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_RULE = "*"
+ROLLUP_BUCKET = timedelta(hours=1)
+WORKFLOW_RUN_EVENT = "workflow_run"
+DURATION_RE = re.compile(r"^(\d+)\s*([dh])$")
+PARTITION_RE = re.compile(r"^event_logs_p(\d{4})(\d{2})$")
+
+
+def parse_duration(value: str) -> timedelta:
+    match = DURATION_RE.match(value.strip().lower())
+    if not match:
+        raise ValueError(f"Invalid retention {value!r}, expected e.g. 7d or 12h")
+    amount, unit = int(match.group(1)), match.group(2)
+    return timedelta(days=amount) if unit == "d" else timedelta(hours=amount)
+
+
+def parse_retention(spec: str) -> dict[str, timedelta]:
+    rules: dict[str, timedelta] = {}
+    for item in spec.split(","):
+        if not item.strip():
+            continue
+        event_type, sep, duration = item.partition("=")
+        if not sep or not event_type.strip():
+            raise ValueError(f"Invalid retention rule {item!r}, expected event_type=duration")
+        rules[event_type.strip()] = parse_duration(duration)
+    return rules
+
+
+def month_start(dt: datetime) -> datetime:
+    return datetime(dt.year, dt.month, 1, tzinfo=timezone.utc)
+
+
+def add_months(dt: datetime, months: int) -> datetime:
+    index = dt.year * 12 + dt.month - 1 + months
+    return dt.replace(year=index // 12, month=index % 12 + 1)
+
+
+def partition_name(start: datetime) -> str:
+    return f"event_logs_p{start:%Y%m}"
+
+
+async def is_partitioned(conn: AsyncConnection) -> bool:
+    if conn.dialect.name != "postgresql":
+        return False
+    return bool(
+        (
+            await conn.execute(
+                text(
+                    "SELECT 1 FROM pg_partitioned_table pt "
+                    "JOIN pg_class c ON c.oid = pt.partrelid "
+                    "WHERE c.relname = 'event_logs'"
+                )
+            )
+        ).scalar()
+    )
+
+
+async def ensure_partitions(conn: AsyncConnection, now: datetime, months_ahead: int) -> None:
+    start = month_start(now)
+    for i in range(months_ahead + 1):
+        lower = add_months(start, i)
+        upper = add_months(start, i + 1)
+        await conn.execute(
+            text(
+                f"CREATE TABLE IF NOT EXISTS {partition_name(lower)} PARTITION OF event_logs "
+                f"FOR VALUES FROM ('{lower.isoformat()}') TO ('{upper.isoformat()}')"
+            )
+        )
+
+
+async def drop_expired_partitions(conn: AsyncConnection, cutoff: datetime) -> list[str]:
+    names = (
+        await conn.execute(
+            text(
+                "SELECT c.relname FROM pg_inherits i "
+                "JOIN pg_class c ON c.oid = i.inhrelid "
+                "JOIN pg_class p ON p.oid = i.inhparent "
+                "WHERE p.relname = 'event_logs'"
+            )
+        )
+    ).scalars().all()
+
+    dropped: list[str] = []
+    for name in names:
+        match = PARTITION_RE.match(name)
+        if not match:
+            continue
+        lower = datetime(int(match.group(1)), int(match.group(2)), 1, tzinfo=timezone.utc)
+        if add_months(lower, 1) <= cutoff:
+            await conn.execute(text(f"DROP TABLE {name}"))
+            dropped.append(name)
+    return dropped
+
+
+class EventLogPruner:
+    def __init__(
+        self,
+        rules: dict[str, timedelta],
+        *,
+        interval: float,
+        chunk_size: int,
+        chunk_pause: float,
+        partitioning: bool = False,
+        partitions_ahead: int = 2,
+    ) -> None:
+        self.rules = rules
+        self.interval = interval
+        self.chunk_size = max(1, chunk_size)
+        self.chunk_pause = chunk_pause
+        self.partitioning = partitioning
+        self.partitions_ahead = partitions_ahead
+        self._task: asyncio.Task | None = None
+        self._stop: asyncio.Event | None = None
+        self.deleted = 0
+        self.deleted_rollups = 0
+        self.deleted_workflow_messages = 0
+        self.dropped_partitions = 0
+        self.runs = 0
+        self.last_run: datetime | None = None
+
+    @property
+    def enabled(self) -> bool:
+        return bool(self.rules) or self.partitioning
+
+    def _conditions(self, now: datetime, timestamp, event_type) -> list[tuple]:
+        explicit = [t for t in self.rules if t != DEFAULT_RULE]
+        conditions = [
+            (timestamp < now - self.rules[t], event_type == t) for t in explicit
+        ]
+        if DEFAULT_RULE in self.rules:
+            condition = [timestamp < now - self.rules[DEFAULT_RULE]]
+            if explicit:
+                condition.append(event_type.not_in(explicit))
+            conditions.append(tuple(condition))
+        return conditions
+
+    async def _delete_chunked(self, model, condition) -> int:
+        total = 0
+        while True:
+            async with AsyncSessionLocal() as db:
+                ids = select(model.id).where(*condition).limit(self.chunk_size)
+                result = await db.execute(
+                    delete(model)
+                    .where(model.id.in_(ids))
+                    .execution_options(synchronize_session=False)
+                )
+                await db.commit()
+            total += result.rowcount
+            if result.rowcount < self.chunk_size:
+                return total
+            await asyncio.sleep(self.chunk_pause)
+
+    async def _maintain_partitions(self, now: datetime) -> int:
+        async with async_engine.begin() as conn:
+            if not await is_partitioned(conn):
+                return 0
+            await ensure_partitions(conn, now, self.partitions_ahead)
+            if DEFAULT_RULE not in self.rules:
+                return 0
+            cutoff = now - max(self.rules.values())
+            dropped = await drop_expired_partitions(conn, cutoff)
+        for name in dropped:
+            logger.info("Dropped expired event log partition %s", name)
+        return len(dropped)
+
+    async def prune_once(self, now: datetime | None = None) -> int:
+        now = now or datetime.now(timezone.utc)
+
+        if self.partitioning:
+            self.dropped_partitions += await self._maintain_partitions(now)
+
+        deleted = 0
+        for condition in self._conditions(now, EventLog.timestamp, EventLog.event_type):
+            deleted += await self._delete_chunked(EventLog, condition)
+
+        # A bucket expires once its whole hour is past the cutoff.
+        rollups = 0
+        for condition in self._conditions(
+            now - ROLLUP_BUCKET, EventRollup.bucket_start, EventRollup.event_type
+        ):
+            rollups += await self._delete_chunked(EventRollup, condition)
+
+        # Runs not updated within the window no longer get their message edited.
+        messages = 0
+        keep = self.rules.get(WORKFLOW_RUN_EVENT, self.rules.get(DEFAULT_RULE))
+        if keep is not None:
+            messages = await self._delete_chunked(
+                WorkflowRunMessage, (WorkflowRunMessage.updated_at < now - keep,)
+            )
+
+        self.deleted += deleted
+        self.deleted_rollups += rollups
+        self.deleted_workflow_messages += messages
+        self.runs += 1
+        self.last_run = now
+        if deleted or rollups or messages:
+            logger.info(
+                "Pruned %d expired event log rows, %d rollup buckets and %d workflow run messages",
+                deleted,
+                rollups,
+                messages,
+            )
+        return deleted
+
+    async def start(self) -> None:
+        if self._task is not None or not self.enabled:
+            return
+        self._stop = asyncio.Event()
+        self._task = asyncio.create_task(self._run(), name="event-log-pruner")
+
+    async def stop(self) -> None:
+        if self._task is None:
+            return
+        assert self._stop is not None
+        self._stop.set()
+        await self._task
+        self._task = None
+
+    def stats(self) -> dict[str, Any]:
+        return {
+            "enabled": self.enabled,
+            "rules": {k: v.total_seconds() for k, v in self.rules.items()},
+            "deleted": self.deleted,
+            "deleted_rollups": self.deleted_rollups,
+            "deleted_workflow_messages": self.deleted_workflow_messages,
+            "dropped_partitions": self.dropped_partitions,
+            "runs": self.runs,
+            "last_run": self.last_run.isoformat() if self.last_run else None,
+        }
+
+    async def _run(self) -> None:
+        assert self._stop is not None
+        while not self._stop.is_set():
+            try:
+                await self.prune_once()
+            except Exception:
+                logger.exception("Event log pruning failed")
+            try:
+                await asyncio.wait_for(self._stop.wait(), timeout=self.interval)
+            except asyncio.TimeoutError:
+                pass
+
+
+def partition_event_logs(months_ahead: int = EVENT_LOG_PARTITIONS_AHEAD) -> None:
+    if engine.dialect.name != "postgresql":
+        raise RuntimeError("EventLog partitioning requires PostgreSQL")
+
+    now = datetime.now(timezone.utc)
+    with engine.begin() as conn:
+        already = conn.execute(
+            text(
+                "SELECT 1 FROM pg_partitioned_table pt "
+                "JOIN pg_class c ON c.oid = pt.partrelid "
+                "WHERE c.relname = 'event_logs'"
+            )
+        ).scalar()
+        if already:
+            logger.info("event_logs is already partitioned")
+            return
+
+        conn.execute(text("ALTER TABLE event_logs RENAME TO event_logs_legacy"))
+        sequence = conn.execute(
+            text("SELECT pg_get_serial_sequence('event_logs_legacy', 'id')")
+        ).scalar()
+        conn.execute(
+            text(
+                "CREATE TABLE event_logs (LIKE event_logs_legacy INCLUDING DEFAULTS) "
+                "PARTITION BY RANGE (timestamp)"
+            )
+        )
+        conn.execute(text("ALTER TABLE event_logs ADD PRIMARY KEY (id, timestamp)"))
+        conn.execute(text("ALTER TABLE event_logs ADD FOREIGN KEY (chat_id) REFERENCES chats (id)"))
+        conn.execute(text("ALTER TABLE event_logs ADD FOREIGN KEY (repo_id) REFERENCES repos (id)"))
+        if sequence:
+            conn.execute(text(f"ALTER SEQUENCE {sequence} OWNED BY event_logs.id"))
+
+        oldest = conn.execute(text("SELECT min(timestamp) FROM event_logs_legacy")).scalar()
+        lower = month_start(oldest or now)
+        upper = add_months(month_start(now), months_ahead + 1)
+        while lower < upper:
+            conn.execute(
+                text(
+                    f"CREATE TABLE {partition_name(lower)} PARTITION OF event_logs "
+                    f"FOR VALUES FROM ('{lower.isoformat()}') "
+                    f"TO ('{add_months(lower, 1).isoformat()}')"
+                )
+            )
+            lower = add_months(lower, 1)
+
+        conn.execute(text("INSERT INTO event_logs SELECT * FROM event_logs_legacy"))
+        conn.execute(text("DROP TABLE event_logs_legacy"))
+        for index in EventLog.__table__.indexes:
+            index.create(conn)
+    logger.info("event_logs converted to a monthly partitioned table")
+
+
+event_log_pruner = EventLogPruner(
+    parse_retention(EVENT_LOG_RETENTION),
+    interval=EVENT_LOG_PRUNE_INTERVAL,
+    chunk_size=EVENT_LOG_PRUNE_CHUNK_SIZE,
+    chunk_pause=EVENT_LOG_PRUNE_CHUNK_PAUSE,
+    partitioning=EVENT_LOG_PARTITIONING,
+    partitions_ahead=EVENT_LOG_PARTITIONS_AHEAD,
+)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="EventLog retention maintenance")
+    parser.add_argument("command", choices=["prune", "partition"])
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO)
+
+    if args.command == "partition":
+        partition_event_logs()
+    else:
+        asyncio.run(event_log_pruner.prune_once())
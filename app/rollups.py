@@ -0,0 +1,175 @@
+from datetime import datetime, timedelta, timezone
+from typing import Any, Iterable
+
+from sqlalchemy import case, select
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.engine import Connection
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.models import EventLog, EventRollup, Repo
+
+KEY_COLUMNS = ["chat_id", "bucket_start", "repo_id", "event_type", "event_subtype"]
+DIALECT_INSERTS = {
+    "sqlite": sqlite.insert,
+    "postgresql": postgresql.insert,
+}
+
+
+def as_utc(ts: datetime) -> datetime:
+    return ts.replace(tzinfo=timezone.utc) if ts.tzinfo is None else ts.astimezone(timezone.utc)
+
+
+def hour_bucket(ts: datetime) -> datetime:
+    return as_utc(ts).replace(minute=0, second=0, microsecond=0)
+
+
+def window_start(hours: int, now: datetime | None = None) -> datetime:
+    return hour_bucket((now or datetime.now(timezone.utc)) - timedelta(hours=hours))
+
+
+def aggregate(rows: Iterable[dict[str, Any]]) -> list[dict[str, Any]]:
+    buckets: dict[tuple, dict[str, Any]] = {}
+    for row in rows:
+        ts = as_utc(row["timestamp"])
+        key = (
+            row["chat_id"],
+            hour_bucket(ts),
+            row["repo_id"],
+            row["event_type"],
+            row["event_subtype"] or "",
+        )
+        bucket = buckets.get(key)
+        if bucket is None:
+            buckets[key] = {
+                **dict(zip(KEY_COLUMNS, key)),
+                "count": 1,
+                "last_summary": row["payload_summary"],
+                "last_timestamp": ts,
+            }
+            continue
+        bucket["count"] += 1
+        if ts >= bucket["last_timestamp"]:
+            bucket["last_summary"] = row["payload_summary"]
+            bucket["last_timestamp"] = ts
+    return list(buckets.values())
+
+
+def summarize(rows: Iterable[tuple]) -> list[dict[str, Any]]:
+    groups: dict[tuple, dict[str, Any]] = {}
+    for full_name, event_type, event_subtype, count, last_summary, last_ts in rows:
+        key = (full_name, event_type, event_subtype)
+        group = groups.get(key)
+        last_ts = as_utc(last_ts)
+        if group is None:
+            groups[key] = {
+                "repo_full_name": full_name,
+                "event_type": event_type,
+                "event_subtype": event_subtype or None,
+                "count": count,
+                "last_summary": last_summary,
+                "last_timestamp": last_ts,
+            }
+            continue
+        group["count"] += count
+        if last_ts >= group["last_timestamp"]:
+            group["last_summary"] = last_summary
+            group["last_timestamp"] = last_ts
+    return sorted(
+        groups.values(),
+        key=lambda g: (g["repo_full_name"], g["event_type"], -g["count"]),
+    )
+
+
+def upsert_statement(dialect_name: str):
+    make_insert = DIALECT_INSERTS.get(dialect_name)
+    if make_insert is None:
+        raise RuntimeError(f"Event rollups are not supported on {dialect_name!r}")
+
+    stmt = make_insert(EventRollup)
+    newer = stmt.excluded.last_timestamp >= EventRollup.last_timestamp
+    return stmt.on_conflict_do_update(
+        index_elements=KEY_COLUMNS,
+        set_={
+            "count": EventRollup.count + stmt.excluded.count,
+            "last_summary": case(
+                (newer, stmt.excluded.last_summary), else_=EventRollup.last_summary
+            ),
+            "last_timestamp": case(
+                (newer, stmt.excluded.last_timestamp), else_=EventRollup.last_timestamp
+            ),
+        },
+    )
+
+
+async def apply_rollups(db: AsyncSession, rows: list[dict[str, Any]]) -> None:
+    values = aggregate(rows)
+    if values:
+        await db.execute(upsert_statement(db.bind.dialect.name), values)
+
+
+def apply_rollups_sync(conn: Connection, rows: list[dict[str, Any]]) -> None:
+    values = aggregate(rows)
+    if values:
+        conn.execute(upsert_statement(conn.dialect.name), values)
+
+
+def backfill_rollups(conn: Connection, batch_size: int = 5000) -> int:
+    last_id = 0
+    total = 0
+    while True:
+        rows = conn.execute(
+            select(
+                EventLog.id,
+                EventLog.chat_id,
+                EventLog.repo_id,
+                EventLog.event_type,
+                EventLog.event_subtype,
+                EventLog.payload_summary,
+                EventLog.timestamp,
+            )
+            .where(EventLog.id > last_id)
+            .order_by(EventLog.id)
+            .limit(batch_size)
+        ).mappings().all()
+        if not rows:
+            return total
+        apply_rollups_sync(conn, [dict(r) for r in rows])
+        last_id = rows[-1]["id"]
+        total += len(rows)
+
+
+def digest_rollup_query(chat_db_id: int, hours: int):
+    return (
+        select(
+            Repo.full_name,
+            EventRollup.event_type,
+            EventRollup.event_subtype,
+            EventRollup.count,
+            EventRollup.last_summary,
+            EventRollup.last_timestamp,
+        )
+        .join(Repo, EventRollup.repo_id == Repo.id)
+        .where(
+            EventRollup.chat_id == chat_db_id,
+            EventRollup.bucket_start >= window_start(hours),
+        )
+    )
+
+
+def digest_rollups_for_chats_query(chat_db_ids: list[int], hours: int):
+    return (
+        select(
+            EventRollup.chat_id,
+            Repo.full_name,
+            EventRollup.event_type,
+            EventRollup.event_subtype,
+            EventRollup.count,
+            EventRollup.last_summary,
+            EventRollup.last_timestamp,
+        )
+        .join(Repo, EventRollup.repo_id == Repo.id)
+        .where(
+            EventRollup.chat_id.in_(chat_db_ids),
+            EventRollup.bucket_start >= window_start(hours),
+        )
+    )
@@ -0,0 +1,194 @@
+import asyncio
+import logging
+import time
+from typing import Any, NamedTuple
+
+from sqlalchemy import select, update
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.branch_filter import BranchMatcher, compile_branch_filter
+from app.config import ROUTING_REFRESH_INTERVAL
+from app.db import AsyncSessionLocal
+from app.metrics import FAST_BUCKETS, Histogram
+from app.models import CacheVersion, Chat, Repo, Subscription
+
+logger = logging.getLogger(__name__)
+
+ROUTING_VERSION = "routing"
+
+ROUTING_SECONDS = Histogram(
+    "notifier_routing_seconds",
+    "Time to match an event against the in-memory subscription index",
+    buckets=FAST_BUCKETS,
+)
+
+
+def bump_routing_version():
+    return (
+        update(CacheVersion)
+        .where(CacheVersion.name == ROUTING_VERSION)
+        .values(version=CacheVersion.version + 1)
+    )
+
+
+def _select_version():
+    return select(CacheVersion.version).where(CacheVersion.name == ROUTING_VERSION)
+
+
+def safe_matcher(branches: str | None, subscription: str) -> BranchMatcher:
+    # Rows stored before filters were validated may not compile; one such row
+    # must not take routing down for every repository.
+    try:
+        return compile_branch_filter(branches)
+    except ValueError as exc:
+        logger.error(
+            "Ignoring invalid branch filter %r of subscription %s, matching all branches: %s",
+            branches,
+            subscription,
+            exc,
+        )
+        return compile_branch_filter(None)
+
+
+class RouteEntry(NamedTuple):
+    chat_tg_id: int
+    chat_db_id: int
+    repo_db_id: int
+    branches: str | None
+    matcher: BranchMatcher
+
+
+class RoutingIndex:
+    def __init__(self, *, refresh_interval: float = ROUTING_REFRESH_INTERVAL) -> None:
+        self._routes: dict[str, tuple[RouteEntry, ...]] = {}
+        self.loaded = False
+        self.version: int | None = None
+        self.refresh_interval = refresh_interval
+        self.reloads = 0
+        self._task: asyncio.Task | None = None
+        self._stop: asyncio.Event | None = None
+
+    async def load_async(self, db: AsyncSession) -> None:
+        self.version = (await db.execute(_select_version())).scalar()
+        self._build((await db.execute(self._select_active())).all())
+
+    async def ensure_loaded(self) -> None:
+        if self.loaded:
+            return
+
+        async with AsyncSessionLocal() as db:
+            await self.load_async(db)
+
+    async def refresh_if_stale(self) -> bool:
+        async with AsyncSessionLocal() as db:
+            version = (await db.execute(_select_version())).scalar()
+            if self.loaded and version == self.version:
+                return False
+            await self.load_async(db)
+        self.reloads += 1
+        return True
+
+    async def start(self) -> None:
+        if self._task is not None:
+            return
+        self._stop = asyncio.Event()
+        self._task = asyncio.create_task(self._run(), name="routing-refresh")
+
+    async def stop(self) -> None:
+        if self._task is None:
+            return
+        assert self._stop is not None
+        self._stop.set()
+        await self._task
+        self._task = None
+
+    async def _run(self) -> None:
+        assert self._stop is not None
+        while not self._stop.is_set():
+            try:
+                await asyncio.wait_for(self._stop.wait(), timeout=self.refresh_interval)
+            except asyncio.TimeoutError:
+                pass
+            try:
+                await self.refresh_if_stale()
+            except Exception:
+                logger.exception("Routing index refresh failed")
+
+    @staticmethod
+    def _select_active():
+        return (
+            select(
+                Subscription.id,
+                Repo.full_name,
+                Chat.telegram_chat_id,
+                Subscription.chat_id,
+                Subscription.repo_id,
+                Subscription.branches,
+            )
+            .join(Chat, Subscription.chat_id == Chat.id)
+            .join(Repo, Subscription.repo_id == Repo.id)
+            .where(Subscription.is_active.is_(True))
+        )
+
+    def _build(self, rows) -> None:
+        routes: dict[str, list[RouteEntry]] = {}
+        for subscription_id, full_name, chat_tg_id, chat_db_id, repo_db_id, branches in rows:
+            routes.setdefault(full_name, []).append(
+                RouteEntry(
+                    chat_tg_id=chat_tg_id,
+                    chat_db_id=chat_db_id,
+                    repo_db_id=repo_db_id,
+                    branches=branches,
+                    matcher=safe_matcher(branches, str(subscription_id)),
+                )
+            )
+
+        self._routes = {name: tuple(entries) for name, entries in routes.items()}
+        self.loaded = True
+
+    def route(self, full_name: str, branch: str) -> list[RouteEntry]:
+        start = time.perf_counter()
+        routes = [e for e in self._routes.get(full_name.strip(), ()) if e.matcher(branch)]
+        ROUTING_SECONDS.observe(time.perf_counter() - start)
+        return routes
+
+    def entries(self, full_name: str) -> tuple[RouteEntry, ...]:
+        return self._routes.get(full_name.strip(), ())
+
+    def upsert(
+        self,
+        full_name: str,
+        *,
+        chat_tg_id: int,
+        chat_db_id: int,
+        repo_db_id: int,
+        branches: str | None,
+    ) -> None:
+        entry = RouteEntry(
+            chat_tg_id=chat_tg_id,
+            chat_db_id=chat_db_id,
+            repo_db_id=repo_db_id,
+            branches=branches,
+            matcher=safe_matcher(branches, f"chat {chat_db_id} -> {full_name}"),
+        )
+        others = [e for e in self.entries(full_name) if e.chat_db_id != chat_db_id]
+        self._routes[full_name.strip()] = tuple(others) + (entry,)
+
+    def remove(self, full_name: str, chat_db_id: int) -> None:
+        full_name = full_name.strip()
+        remaining = tuple(e for e in self.entries(full_name) if e.chat_db_id != chat_db_id)
+        if remaining:
+            self._routes[full_name] = remaining
+        else:
+            self._routes.pop(full_name, None)
+
+    def stats(self) -> dict[str, Any]:
+        return {
+            "repos": len(self._routes),
+            "subscriptions": sum(len(v) for v in self._routes.values()),
+            "version": self.version,
+            "reloads": self.reloads,
+        }
+
+
+routing_index = RoutingIndex(refresh_interval=ROUTING_REFRESH_INTERVAL)
@@ -0,0 +1,215 @@
+import asyncio
+import logging
+import time
+from typing import Any, Awaitable, Callable, TypeVar
+
+from aiogram import Bot
+from aiogram.exceptions import TelegramRetryAfter
+
+from app.bot_instance import bot
+from app.metrics import Counter, Histogram
+from app.config import (
+    SEND_CHAT_RATE,
+    SEND_GLOBAL_RATE,
+    SEND_GROUP_RATE_PER_MINUTE,
+    SEND_MAX_RETRIES,
+)
+
+logger = logging.getLogger(__name__)
+
+T = TypeVar("T")
+
+MAX_IDLE_CHAT_BUCKETS = 10_000
+
+SEND_SECONDS = Histogram(
+    "notifier_telegram_request_seconds",
+    "Latency of Telegram Bot API calls",
+    ["method"],
+)
+SEND_WAIT_SECONDS = Histogram(
+    "notifier_telegram_rate_limit_wait_seconds",
+    "Time spent waiting for the send rate limiter",
+)
+SENDS = Counter(
+    "notifier_telegram_requests",
+    "Telegram Bot API calls by outcome (ok, rate_limited, error)",
+    ["method", "outcome"],
+)
+
+
+class TokenBucket:
+    def __init__(self, rate: float, capacity: float) -> None:
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated = time.monotonic()
+
+    def _refill(self, now: float) -> None:
+        if now > self.updated:
+            self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+            self.updated = now
+
+    def delay(self, now: float) -> float:
+        self._refill(now)
+        if self.tokens >= 1:
+            return 0.0
+        return (1 - self.tokens) / self.rate
+
+    def consume(self, now: float) -> None:
+        self._refill(now)
+        self.tokens -= 1
+
+    def is_full(self, now: float) -> bool:
+        self._refill(now)
+        return self.tokens >= self.capacity
+
+
+class ChatLimiter:
+    def __init__(self, buckets: list[TokenBucket]) -> None:
+        self.buckets = buckets
+        self.paused_until = 0.0
+
+    def delay(self, now: float) -> float:
+        return max([self.paused_until - now] + [b.delay(now) for b in self.buckets])
+
+    def consume(self, now: float) -> None:
+        for b in self.buckets:
+            b.consume(now)
+
+    def is_idle(self, now: float) -> bool:
+        return self.paused_until <= now and all(b.is_full(now) for b in self.buckets)
+
+
+class SendScheduler:
+    def __init__(
+        self,
+        bot: Bot,
+        *,
+        global_rate: float,
+        chat_rate: float,
+        group_rate_per_minute: float,
+        max_retries: int,
+    ) -> None:
+        self.bot = bot
+        self.chat_rate = chat_rate
+        self.group_rate_per_minute = group_rate_per_minute
+        self.max_retries = max_retries
+        self._global = TokenBucket(rate=global_rate, capacity=global_rate)
+        self._paused_until = 0.0
+        self._chats: dict[int, ChatLimiter] = {}
+        self._lock = asyncio.Lock()
+        self.sent = 0
+        self.retried = 0
+        self.failed = 0
+
+    def _limiter(self, chat_id: int) -> ChatLimiter:
+        limiter = self._chats.get(chat_id)
+        if limiter is not None:
+            return limiter
+
+        if len(self._chats) >= MAX_IDLE_CHAT_BUCKETS:
+            now = time.monotonic()
+            for key in [k for k, v in self._chats.items() if v.is_idle(now)]:
+                del self._chats[key]
+
+        buckets = [TokenBucket(rate=self.chat_rate, capacity=1)]
+        if chat_id < 0:
+            buckets.append(
+                TokenBucket(
+                    rate=self.group_rate_per_minute / 60,
+                    capacity=self.group_rate_per_minute,
+                )
+            )
+        limiter = ChatLimiter(buckets)
+        self._chats[chat_id] = limiter
+        return limiter
+
+    async def _acquire(self, chat_id: int) -> None:
+        while True:
+            async with self._lock:
+                now = time.monotonic()
+                limiter = self._limiter(chat_id)
+                wait = max(self._paused_until - now, self._global.delay(now), limiter.delay(now))
+                if wait <= 0:
+                    self._global.consume(now)
+                    limiter.consume(now)
+                    return
+            await asyncio.sleep(wait)
+
+    async def call(
+        self,
+        chat_id: int,
+        method: Callable[[], Awaitable[T]],
+        *,
+        name: str = "call",
+    ) -> T:
+        attempt = 0
+        while True:
+            start = time.perf_counter()
+            await self._acquire(chat_id)
+            sent_at = time.perf_counter()
+            SEND_WAIT_SECONDS.observe(sent_at - start)
+            try:
+                result = await method()
+            except TelegramRetryAfter as exc:
+                SEND_SECONDS.labels(name).observe(time.perf_counter() - sent_at)
+                SENDS.labels(name, "rate_limited").inc()
+                attempt += 1
+                if attempt > self.max_retries:
+                    self.failed += 1
+                    raise
+                self.retried += 1
+                logger.warning(
+                    "Telegram asked to retry chat %s in %ss (attempt %d)",
+                    chat_id,
+                    exc.retry_after,
+                    attempt,
+                )
+                # Telegram does not say which limit was hit, so the global
+                # bucket waits too instead of flooding other chats.
+                resume_at = time.monotonic() + exc.retry_after
+                limiter = self._limiter(chat_id)
+                limiter.paused_until = max(limiter.paused_until, resume_at)
+                self._paused_until = max(self._paused_until, resume_at)
+                continue
+            except Exception:
+                SEND_SECONDS.labels(name).observe(time.perf_counter() - sent_at)
+                SENDS.labels(name, "error").inc()
+                self.failed += 1
+                raise
+            SEND_SECONDS.labels(name).observe(time.perf_counter() - sent_at)
+            SENDS.labels(name, "ok").inc()
+            self.sent += 1
+            return result
+
+    async def send_message(self, chat_id: int, **kwargs: Any):
+        return await self.call(
+            chat_id,
+            lambda: self.bot.send_message(chat_id=chat_id, **kwargs),
+            name="send_message",
+        )
+
+    async def edit_message_text(self, chat_id: int, **kwargs: Any):
+        return await self.call(
+            chat_id,
+            lambda: self.bot.edit_message_text(chat_id=chat_id, **kwargs),
+            name="edit_message_text",
+        )
+
+    def stats(self) -> dict[str, Any]:
+        return {
+            "sent": self.sent,
+            "retried": self.retried,
+            "failed": self.failed,
+            "tracked_chats": len(self._chats),
+            "paused_for": round(max(0.0, self._paused_until - time.monotonic()), 3),
+        }
+
+
+send_scheduler = SendScheduler(
+    bot,
+    global_rate=SEND_GLOBAL_RATE,
+    chat_rate=SEND_CHAT_RATE,
+    group_rate_per_minute=SEND_GROUP_RATE_PER_MINUTE,
+    max_retries=SEND_MAX_RETRIES,
+)
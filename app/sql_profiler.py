@@ -0,0 +1,186 @@
+import logging
+import re
+import time
+from collections import deque
+from contextlib import contextmanager, nullcontext
+from contextvars import ContextVar
+from dataclasses import dataclass, field
+from typing import Any, ContextManager, Iterator
+
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+from app.config import (
+    SQL_INSTRUMENTATION,
+    SQL_N_PLUS_ONE_THRESHOLD,
+    SQL_PROFILE_HISTORY,
+    SQL_SLOW_QUERY_MS,
+)
+
+logger = logging.getLogger(__name__)
+
+SLOWEST_PER_UNIT = 5
+
+_PLACEHOLDER_LIST = re.compile(r"\((?:\s*(?:\?|%s|\$\d+|%\(\w+\)s|:\w+)\s*,?)+\)")
+_WHITESPACE = re.compile(r"\s+")
+
+
+def statement_shape(statement: str) -> str:
+    return _PLACEHOLDER_LIST.sub("(?)", _WHITESPACE.sub(" ", statement).strip())
+
+
+@dataclass
+class UnitOfWork:
+    kind: str
+    name: str
+    started: float = field(default_factory=time.perf_counter)
+    queries: int = 0
+    db_time: float = 0.0
+    shapes: dict[str, list[float]] = field(default_factory=dict)
+    slowest: list[tuple[float, str]] = field(default_factory=list)
+
+    def record(self, statement: str, elapsed: float) -> None:
+        self.queries += 1
+        self.db_time += elapsed
+        shape = statement_shape(statement)
+        totals = self.shapes.get(shape)
+        if totals is None:
+            self.shapes[shape] = [1, elapsed]
+        else:
+            totals[0] += 1
+            totals[1] += elapsed
+        if len(self.slowest) < SLOWEST_PER_UNIT or elapsed > self.slowest[-1][0]:
+            self.slowest.append((elapsed, shape))
+            self.slowest.sort(key=lambda item: item[0], reverse=True)
+            del self.slowest[SLOWEST_PER_UNIT:]
+
+    def repeated(self, threshold: int) -> list[dict[str, Any]]:
+        return [
+            {"statement": shape, "count": int(count), "db_ms": round(total * 1000, 3)}
+            for shape, (count, total) in self.shapes.items()
+            if count >= threshold
+        ]
+
+    def report(self, threshold: int) -> dict[str, Any]:
+        return {
+            "kind": self.kind,
+            "name": self.name,
+            "duration_ms": round((time.perf_counter() - self.started) * 1000, 3),
+            "queries": self.queries,
+            "db_ms": round(self.db_time * 1000, 3),
+            "slowest": [
+                {"statement": shape, "db_ms": round(elapsed * 1000, 3)}
+                for elapsed, shape in self.slowest
+            ],
+            "n_plus_one": self.repeated(threshold),
+        }
+
+
+current_unit: ContextVar[UnitOfWork | None] = ContextVar("current_sql_unit", default=None)
+
+
+class SqlProfiler:
+    def __init__(
+        self,
+        *,
+        enabled: bool,
+        slow_query_ms: float,
+        n_plus_one_threshold: int,
+        history: int,
+    ) -> None:
+        self.enabled = enabled
+        self.slow_query = slow_query_ms / 1000
+        self.n_plus_one_threshold = max(2, n_plus_one_threshold)
+        self.recent: deque[dict[str, Any]] = deque(maxlen=history)
+        self.flagged: deque[dict[str, Any]] = deque(maxlen=history)
+        self._engines: list[Engine] = []
+        self.statements = 0
+        self.slow_statements = 0
+        self.units = 0
+
+    def install(self, engine: Engine) -> None:
+        if not self.enabled or engine in self._engines:
+            return
+        event.listen(engine, "before_cursor_execute", self._before_cursor_execute)
+        event.listen(engine, "after_cursor_execute", self._after_cursor_execute)
+        self._engines.append(engine)
+
+    # The start time lives on the execution context rather than a per-connection
+    # stack, so a statement that raises does not leave a stale entry behind.
+    def _before_cursor_execute(self, conn, cursor, statement, parameters, context, executemany) -> None:
+        if context is not None:
+            context._sql_profiler_started = time.perf_counter()
+
+    def _after_cursor_execute(self, conn, cursor, statement, parameters, context, executemany) -> None:
+        started = getattr(context, "_sql_profiler_started", None)
+        if started is None:
+            return
+        elapsed = time.perf_counter() - started
+        self.statements += 1
+        unit = current_unit.get()
+        if unit is not None:
+            unit.record(statement, elapsed)
+        if elapsed >= self.slow_query:
+            self.slow_statements += 1
+            logger.warning(
+                "Slow SQL (%.1f ms%s): %s",
+                elapsed * 1000,
+                f" in {unit.kind} {unit.name}" if unit is not None else "",
+                statement_shape(statement),
+            )
+
+    def unit(self, kind: str, name: str) -> ContextManager[UnitOfWork | None]:
+        if not self._engines:
+            return nullcontext()
+        return self._unit(kind, name)
+
+    @contextmanager
+    def _unit(self, kind: str, name: str) -> Iterator[UnitOfWork]:
+        unit = UnitOfWork(kind=kind, name=name)
+        token = current_unit.set(unit)
+        try:
+            yield unit
+        finally:
+            current_unit.reset(token)
+            self._finish(unit)
+
+    def _finish(self, unit: UnitOfWork) -> None:
+        self.units += 1
+        report = unit.report(self.n_plus_one_threshold)
+        self.recent.append(report)
+        if report["n_plus_one"]:
+            self.flagged.append(report)
+            for repeated in report["n_plus_one"]:
+                logger.warning(
+                    "Possible N+1 in %s %s: %d x %s",
+                    unit.kind,
+                    unit.name,
+                    repeated["count"],
+                    repeated["statement"],
+                )
+
+    def stats(self) -> dict[str, Any]:
+        return {
+            "enabled": bool(self._engines),
+            "statements": self.statements,
+            "slow_statements": self.slow_statements,
+            "units": self.units,
+            "flagged_units": len(self.flagged),
+        }
+
+    def snapshot(self) -> dict[str, Any]:
+        return {
+            **self.stats(),
+            "slow_query_ms": self.slow_query * 1000,
+            "n_plus_one_threshold": self.n_plus_one_threshold,
+            "recent": list(self.recent),
+            "n_plus_one": list(self.flagged),
+        }
+
+
+sql_profiler = SqlProfiler(
+    enabled=SQL_INSTRUMENTATION,
+    slow_query_ms=SQL_SLOW_QUERY_MS,
+    n_plus_one_threshold=SQL_N_PLUS_ONE_THRESHOLD,
+    history=SQL_PROFILE_HISTORY,
+)
@@ -0,0 +1,135 @@
+import os
+from dataclasses import dataclass, field
+from typing import Any
+
+from dotenv import load_dotenv
+from sqlalchemy import create_engine, event
+from sqlalchemy.engine import Engine, make_url
+from sqlalchemy.ext.asyncio import AsyncEngine, create_async_engine
+from sqlalchemy.pool import AsyncAdaptedQueuePool, QueuePool
+
+load_dotenv()
+
+DB_PROFILE = os.getenv("DB_PROFILE", "auto")
+
+
+def _env_int(name: str, default: int | None) -> int | None:
+    value = os.getenv(name)
+    return int(value) if value else default
+
+
+@dataclass(frozen=True)
+class StorageProfile:
+    name: str
+    pragmas: dict[str, Any] = field(default_factory=dict)
+    pool_size: int | None = None
+    max_overflow: int | None = None
+    pool_pre_ping: bool = False
+    pool_recycle: int | None = None
+
+
+PROFILES = {
+    "default": StorageProfile(name="default"),
+    "sqlite": StorageProfile(
+        name="sqlite",
+        pragmas={
+            "journal_mode": os.getenv("SQLITE_JOURNAL_MODE", "WAL"),
+            "synchronous": os.getenv("SQLITE_SYNCHRONOUS", "NORMAL"),
+            "busy_timeout": _env_int("SQLITE_BUSY_TIMEOUT_MS", 5000),
+            "mmap_size": _env_int("SQLITE_MMAP_SIZE", 256 * 1024 * 1024),
+            "cache_size": _env_int("SQLITE_CACHE_SIZE", -64 * 1024),
+            "temp_store": "MEMORY",
+        },
+        pool_size=_env_int("DB_POOL_SIZE", 5),
+        max_overflow=_env_int("DB_MAX_OVERFLOW", 10),
+    ),
+    "postgres": StorageProfile(
+        name="postgres",
+        pool_size=_env_int("DB_POOL_SIZE", 10),
+        max_overflow=_env_int("DB_MAX_OVERFLOW", 20),
+        pool_pre_ping=True,
+        pool_recycle=_env_int("DB_POOL_RECYCLE", 1800),
+    ),
+}
+
+
+PROFILE_BACKENDS = {
+    "sqlite": "sqlite",
+    "postgres": "postgresql",
+}
+
+
+def resolve_profile(url: str, name: str | None = None) -> StorageProfile:
+    name = (name or DB_PROFILE).lower()
+    backend = make_url(url).get_backend_name()
+
+    if name == "auto":
+        name = next((p for p, b in PROFILE_BACKENDS.items() if b == backend), "default")
+
+    profile = PROFILES.get(name)
+    if profile is None:
+        raise ValueError(f"Unknown DB_PROFILE {name!r}, expected one of {sorted(PROFILES)}")
+    if name in PROFILE_BACKENDS and PROFILE_BACKENDS[name] != backend:
+        raise ValueError(f"DB_PROFILE {name!r} does not match database backend {backend!r}")
+    return profile
+
+
+def _is_memory_sqlite(url: str) -> bool:
+    parsed = make_url(url)
+    return parsed.get_backend_name() == "sqlite" and parsed.database in (None, "", ":memory:")
+
+
+def engine_options(url: str, profile: StorageProfile, *, is_async: bool = False) -> dict[str, Any]:
+    options: dict[str, Any] = {"echo": False}
+    if not is_async:
+        options["future"] = True
+
+    backend = make_url(url).get_backend_name()
+    if backend == "sqlite" and not is_async:
+        options["connect_args"] = {"check_same_thread": False}
+
+    if _is_memory_sqlite(url):
+        return options
+
+    if backend == "sqlite" and profile.pool_size is not None:
+        options["poolclass"] = AsyncAdaptedQueuePool if is_async else QueuePool
+    if profile.pool_size is not None:
+        options["pool_size"] = profile.pool_size
+    if profile.max_overflow is not None:
+        options["max_overflow"] = profile.max_overflow
+    if profile.pool_pre_ping:
+        options["pool_pre_ping"] = True
+    if profile.pool_recycle is not None:
+        options["pool_recycle"] = profile.pool_recycle
+    return options
+
+
+def install_pragmas(engine: Engine, profile: StorageProfile) -> None:
+    pragmas = {k: v for k, v in profile.pragmas.items() if v is not None}
+    if not pragmas:
+        return
+
+    @event.listens_for(engine, "connect")
+    def set_sqlite_pragmas(dbapi_connection, connection_record):
+        cursor = dbapi_connection.cursor()
+        try:
+            for name, value in pragmas.items():
+                cursor.execute(f"PRAGMA {name}={value}")
+        finally:
+            cursor.close()
+
+
+def create_sync_engine(url: str, profile: StorageProfile | str | None = None) -> Engine:
+    if not isinstance(profile, StorageProfile):
+        profile = resolve_profile(url, profile)
+    engine = create_engine(url, **engine_options(url, profile))
+    install_pragmas(engine, profile)
+    return engine
+
+
+def create_async_db_engine(url: str, profile: StorageProfile | str | None = None) -> AsyncEngine:
+    if not isinstance(profile, StorageProfile):
+        profile = resolve_profile(url, profile)
+    engine = create_async_engine(url, **engine_options(url, profile, is_async=True))
+    install_pragmas(engine.sync_engine, profile)
+    return engine
@@ -0,0 +1,128 @@
+import asyncio
+import logging
+import time
+from typing import Any
+
+from app.config import WORKER_CLAIM_TTL, WORKER_POLL_INTERVAL
+from app.delivery import DeliveryJob, DeliveryQueue, delivery_queue
+from app.inbox import WebhookInbox, webhook_inbox
+from app.leases import PROCESS_ID
+from integrations.github.payloads import decode_event
+from integrations.github.router import EVENT_HANDLERS
+
+logger = logging.getLogger(__name__)
+
+
+class InboxConsumer:
+    def __init__(
+        self,
+        inbox: WebhookInbox,
+        queue: DeliveryQueue,
+        *,
+        poll_interval: float,
+        claim_ttl: float,
+        holder: str = PROCESS_ID,
+    ) -> None:
+        self.inbox = inbox
+        self.queue = queue
+        self.poll_interval = poll_interval
+        self.claim_ttl = claim_ttl
+        self.holder = holder
+        self._inflight: set[int] = set()
+        self._task: asyncio.Task | None = None
+        self._stop: asyncio.Event | None = None
+        self.claimed = 0
+        self.skipped = 0
+
+    @property
+    def capacity(self) -> int:
+        return self.queue.workers * 2
+
+    def _job(self, entry: Any, done_targets: frozenset[int]) -> DeliveryJob | None:
+        handler = EVENT_HANDLERS.get(entry.event)
+        try:
+            payload = decode_event(entry.event, entry.body)
+        except ValueError:
+            handler = None
+        if handler is None:
+            return None
+
+        async def run(payload: Any) -> None:
+            try:
+                await handler(payload)
+            finally:
+                self._inflight.discard(entry.id)
+
+        return DeliveryJob(
+            event=entry.event,
+            payload=payload,
+            handler=run,
+            inbox_id=entry.id,
+            done_targets=done_targets,
+        )
+
+    async def poll_once(self) -> int:
+        free = self.capacity - len(self._inflight)
+        if free <= 0:
+            return 0
+
+        claimed = await self.inbox.claim(self.holder, free, self.claim_ttl)
+        for entry, done_targets in claimed:
+            job = self._job(entry, done_targets)
+            if job is None:
+                self.skipped += 1
+                self.inbox.mark_done(entry.id)
+                continue
+            self._inflight.add(entry.id)
+            await self.queue.put(job)
+        self.claimed += len(claimed)
+        return len(claimed)
+
+    async def start(self) -> None:
+        if self._task is not None:
+            return
+        self._stop = asyncio.Event()
+        self._task = asyncio.create_task(self._run(), name="inbox-consumer")
+
+    async def stop(self) -> None:
+        if self._task is None:
+            return
+        assert self._stop is not None
+        self._stop.set()
+        await self._task
+        self._task = None
+
+    def stats(self) -> dict[str, Any]:
+        return {
+            "holder": self.holder,
+            "inflight": len(self._inflight),
+            "claimed": self.claimed,
+            "skipped": self.skipped,
+        }
+
+    async def _run(self) -> None:
+        assert self._stop is not None
+        extended_at = time.monotonic()
+        while not self._stop.is_set():
+            claimed = 0
+            try:
+                claimed = await self.poll_once()
+                if time.monotonic() - extended_at > self.claim_ttl / 3:
+                    await self.inbox.extend(self.holder, list(self._inflight), self.claim_ttl)
+                    extended_at = time.monotonic()
+            except Exception:
+                logger.exception("Polling the webhook inbox failed")
+            if claimed:
+                continue
+            try:
+                await asyncio.wait_for(self._stop.wait(), timeout=self.poll_interval)
+            except asyncio.TimeoutError:
+                pass
+
+
+inbox_consumer = InboxConsumer(
+    webhook_inbox,
+    delivery_queue,
+    poll_interval=WORKER_POLL_INTERVAL,
+    claim_ttl=WORKER_CLAIM_TTL,
+)
@@ -1,9 +1,19 @@
-from aiogram import Router
-from aiogram.filters import CommandStart, Command
-from aiogram.types import Message
+import html
 
-from app.db import SessionLocal
-from app import crud
+from aiogram import F, Router
+from aiogram.filters import CommandStart, Command
+from aiogram.types import CallbackQuery, InlineKeyboardButton, InlineKeyboardMarkup, Message
+
+from app.db import AsyncSessionLocal
+from app.digest import (
+    CALLBACK_PREFIX as DIGEST_CALLBACK_PREFIX,
+    DigestCursor,
+    render_digest_page,
+    render_rollup_digest,
+    split_message,
+)
+from app import async_crud
+from app.digest_scheduler import parse_digest_time, resolve_timezone
 
 router = Router()
 
@@ -13,8 +23,8 @@ async def cmd_start(message: Message):
     chat_id = message.chat.id
     title = message.chat.title or message.chat.full_name or message.chat.username
 
-    with SessionLocal() as db:
-        crud.get_or_create_chat(db, telegram_chat_id=chat_id, title=title)
+    async with AsyncSessionLocal() as db:
+        await async_crud.resolve_chat(db, telegram_chat_id=chat_id, title=title)
 
     await message.answer(
         "Привет! Я DevTeam Notifier Bot.\n"
@@ -26,7 +36,9 @@ async def cmd_start(message: Message):
         "<code>/link_repo example/repo</code>\n\n"
         "Посмотреть текущие подписки: <code>/subscriptions</code>\n"
         "Настроить фильтр по веткам: <code>/set_branches owner/repo main,develop</code>\n"
-        "Дайджест событий за сутки: <code>/daily_digest</code>"
+        "Дайджест событий за сутки: <code>/daily_digest</code>\n"
+        "Краткая сводка по счётчикам: <code>/daily_digest 7d summary</code>\n"
+        "Ежедневная сводка по расписанию: <code>/digest_schedule 09:00 Europe/Moscow</code>"
     )
 
 
@@ -56,10 +68,10 @@ async def cmd_link_repo(message: Message):
     chat_id = message.chat.id
     title = message.chat.title or message.chat.full_name or message.chat.username
 
-    with SessionLocal() as db:
-        chat = crud.get_or_create_chat(db, telegram_chat_id=chat_id, title=title)
-        repo = crud.get_or_create_repo(db, full_name=full_name)
-        crud.subscribe_chat_to_repo(db, chat, repo)
+    async with AsyncSessionLocal() as db:
+        chat = await async_crud.resolve_chat(db, telegram_chat_id=chat_id, title=title)
+        repo = await async_crud.get_or_create_repo(db, full_name=full_name)
+        await async_crud.subscribe_chat_to_repo(db, chat, repo)
 
     await message.answer(
         f"✅ Чат подписан на репозиторий <code>{full_name}</code>.\n"
@@ -72,9 +84,9 @@ async def cmd_subscriptions(message: Message):
     chat_id = message.chat.id
     title = message.chat.title or message.chat.full_name or message.chat.username
 
-    with SessionLocal() as db:
-        chat = crud.get_or_create_chat(db, telegram_chat_id=chat_id, title=title)
-        subs = crud.get_subscriptions_for_chat(db, chat)
+    async with AsyncSessionLocal() as db:
+        chat = await async_crud.resolve_chat(db, telegram_chat_id=chat_id, title=title)
+        subs = await async_crud.get_subscriptions_for_chat(db, chat)
 
         if not subs:
             text = "❌ Для этого чата пока нет активных подписок на репозитории."
@@ -113,9 +125,9 @@ async def cmd_unlink_repo(message: Message):
     chat_id = message.chat.id
     title = message.chat.title or message.chat.full_name or message.chat.username
 
-    with SessionLocal() as db:
-        chat = crud.get_or_create_chat(db, telegram_chat_id=chat_id, title=title)
-        ok = crud.unsubscribe_chat_from_repo(db, chat, full_name=full_name)
+    async with AsyncSessionLocal() as db:
+        chat = await async_crud.resolve_chat(db, telegram_chat_id=chat_id, title=title)
+        ok = await async_crud.unsubscribe_chat_from_repo(db, chat, full_name=full_name)
 
     if ok:
         await message.answer(
@@ -149,32 +161,39 @@ async def cmd_set_branches(message: Message):
     chat_id = message.chat.id
     title = message.chat.title or message.chat.full_name or message.chat.username
 
-    with SessionLocal() as db:
-        chat = crud.get_or_create_chat(db, telegram_chat_id=chat_id, title=title)
-        ok = crud.set_branches_for_subscription(db, chat, full_name, branches_str)
+    try:
+        async with AsyncSessionLocal() as db:
+            chat = await async_crud.resolve_chat(db, telegram_chat_id=chat_id, title=title)
+            ok = await async_crud.set_branches_for_subscription(db, chat, full_name, branches_str)
+    except ValueError as exc:
+        await message.answer(f"Некорректный фильтр веток: <code>{html.escape(str(exc))}</code>")
+        return
 
     if not ok:
         await message.answer(
             "Не нашёл подписки на этот репозиторий.\n"
-            f"Сначала подпишись: <code>/link_repo {full_name}</code>"
+            f"Сначала подпишись: <code>/link_repo {html.escape(full_name)}</code>"
         )
         return
 
     await message.answer(
-        f"✅ Для <code>{full_name}</code> установлен фильтр по веткам:\n"
-        f"<code>{branches_str}</code>\n\n"
-        "Поддерживаются точные имена и шаблоны с <code>/*</code>, например:\n"
-        "<code>main,develop,release/*</code>"
+        f"✅ Для <code>{html.escape(full_name)}</code> установлен фильтр по веткам:\n"
+        f"<code>{html.escape(branches_str)}</code>\n\n"
+        "Поддерживаются точные имена, шаблоны (<code>release/*</code>, "
+        "<code>release/**</code>, <code>feature-*</code>), исключения "
+        "(<code>!wip/*</code>) и регулярные выражения (<code>re:^hotfix-\\d+$</code>)."
     )
 
 
 @router.message(Command("daily_digest"))
 async def cmd_daily_digest(message: Message):
-    parts = message.text.split(maxsplit=1)
     hours = 24
-    if len(parts) == 2:
-        arg = parts[1].strip()
-        if arg.endswith("d") and arg[:-1].isdigit():
+    summary_mode = False
+    for arg in message.text.split()[1:]:
+        arg = arg.strip().lower()
+        if arg in {"summary", "s"}:
+            summary_mode = True
+        elif arg.endswith("d") and arg[:-1].isdigit():
             hours = int(arg[:-1]) * 24
         elif arg.isdigit():
             hours = int(arg)
@@ -182,26 +201,102 @@ async def cmd_daily_digest(message: Message):
     chat_id = message.chat.id
     title = message.chat.title or message.chat.full_name or message.chat.username
 
-    with SessionLocal() as db:
-        chat = crud.get_or_create_chat(db, telegram_chat_id=chat_id, title=title)
-        summaries = crud.get_daily_digest_for_chat_summaries(db, chat, hours=hours)
+    if summary_mode:
+        async with AsyncSessionLocal() as db:
+            chat = await async_crud.resolve_chat(db, telegram_chat_id=chat_id, title=title)
+            groups = await async_crud.get_digest_rollup_for_chat(db, chat, hours=hours)
 
-    if not summaries:
+        if not groups:
+            await message.answer(f"За последние {hours} часов событий не было 🌿")
+            return
+        for chunk in split_message(render_rollup_digest(groups, hours)):
+            await message.answer(chunk)
+        return
+
+    cursor = DigestCursor.start(hours)
+    async with AsyncSessionLocal() as db:
+        chat = await async_crud.resolve_chat(db, telegram_chat_id=chat_id, title=title)
+        text, next_cursor = await render_digest_page(db, chat.id, cursor)
+
+    if text is None:
         await message.answer(f"За последние {hours} часов событий не было 🌿")
         return
 
-    lines: list[str] = []
-    lines.append(f"📊 Дайджест за последние {hours} ч:")
+    await message.answer(text, reply_markup=digest_keyboard(next_cursor))
 
-    for item in summaries:
-        ts = item["timestamp"].strftime("%Y-%m-%d %H:%M")
-        repo_name = item["repo_full_name"]
-        et = item["event_type"]
-        st = item["event_subtype"] or ""
-        summary = item["payload_summary"] or ""
-        lines.append(
-            f"• [{ts}] <code>{repo_name}</code> — {et}/{st}: {summary}"
+
+@router.message(Command("digest_schedule"))
+async def cmd_digest_schedule(message: Message):
+    parts = message.text.split()[1:]
+    if not parts:
+        await message.answer(
+            "Укажи время и (необязательно) часовой пояс:\n"
+            "<code>/digest_schedule 09:00 Europe/Moscow</code>\n"
+            "Отключить: <code>/digest_schedule off</code>"
         )
+        return
 
-    text = "\n".join(lines)
-    await message.answer(text)
+    chat_id = message.chat.id
+    title = message.chat.title or message.chat.full_name or message.chat.username
+
+    if parts[0].lower() == "off":
+        async with AsyncSessionLocal() as db:
+            chat = await async_crud.resolve_chat(db, telegram_chat_id=chat_id, title=title)
+            await async_crud.set_digest_schedule(db, chat, None)
+        await message.answer("Ежедневная сводка отключена.")
+        return
+
+    try:
+        digest_time = parse_digest_time(parts[0])
+        tz_name = parts[1] if len(parts) > 1 else None
+        resolve_timezone(tz_name)
+    except ValueError as exc:
+        await message.answer(f"Некорректное расписание: <code>{exc}</code>")
+        return
+
+    async with AsyncSessionLocal() as db:
+        chat = await async_crud.resolve_chat(db, telegram_chat_id=chat_id, title=title)
+        await async_crud.set_digest_schedule(db, chat, digest_time, tz_name)
+
+    await message.answer(
+        f"✅ Сводка будет приходить ежедневно в <code>{digest_time}</code>"
+        + (f" (<code>{tz_name}</code>)" if tz_name else "")
+    )
+
+
+@router.callback_query(F.data.startswith(f"{DIGEST_CALLBACK_PREFIX}:"))
+async def cb_digest_next_page(callback: CallbackQuery):
+    try:
+        cursor = DigestCursor.decode(callback.data)
+    except ValueError:
+        await callback.answer()
+        return
+
+    message = callback.message
+    if not isinstance(message, Message):
+        # Inaccessible (too old) or inline message: nothing to page through.
+        await callback.answer()
+        return
+    title = message.chat.title or message.chat.full_name or message.chat.username
+
+    async with AsyncSessionLocal() as db:
+        chat = await async_crud.resolve_chat(db, telegram_chat_id=message.chat.id, title=title)
+        text, next_cursor = await render_digest_page(db, chat.id, cursor)
+
+    await message.edit_reply_markup(reply_markup=None)
+    if text is None:
+        await callback.answer("Больше событий нет")
+        return
+
+    await message.answer(text, reply_markup=digest_keyboard(next_cursor))
+    await callback.answer()
+
+
+def digest_keyboard(cursor: DigestCursor | None) -> InlineKeyboardMarkup | None:
+    if cursor is None:
+        return None
+    return InlineKeyboardMarkup(
+        inline_keyboard=[
+            [InlineKeyboardButton(text="➡️ Следующая страница", callback_data=cursor.encode())]
+        ]
+    )
@@ -0,0 +1,28 @@
+from typing import Any, Awaitable, Callable
+
+from aiogram import BaseMiddleware
+from aiogram.types import CallbackQuery, Message, TelegramObject
+
+from app.sql_profiler import sql_profiler
+
+
+def unit_name(event: TelegramObject) -> str:
+    if isinstance(event, Message):
+        text = event.text or ""
+        if text.startswith("/"):
+            return text.split(maxsplit=1)[0].split("@", 1)[0]
+        return "message"
+    if isinstance(event, CallbackQuery):
+        return "callback:" + (event.data or "").split(":", 1)[0]
+    return type(event).__name__
+
+
+class SqlProfilerMiddleware(BaseMiddleware):
+    async def __call__(
+        self,
+        handler: Callable[[TelegramObject, dict[str, Any]], Awaitable[Any]],
+        event: TelegramObject,
+        data: dict[str, Any],
+    ) -> Any:
+        with sql_profiler.unit("command", unit_name(event)):
+            return await handler(event, data)
@@ -0,0 +1,114 @@
+import asyncio
+import hashlib
+import hmac
+import logging
+from typing import Any
+
+from aiogram.types import Update
+from fastapi import APIRouter, Header, HTTPException, Request, status
+from pydantic import ValidationError
+
+from app.bot_instance import bot, dp
+from app.config import (
+    TELEGRAM_BOT_TOKEN,
+    TELEGRAM_WEBHOOK_MAX_INFLIGHT,
+    TELEGRAM_WEBHOOK_PATH,
+    TELEGRAM_WEBHOOK_SECRET,
+    TELEGRAM_WEBHOOK_URL,
+)
+
+logger = logging.getLogger(__name__)
+
+router = APIRouter(tags=["telegram"])
+
+WEBHOOK_SECRET = TELEGRAM_WEBHOOK_SECRET or hashlib.sha256(TELEGRAM_BOT_TOKEN.encode("utf-8")).hexdigest()
+
+
+class UpdateFeeder:
+    def __init__(self, *, max_inflight: int) -> None:
+        self.max_inflight = max(1, max_inflight)
+        self._tasks: set[asyncio.Task] = set()
+        self.received = 0
+        self.handled = 0
+        self.failed = 0
+        self.rejected = 0
+
+    def submit(self, update: Update) -> bool:
+        if len(self._tasks) >= self.max_inflight:
+            self.rejected += 1
+            return False
+        self.received += 1
+        task = asyncio.create_task(self._feed(update), name=f"telegram-update-{update.update_id}")
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+        return True
+
+    async def _feed(self, update: Update) -> None:
+        try:
+            await dp.feed_update(bot, update)
+            self.handled += 1
+        except Exception:
+            self.failed += 1
+            logger.exception("Failed to handle Telegram update %s", update.update_id)
+
+    async def stop(self, timeout: float = 10.0) -> None:
+        if not self._tasks:
+            return
+        _, pending = await asyncio.wait(set(self._tasks), timeout=timeout)
+        for task in pending:
+            task.cancel()
+        await asyncio.gather(*pending, return_exceptions=True)
+
+    def stats(self) -> dict[str, Any]:
+        return {
+            "inflight": len(self._tasks),
+            "received": self.received,
+            "handled": self.handled,
+            "failed": self.failed,
+            "rejected": self.rejected,
+        }
+
+
+update_feeder = UpdateFeeder(max_inflight=TELEGRAM_WEBHOOK_MAX_INFLIGHT)
+
+
+async def set_telegram_webhook() -> None:
+    url = TELEGRAM_WEBHOOK_URL.rstrip("/") + TELEGRAM_WEBHOOK_PATH
+    await bot.set_webhook(
+        url=url,
+        secret_token=WEBHOOK_SECRET,
+        allowed_updates=dp.resolve_used_update_types(),
+    )
+    logger.info("Telegram webhook set to %s", url)
+
+
+@router.post(TELEGRAM_WEBHOOK_PATH)
+async def telegram_webhook(
+    request: Request,
+    x_telegram_bot_api_secret_token: str | None = Header(
+        default=None,
+        alias="X-Telegram-Bot-Api-Secret-Token",
+    ),
+) -> dict[str, Any]:
+    if not x_telegram_bot_api_secret_token or not hmac.compare_digest(
+        x_telegram_bot_api_secret_token, WEBHOOK_SECRET
+    ):
+        raise HTTPException(
+            status_code=status.HTTP_401_UNAUTHORIZED,
+            detail="Invalid secret token",
+        )
+
+    try:
+        update = Update.model_validate_json(await request.body(), context={"bot": bot})
+    except ValidationError:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Invalid update",
+        )
+
+    if not update_feeder.submit(update):
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail="Too many updates in flight",
+        )
+    return {"ok": True}
@@ -0,0 +1,166 @@
+import json
+import types
+from dataclasses import dataclass, fields, is_dataclass
+from functools import lru_cache
+from typing import Any, Callable, Union, get_args, get_origin, get_type_hints
+
+try:
+    import msgspec
+except ImportError:
+    msgspec = None
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+
+@dataclass
+class Repository:
+    full_name: str | None = None
+
+
+@dataclass
+class User:
+    login: str | None = None
+
+
+@dataclass
+class Ref:
+    ref: str | None = None
+
+
+@dataclass
+class PullRequest:
+    number: int | None = None
+    title: str | None = None
+    html_url: str | None = None
+    merged: bool | None = None
+    user: User | None = None
+    base: Ref | None = None
+    head: Ref | None = None
+
+
+@dataclass
+class PullRequestEvent:
+    action: str | None = None
+    pull_request: PullRequest | None = None
+    repository: Repository | None = None
+
+
+@dataclass
+class CommitAuthor:
+    name: str | None = None
+
+
+@dataclass
+class Commit:
+    id: str | None = None
+    message: str | None = None
+    author: CommitAuthor | None = None
+
+
+@dataclass
+class Pusher:
+    name: str | None = None
+
+
+@dataclass
+class PushEvent:
+    ref: str | None = None
+    forced: bool | None = None
+    pusher: Pusher | None = None
+    commits: list[Commit] | None = None
+    repository: Repository | None = None
+
+
+@dataclass
+class WorkflowRun:
+    id: int | None = None
+    name: str | None = None
+    status: str | None = None
+    conclusion: str | None = None
+    html_url: str | None = None
+    head_branch: str | None = None
+    head_commit: Commit | None = None
+
+
+@dataclass
+class WorkflowRunEvent:
+    workflow_run: WorkflowRun | None = None
+    repository: Repository | None = None
+
+
+PAYLOAD_TYPES: dict[str, type] = {
+    "pull_request": PullRequestEvent,
+    "push": PushEvent,
+    "workflow_run": WorkflowRunEvent,
+}
+
+if msgspec is not None:
+    DECODERS = {event: msgspec.json.Decoder(tp) for event, tp in PAYLOAD_TYPES.items()}
+    BACKEND = "msgspec"
+else:
+    DECODERS = {}
+    BACKEND = "orjson" if orjson is not None else "json"
+
+
+def _identity(value: Any) -> Any:
+    return value
+
+
+@lru_cache(maxsize=None)
+def _converter(tp: Any) -> Callable[[Any], Any]:
+    origin = get_origin(tp)
+    if origin in (Union, types.UnionType):
+        return _converter(next(a for a in get_args(tp) if a is not type(None)))
+
+    if origin is list:
+        convert_item = _converter(get_args(tp)[0])
+
+        def convert_list(value: Any) -> Any:
+            if value is None:
+                return None
+            if not isinstance(value, list):
+                raise ValueError(f"Expected array, got {type(value).__name__}")
+            return [convert_item(v) for v in value]
+
+        return convert_list
+
+    if is_dataclass(tp):
+        hints = get_type_hints(tp)
+        plan = [(f.name, _converter(hints[f.name])) for f in fields(tp)]
+
+        def convert_object(value: Any) -> Any:
+            if value is None:
+                return None
+            if not isinstance(value, dict):
+                raise ValueError(f"Expected object for {tp.__name__}, got {type(value).__name__}")
+            return tp(**{name: convert(value[name]) for name, convert in plan if name in value})
+
+        return convert_object
+
+    return _identity
+
+
+def loads(body: bytes | bytearray) -> Any:
+    if orjson is not None:
+        return orjson.loads(body)
+    return json.loads(body)
+
+
+def decode_event(event: str, body: bytes | bytearray) -> Any:
+    decoder = DECODERS.get(event)
+    if decoder is not None:
+        try:
+            return decoder.decode(body)
+        except msgspec.MsgspecError as exc:
+            raise ValueError(str(exc)) from exc
+
+    try:
+        data = loads(body)
+    except ValueError as exc:
+        raise ValueError(f"Invalid JSON: {exc}") from exc
+
+    tp = PAYLOAD_TYPES.get(event)
+    return data if tp is None else _converter(tp)(data)
@@ -1,84 +1,224 @@
+import asyncio
 import hashlib
 import hmac
-import json
+import logging
+import time
 from typing import Any
+from weakref import WeakValueDictionary
 
 from fastapi import APIRouter, Header, HTTPException, Request, status
+from aiogram.exceptions import TelegramBadRequest
 from aiogram.types import InlineKeyboardMarkup, InlineKeyboardButton
-from app.bot_instance import bot
-from app.config import GITHUB_WEBHOOK_SECRET
-from app.db import SessionLocal
-from app import crud
+from app.config import GITHUB_WEBHOOK_MAX_BODY, GITHUB_WEBHOOK_SECRET
+from app.db import AsyncSessionLocal
+from app.dedup import delivery_deduplicator
+from app.delivery import DeliveryHandler, DeliveryJob, delivery_queue, track_targets, unfinished
+from app.event_log_writer import event_log_writer
+from app.fanout import fan_out
+from app.inbox import webhook_inbox
+from app.metrics import Counter, Histogram
+from app.routing import RouteEntry, routing_index
+from app.sender import send_scheduler
+from app import async_crud
+from integrations.github.payloads import (
+    Commit,
+    CommitAuthor,
+    PullRequest,
+    PullRequestEvent,
+    Pusher,
+    PushEvent,
+    Ref,
+    Repository,
+    User,
+    WorkflowRun,
+    WorkflowRunEvent,
+    decode_event,
+)
+
+logger = logging.getLogger(__name__)
 
 router = APIRouter(prefix="/webhook/github", tags=["github"])
 
+WORKFLOW_STATUS_RANK = {"in_progress": 1, "completed": 2}
+workflow_run_locks: WeakValueDictionary[tuple[int, int], asyncio.Lock] = WeakValueDictionary()
+workflow_run_stats = {"sent": 0, "edited": 0, "skipped": 0}
+
+WEBHOOK_SECONDS = Histogram(
+    "notifier_webhook_seconds",
+    "Time to verify, journal and enqueue a GitHub webhook",
+    ["event"],
+)
+WEBHOOKS = Counter(
+    "notifier_webhooks",
+    "GitHub webhook requests by event and response status",
+    ["event", "status"],
+)
 
-def verify_signature(signature_header: str | None, body: bytes) -> None:
-    if not GITHUB_WEBHOOK_SECRET:
-        return
 
-    if not signature_header:
+def require_signature(signature_header: str | None) -> None:
+    if GITHUB_WEBHOOK_SECRET and not signature_header:
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
             detail="Missing X-Hub-Signature-256",
         )
 
-    secret = GITHUB_WEBHOOK_SECRET.encode("utf-8")
-    expected = "sha256=" + hmac.new(secret, body, hashlib.sha256).hexdigest()
 
-    if not hmac.compare_digest(expected, signature_header):
+def check_content_length(value: str | None, max_size: int) -> None:
+    if value is None:
+        return
+    try:
+        length = int(value)
+    except ValueError:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Invalid Content-Length",
+        )
+    if length > max_size:
+        raise HTTPException(
+            status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE,
+            detail="Payload too large",
+        )
+
+
+async def read_signed_body(
+    request: Request,
+    signature_header: str | None,
+    max_size: int = GITHUB_WEBHOOK_MAX_BODY,
+) -> bytearray:
+    require_signature(signature_header)
+    check_content_length(request.headers.get("content-length"), max_size)
+
+    mac = None
+    if GITHUB_WEBHOOK_SECRET:
+        mac = hmac.new(GITHUB_WEBHOOK_SECRET.encode("utf-8"), digestmod=hashlib.sha256)
+
+    body = bytearray()
+    async for chunk in request.stream():
+        if len(body) + len(chunk) > max_size:
+            raise HTTPException(
+                status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE,
+                detail="Payload too large",
+            )
+        if mac is not None:
+            mac.update(chunk)
+        body += chunk
+
+    if mac is not None and not hmac.compare_digest("sha256=" + mac.hexdigest(), signature_header):
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
             detail="Invalid signature",
         )
+    return body
 
 
-@router.post("")
+@router.post("", status_code=status.HTTP_202_ACCEPTED)
 async def github_webhook(
     request: Request,
     x_github_event: str = Header(..., alias="X-GitHub-Event"),
+    x_github_delivery: str | None = Header(default=None, alias="X-GitHub-Delivery"),
     x_hub_signature_256: str | None = Header(
         default=None,
         alias="X-Hub-Signature-256",
     ),
 ) -> dict[str, Any]:
-    raw_body = await request.body()
+    event = x_github_event if x_github_event in EVENT_HANDLERS else "other"
+    code = status.HTTP_202_ACCEPTED
+    start = time.perf_counter()
+    try:
+        return await accept_webhook(request, x_github_event, x_github_delivery, x_hub_signature_256)
+    except HTTPException as exc:
+        code = exc.status_code
+        raise
+    except Exception:
+        code = status.HTTP_500_INTERNAL_SERVER_ERROR
+        raise
+    finally:
+        WEBHOOK_SECONDS.labels(event).observe(time.perf_counter() - start)
+        WEBHOOKS.labels(event, str(code)).inc()
+
+
+async def accept_webhook(
+    request: Request,
+    x_github_event: str,
+    x_github_delivery: str | None,
+    x_hub_signature_256: str | None,
+) -> dict[str, Any]:
+    raw_body = await read_signed_body(request, x_hub_signature_256)
 
-    verify_signature(x_hub_signature_256, raw_body)
+    handler = EVENT_HANDLERS.get(x_github_event)
+    if handler is None:
+        return {"ok": True}
 
     try:
-        payload = json.loads(raw_body.decode("utf-8"))
-    except json.JSONDecodeError:
+        payload = decode_event(x_github_event, raw_body)
+    except ValueError:
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
             detail="Invalid JSON",
         )
 
-    if x_github_event == "pull_request":
-        await handle_pull_request_event(payload)
-    elif x_github_event == "push":
-        await handle_push_event(payload)
-    elif x_github_event == "workflow_run":
-        await handle_workflow_run_event(payload)
+    if x_github_delivery and not await delivery_deduplicator.claim(x_github_delivery):
+        return {"ok": True, "duplicate": True}
 
+    try:
+        await enqueue_webhook(x_github_event, x_github_delivery, raw_body, payload, handler)
+    except Exception:
+        if x_github_delivery:
+            await delivery_deduplicator.release(x_github_delivery)
+        raise
+
+    if x_github_delivery:
+        delivery_deduplicator.remember(x_github_delivery)
     return {"ok": True}
 
 
-async def handle_pull_request_event(payload: dict) -> None:
-    action = payload.get("action")
-    pr = payload.get("pull_request") or {}
-    repo = payload.get("repository") or {}
+async def enqueue_webhook(
+    event: str,
+    delivery_id: str | None,
+    raw_body: bytes,
+    payload: Any,
+    handler: DeliveryHandler,
+) -> None:
+    inbox_id = await webhook_inbox.append(
+        event=event,
+        delivery_id=delivery_id,
+        body=raw_body,
+    )
+
+    if delivery_queue.running:
+        try:
+            delivery_queue.submit(
+                DeliveryJob(event=event, payload=payload, handler=handler, inbox_id=inbox_id)
+            )
+        except asyncio.QueueFull:
+            if inbox_id is not None:
+                webhook_inbox.mark_done(inbox_id)
+            raise HTTPException(
+                status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+                detail="Delivery queue is full",
+            )
+    elif inbox_id is None:
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail="No delivery queue or inbox to accept the event",
+        )
+
+
+async def handle_pull_request_event(payload: PullRequestEvent) -> None:
+    action = payload.action
+    pr = payload.pull_request or PullRequest()
+    repo = payload.repository or Repository()
 
     if action not in {"opened", "closed", "reopened"}:
         return
 
-    title = pr.get("title", "(no title)")
-    url = pr.get("html_url", "")
-    user = (pr.get("user") or {}).get("login", "unknown")
-    base_ref = (pr.get("base") or {}).get("ref", "?")
-    head_ref = (pr.get("head") or {}).get("ref", "?")
-    pr_number = pr.get("number")
-    repo_full_name = repo.get("full_name")
+    title = pr.title or "(no title)"
+    url = pr.html_url or ""
+    user = (pr.user or User()).login or "unknown"
+    base_ref = (pr.base or Ref()).ref or "?"
+    head_ref = (pr.head or Ref()).ref or "?"
+    pr_number = pr.number
+    repo_full_name = repo.full_name
     if not repo_full_name:
         return
 
@@ -91,7 +231,7 @@ async def handle_pull_request_event(payload: dict) -> None:
         status_text = "Переоткрыт PR"
         action_subtype = "reopened"
     else:
-        merged = pr.get("merged", False)
+        merged = bool(pr.merged)
         if merged:
             status_emoji = "🟪"
             status_text = "PR влит (merged)"
@@ -136,54 +276,37 @@ async def handle_pull_request_event(payload: dict) -> None:
 
     branch = base_ref or ""
 
-    targets: list[dict[str, int]] = []
-
-    with SessionLocal() as db:
-        subs = crud.get_subscriptions_for_repo_full_name(db, repo_full_name)
-
-        for sub in subs:
-            if not crud.branch_matches(branch, sub.branches):
-                continue
-
-            chat = sub.chat
-            repo_obj = sub.repo
-
-            targets.append(
-                {
-                    "chat_tg_id": chat.telegram_chat_id,
-                    "chat_db_id": chat.id,
-                    "repo_db_id": repo_obj.id,
-                }
-            )
-
-            summary = f"PR {action_subtype}: {title}"
-            crud.log_event(
-                db,
-                chat=chat,
-                repo=repo_obj,
-                event_type="pull_request",
-                event_subtype=action_subtype,
-                payload_summary=summary,
-            )
+    await routing_index.ensure_loaded()
+    targets = unfinished(routing_index.route(repo_full_name, branch))
 
     if not targets:
         return
 
+    summary = f"PR {action_subtype}: {title}"
     for t in targets:
+        event_log_writer.add(
+            chat_db_id=t.chat_db_id,
+            repo_db_id=t.repo_db_id,
+            event_type="pull_request",
+            event_subtype=action_subtype,
+            payload_summary=summary,
+        )
+
+    async def send_to(t: RouteEntry):
         reply_to: int | None = None
         if pr_number is not None and action in {"reopened", "closed"}:
-            with SessionLocal() as db:
-                root_id = crud.get_pr_thread_root_message_id(
+            async with AsyncSessionLocal() as db:
+                root_id = await async_crud.get_pr_thread_root_message_id(
                     db,
-                    chat_db_id=t["chat_db_id"],
-                    repo_db_id=t["repo_db_id"],
+                    chat_db_id=t.chat_db_id,
+                    repo_db_id=t.repo_db_id,
                     pr_number=pr_number,
                 )
             if root_id:
                 reply_to = root_id
 
-        msg = await bot.send_message(
-            chat_id=t["chat_tg_id"],
+        msg = await send_scheduler.send_message(
+            chat_id=t.chat_tg_id,
             text=text,
             disable_web_page_preview=True,
             reply_markup=keyboard,
@@ -191,35 +314,38 @@ async def handle_pull_request_event(payload: dict) -> None:
         )
 
         if pr_number is not None and action in {"opened", "reopened"} and not reply_to:
-            with SessionLocal() as db:
-                crud.save_pr_thread_for_ids(
+            async with AsyncSessionLocal() as db:
+                await async_crud.save_pr_thread_for_ids(
                     db,
-                    chat_db_id=t["chat_db_id"],
-                    repo_db_id=t["repo_db_id"],
+                    chat_db_id=t.chat_db_id,
+                    repo_db_id=t.repo_db_id,
                     pr_number=pr_number,
                     root_message_id=msg.message_id,
                 )
+        return msg
+
+    await fan_out(targets, track_targets(send_to), label="pull_request")
 
 
-async def handle_push_event(payload: dict) -> None:
-    repo = payload.get("repository") or {}
-    repo_full_name = repo.get("full_name")
+async def handle_push_event(payload: PushEvent) -> None:
+    repo = payload.repository or Repository()
+    repo_full_name = repo.full_name
     if not repo_full_name:
         return
 
-    ref = payload.get("ref", "")
+    ref = payload.ref or ""
     branch = ref.split("/", 2)[-1] if ref.startswith("refs/") else ref
 
-    pusher = (payload.get("pusher") or {}).get("name", "unknown")
-    forced = payload.get("forced", False)
-    commits = payload.get("commits") or []
+    pusher = (payload.pusher or Pusher()).name or "unknown"
+    forced = bool(payload.forced)
+    commits = payload.commits or []
     commit_count = len(commits)
 
     commit_lines: list[str] = []
     for c in commits[:5]:
-        sha = (c.get("id") or "")[:7]
-        msg = (c.get("message") or "").split("\n", 1)[0]
-        author = (c.get("author") or {}).get("name", "unknown")
+        sha = (c.id or "")[:7]
+        msg = (c.message or "").split("\n", 1)[0]
+        author = (c.author or CommitAuthor()).name or "unknown"
         commit_lines.append(f"- <code>{sha}</code> {msg} ({author})")
 
     if commit_count == 0:
@@ -257,64 +383,49 @@ async def handle_push_event(payload: dict) -> None:
         inline_keyboard=[buttons] if buttons else []
     )
 
-    targets: list[dict[str, int]] = []
-
-    with SessionLocal() as db:
-        subs = crud.get_subscriptions_for_repo_full_name(db, repo_full_name)
-
-        for sub in subs:
-            if not crud.branch_matches(branch, sub.branches):
-                continue
-
-            chat = sub.chat
-            repo_obj = sub.repo
-
-            targets.append(
-                {
-                    "chat_tg_id": chat.telegram_chat_id,
-                    "chat_db_id": chat.id,
-                    "repo_db_id": repo_obj.id,
-                }
-            )
-
-            summary = f"push {branch}: {summary_text}"
-            crud.log_event(
-                db,
-                chat=chat,
-                repo=repo_obj,
-                event_type="push",
-                event_subtype=branch,
-                payload_summary=summary,
-            )
+    await routing_index.ensure_loaded()
+    targets = unfinished(routing_index.route(repo_full_name, branch))
 
     if not targets:
         return
 
+    summary = f"push {branch}: {summary_text}"
     for t in targets:
-        await bot.send_message(
-            chat_id=t["chat_tg_id"],
+        event_log_writer.add(
+            chat_db_id=t.chat_db_id,
+            repo_db_id=t.repo_db_id,
+            event_type="push",
+            event_subtype=branch,
+            payload_summary=summary,
+        )
+
+    async def send_to(t: RouteEntry):
+        return await send_scheduler.send_message(
+            chat_id=t.chat_tg_id,
             text=text,
             disable_web_page_preview=True,
             reply_markup=keyboard,
         )
 
+    await fan_out(targets, track_targets(send_to), label="push")
 
-async def handle_workflow_run_event(payload: dict) -> None:
-    repo = payload.get("repository") or {}
-    repo_full_name = repo.get("full_name")
+
+async def handle_workflow_run_event(payload: WorkflowRunEvent) -> None:
+    repo = payload.repository or Repository()
+    repo_full_name = repo.full_name
     if not repo_full_name:
         return
 
-    workflow_run = payload.get("workflow_run") or {}
-    name = workflow_run.get("name", "Workflow")
-    status = workflow_run.get("status", "unknown")
-    conclusion = workflow_run.get("conclusion")
-    url = workflow_run.get("html_url", "")
-    branch = workflow_run.get("head_branch", "?")
-    head_commit = workflow_run.get("head_commit") or {}
-    sha = (head_commit.get("id") or "")[:7]
-    message = (head_commit.get("message") or "").split("\n", 1)[0]
-    author = (head_commit.get("author") or {}).get("name", "unknown")
+    workflow_run = payload.workflow_run or WorkflowRun()
+    name = workflow_run.name or "Workflow"
+    status = workflow_run.status or "unknown"
+    conclusion = workflow_run.conclusion
+    url = workflow_run.html_url or ""
+    branch = workflow_run.head_branch or "?"
+    head_commit = workflow_run.head_commit or Commit()
+    sha = (head_commit.id or "")[:7]
+    message = (head_commit.message or "").split("\n", 1)[0]
+    author = (head_commit.author or CommitAuthor()).name or "unknown"
 
     if status != "completed":
         emoji = "⏳"
@@ -362,43 +473,119 @@ async def handle_workflow_run_event(payload: dict) -> None:
         inline_keyboard=[buttons] if buttons else []
     )
 
-    targets: list[dict[str, int]] = []
-
-    with SessionLocal() as db:
-        subs = crud.get_subscriptions_for_repo_full_name(db, repo_full_name)
-
-        for sub in subs:
-            if not crud.branch_matches(branch, sub.branches):
-                continue
-
-            chat = sub.chat
-            repo_obj = sub.repo
-
-            targets.append(
-                {
-                    "chat_tg_id": chat.telegram_chat_id,
-                    "chat_db_id": chat.id,
-                    "repo_db_id": repo_obj.id,
-                }
-            )
-
-            summary = f"CI {name}: {status_text} ({branch})"
-            crud.log_event(
-                db,
-                chat=chat,
-                repo=repo_obj,
-                event_type="workflow_run",
-                event_subtype=subtype,
-                payload_summary=summary,
-            )
+    await routing_index.ensure_loaded()
+    targets = unfinished(routing_index.route(repo_full_name, branch))
 
     if not targets:
         return
 
+    summary = f"CI {name}: {status_text} ({branch})"
     for t in targets:
-        await bot.send_message(
-            chat_id=t["chat_tg_id"],
+        event_log_writer.add(
+            chat_db_id=t.chat_db_id,
+            repo_db_id=t.repo_db_id,
+            event_type="workflow_run",
+            event_subtype=subtype,
+            payload_summary=summary,
+        )
+
+    run_id = workflow_run.id
+    text_hash = hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+    async def send_new(t: RouteEntry):
+        msg = await send_scheduler.send_message(
+            chat_id=t.chat_tg_id,
             text=text,
             disable_web_page_preview=True,
             reply_markup=keyboard,
         )
+        workflow_run_stats["sent"] += 1
+        return msg
+
+    async def send_to(t: RouteEntry):
+        if run_id is None:
+            return await send_new(t)
+
+        key = (t.chat_db_id, run_id)
+        lock = workflow_run_locks.get(key)
+        if lock is None:
+            lock = workflow_run_locks[key] = asyncio.Lock()
+
+        async with lock:
+            async with AsyncSessionLocal() as db:
+                existing = await async_crud.get_workflow_run_message(db, t.chat_db_id, run_id)
+
+            if existing and (
+                existing.text_hash == text_hash
+                or WORKFLOW_STATUS_RANK.get(status, 0) < WORKFLOW_STATUS_RANK.get(existing.status, 0)
+            ):
+                workflow_run_stats["skipped"] += 1
+                return None
+
+            message_id = None
+            if existing:
+                try:
+                    await send_scheduler.edit_message_text(
+                        chat_id=t.chat_tg_id,
+                        message_id=existing.message_id,
+                        text=text,
+                        disable_web_page_preview=True,
+                        reply_markup=keyboard,
+                    )
+                    message_id = existing.message_id
+                    workflow_run_stats["edited"] += 1
+                except TelegramBadRequest as exc:
+                    if "message is not modified" in str(exc):
+                        message_id = existing.message_id
+                        workflow_run_stats["skipped"] += 1
+                    elif "message to edit not found" not in str(exc):
+                        raise
+
+            if message_id is None:
+                message_id = (await send_new(t)).message_id
+
+            async with AsyncSessionLocal() as db:
+                await async_crud.save_workflow_run_message(
+                    db,
+                    chat_db_id=t.chat_db_id,
+                    run_id=run_id,
+                    message_id=message_id,
+                    status=status,
+                    text_hash=text_hash,
+                )
+            return message_id
+
+    await fan_out(targets, track_targets(send_to), label="workflow_run")
+
+
+EVENT_HANDLERS = {
+    "pull_request": handle_pull_request_event,
+    "push": handle_push_event,
+    "workflow_run": handle_workflow_run_event,
+}
+
+
+async def replay_inbox(upto: int) -> int:
+    replayed = 0
+    async for entry, done_targets in webhook_inbox.iter_pending(upto):
+        handler = EVENT_HANDLERS.get(entry.event)
+        try:
+            payload = decode_event(entry.event, entry.body)
+        except ValueError:
+            handler = None
+        if handler is None:
+            webhook_inbox.mark_done(entry.id)
+            continue
+        await delivery_queue.put(
+            DeliveryJob(
+                event=entry.event,
+                payload=payload,
+                handler=handler,
+                inbox_id=entry.id,
+                done_targets=done_targets,
+            )
+        )
+        replayed += 1
+    if replayed:
+        logger.info("Replayed %d unfinished webhook deliveries from the inbox", replayed)
+    return replayed
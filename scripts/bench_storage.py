@@ -0,0 +1,136 @@
+import argparse
+import json
+import os
+import sys
+import tempfile
+import threading
+import time
+from datetime import datetime, timezone
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from sqlalchemy import func, insert, make_url, select  # noqa: E402
+from sqlalchemy.orm import Session  # noqa: E402
+
+from app.db import Base  # noqa: E402
+from app.models import Chat, EventLog, Repo  # noqa: E402
+from app.storage import PROFILES, create_sync_engine  # noqa: E402
+
+
+def make_row(i: int) -> dict:
+    return {
+        "chat_id": 1 + i % 50,
+        "repo_id": 1,
+        "event_type": "push",
+        "event_subtype": "main",
+        "payload_summary": f"push main: bench row {i}",
+        "timestamp": datetime.now(timezone.utc),
+    }
+
+
+def seed(engine) -> None:
+    Base.metadata.drop_all(engine)
+    Base.metadata.create_all(engine)
+    with Session(engine) as db:
+        db.add(Repo(provider="github", owner="bench", name="repo", full_name="bench/repo"))
+        db.add_all(Chat(telegram_chat_id=-i, title=f"chat {i}") for i in range(1, 51))
+        db.commit()
+
+
+def run_readers(engine, stop: threading.Event, counter: list[int]) -> None:
+    while not stop.is_set():
+        with Session(engine) as db:
+            db.execute(select(func.count()).select_from(EventLog).where(EventLog.chat_id == 1)).scalar()
+        counter[0] += 1
+
+
+def bench(url: str, profile_name: str, rows: int, batch_size: int, readers: int) -> dict:
+    engine = create_sync_engine(url, PROFILES[profile_name])
+    seed(engine)
+
+    stop = threading.Event()
+    read_counter = [0]
+    threads = [
+        threading.Thread(target=run_readers, args=(engine, stop, read_counter), daemon=True)
+        for _ in range(readers)
+    ]
+    for t in threads:
+        t.start()
+
+    result = {
+        "profile": profile_name,
+        "url": make_url(url).render_as_string(hide_password=True),
+        "rows": rows,
+    }
+    try:
+        started = time.perf_counter()
+        with Session(engine) as db:
+            for i in range(rows):
+                db.execute(insert(EventLog), [make_row(i)])
+                db.commit()
+        elapsed = time.perf_counter() - started
+        result["row_commit_rows_per_s"] = round(rows / elapsed, 1)
+
+        started = time.perf_counter()
+        with Session(engine) as db:
+            for start in range(0, rows, batch_size):
+                db.execute(insert(EventLog), [make_row(i) for i in range(start, min(rows, start + batch_size))])
+                db.commit()
+        elapsed = time.perf_counter() - started
+        result["batched_rows_per_s"] = round(rows / elapsed, 1)
+    finally:
+        stop.set()
+        for t in threads:
+            t.join()
+        engine.dispose()
+
+    result["concurrent_reads"] = read_counter[0]
+    return result
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Compare EventLog write throughput across storage profiles.")
+    parser.add_argument("--rows", type=int, default=2000)
+    parser.add_argument("--batch-size", type=int, default=500)
+    parser.add_argument("--readers", type=int, default=2, help="concurrent reader threads during writes")
+    parser.add_argument("--profiles", default="default,sqlite", help="comma-separated SQLite profiles to run")
+    parser.add_argument(
+        "--postgres-url",
+        help="also benchmark default/postgres profiles against this database (all its tables are dropped)",
+    )
+    parser.add_argument(
+        "--i-know-this-drops-tables",
+        dest="drop_tables",
+        action="store_true",
+        help="confirm that --postgres-url points at a scratch database",
+    )
+    parser.add_argument("--json", dest="json_path", help="write results to this file")
+    args = parser.parse_args()
+    if args.postgres_url and not args.drop_tables:
+        parser.error("--postgres-url drops every table in that database; pass --i-know-this-drops-tables")
+
+    results = []
+    with tempfile.TemporaryDirectory() as tmp:
+        for profile in [p.strip() for p in args.profiles.split(",") if p.strip()]:
+            url = f"sqlite:///{os.path.join(tmp, profile + '.db')}"
+            results.append(bench(url, profile, args.rows, args.batch_size, args.readers))
+
+    if args.postgres_url:
+        for profile in ("default", "postgres"):
+            results.append(bench(args.postgres_url, profile, args.rows, args.batch_size, args.readers))
+
+    print(f"{'profile':<10} {'backend':<10} {'row commit/s':>14} {'batched/s':>12} {'reads':>8}")
+    for r in results:
+        backend = make_url(r["url"]).get_backend_name()
+        print(
+            f"{r['profile']:<10} {backend:<10} {r['row_commit_rows_per_s']:>14} "
+            f"{r['batched_rows_per_s']:>12} {r['concurrent_reads']:>8}"
+        )
+
+    if args.json_path:
+        with open(args.json_path, "w", encoding="utf-8") as f:
+            json.dump(results, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
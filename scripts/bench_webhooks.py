@@ -0,0 +1,375 @@
+import argparse
+import asyncio
+import hashlib
+import hmac
+import json
+import logging
+import os
+import platform
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+from collections import Counter
+from datetime import datetime, timezone
+from typing import Any
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+BENCH_DIR = tempfile.mkdtemp(prefix="notifier-bench-")
+BENCH_SECRET = "bench-secret"
+
+os.environ["DATABASE_URL"] = os.getenv(
+    "BENCH_DATABASE_URL", f"sqlite:///{os.path.join(BENCH_DIR, 'bench.db')}"
+)
+os.environ.pop("ASYNC_DATABASE_URL", None)
+os.environ.setdefault("TELEGRAM_BOT_TOKEN", "0:bench")
+os.environ["GITHUB_WEBHOOK_SECRET"] = BENCH_SECRET
+os.environ["TELEGRAM_WEBHOOK_URL"] = ""
+os.environ["SEND_GLOBAL_RATE"] = "1000000"
+os.environ["SEND_CHAT_RATE"] = "1000000"
+os.environ["SEND_GROUP_RATE_PER_MINUTE"] = "1000000000"
+
+from sqlalchemy import event, insert, select  # noqa: E402
+
+from app.db import Base, SessionLocal, async_engine, engine, init_db  # noqa: E402
+from app.dedup import delivery_deduplicator  # noqa: E402
+from app.delivery import delivery_queue  # noqa: E402
+from app.event_log_writer import event_log_writer  # noqa: E402
+from app.inbox import webhook_inbox  # noqa: E402
+from app.main import create_fastapi_app  # noqa: E402
+from app.models import Chat, Repo, Subscription  # noqa: E402
+from app.routing import routing_index  # noqa: E402
+from app.sender import send_scheduler  # noqa: E402
+
+HOT_REPO = "bench/hot"
+EVENTS = ("pull_request", "push", "workflow_run")
+
+
+class NoopMessage:
+    def __init__(self, message_id: int) -> None:
+        self.message_id = message_id
+
+
+class NoopBot:
+    def __init__(self) -> None:
+        self.calls = 0
+
+    async def send_message(self, chat_id: int, **kwargs: Any) -> NoopMessage:
+        self.calls += 1
+        return NoopMessage(self.calls)
+
+    async def edit_message_text(self, chat_id: int, **kwargs: Any) -> bool:
+        self.calls += 1
+        return True
+
+
+def seed(subscriptions: int, fanout: int, chunk: int = 10_000) -> None:
+    Base.metadata.drop_all(engine)
+    init_db()
+    fanout = min(fanout, subscriptions)
+    repos = 1 + -(-(subscriptions - fanout) // 100)
+    with SessionLocal() as db:
+        db.execute(
+            insert(Repo),
+            [
+                {"provider": "github", "owner": "bench", "name": name, "full_name": f"bench/{name}"}
+                for name in ["hot"] + [f"repo-{i}" for i in range(1, repos)]
+            ],
+        )
+        db.execute(
+            insert(Chat),
+            [{"telegram_chat_id": -i, "title": f"chat {i}"} for i in range(1, subscriptions + 1)],
+        )
+        repo_ids = [r for (r,) in db.execute(select(Repo.id).order_by(Repo.id))]
+        chat_ids = [c for (c,) in db.execute(select(Chat.id).order_by(Chat.id))]
+        rows = [
+            {
+                "chat_id": chat_id,
+                "repo_id": repo_ids[0] if i < fanout else repo_ids[1 + (i - fanout) // 100],
+                "branches": "main,release/*" if i % 2 else None,
+                "is_active": True,
+            }
+            for i, chat_id in enumerate(chat_ids)
+        ]
+        for start in range(0, len(rows), chunk):
+            db.execute(insert(Subscription), rows[start:start + chunk])
+        db.commit()
+
+
+def sign(body: bytes) -> str:
+    return "sha256=" + hmac.new(BENCH_SECRET.encode("utf-8"), body, hashlib.sha256).hexdigest()
+
+
+def make_payload(kind: str, i: int) -> dict[str, Any]:
+    repository = {"full_name": HOT_REPO, "private": False, "owner": {"login": "bench"}}
+    if kind == "pull_request":
+        return {
+            "action": ("opened", "closed", "reopened")[i % 3],
+            "number": i,
+            "pull_request": {
+                "number": i,
+                "title": f"Bench PR {i}",
+                "html_url": f"https://github.com/{HOT_REPO}/pull/{i}",
+                "merged": i % 2 == 0,
+                "user": {"login": "bench-bot", "id": 1},
+                "base": {"ref": "main", "sha": "0" * 40},
+                "head": {"ref": f"feature/{i}", "sha": "1" * 40},
+                "body": "x" * 512,
+            },
+            "repository": repository,
+        }
+    if kind == "push":
+        return {
+            "ref": "refs/heads/main",
+            "forced": False,
+            "pusher": {"name": "bench-bot"},
+            "commits": [
+                {
+                    "id": f"{i:08x}{c:032x}",
+                    "message": f"Bench commit {i}.{c}",
+                    "author": {"name": "bench-bot", "email": "bench@example.com"},
+                    "added": [f"src/file_{c}.py"],
+                    "modified": [],
+                    "removed": [],
+                }
+                for c in range(3)
+            ],
+            "repository": repository,
+        }
+    return {
+        "action": "completed" if i % 2 else "in_progress",
+        "workflow_run": {
+            "id": i // 2,
+            "name": "CI",
+            "status": "completed" if i % 2 else "in_progress",
+            "conclusion": "success" if i % 2 else None,
+            "html_url": f"https://github.com/{HOT_REPO}/actions/runs/{i // 2}",
+            "head_branch": "main",
+            "head_commit": {"id": f"{i:040x}", "message": "Bench", "author": {"name": "bench-bot"}},
+        },
+        "repository": repository,
+    }
+
+
+async def call_asgi(app, headers: list[tuple[bytes, bytes]], body: bytes) -> int:
+    scope = {
+        "type": "http",
+        "asgi": {"version": "3.0"},
+        "http_version": "1.1",
+        "method": "POST",
+        "scheme": "http",
+        "path": "/webhook/github",
+        "raw_path": b"/webhook/github",
+        "query_string": b"",
+        "root_path": "",
+        "headers": headers,
+        "client": ("127.0.0.1", 50000),
+        "server": ("bench", 80),
+    }
+    sent = False
+    status = 0
+
+    async def receive() -> dict[str, Any]:
+        nonlocal sent
+        if not sent:
+            sent = True
+            return {"type": "http.request", "body": body, "more_body": False}
+        await asyncio.sleep(3600)
+        return {"type": "http.disconnect"}
+
+    async def send(message: dict[str, Any]) -> None:
+        nonlocal status
+        if message["type"] == "http.response.start":
+            status = message["status"]
+
+    await app(scope, receive, send)
+    return status
+
+
+def percentile(sorted_values: list[float], q: float) -> float:
+    if not sorted_values:
+        return 0.0
+    index = min(len(sorted_values) - 1, max(0, round(q * len(sorted_values)) - 1))
+    return sorted_values[index]
+
+
+async def run_scenario(app, kind: str, run: str, requests: int, concurrency: int) -> dict[str, Any]:
+    bodies = []
+    for i in range(requests):
+        body = json.dumps(make_payload(kind, i)).encode("utf-8")
+        headers = [
+            (b"content-type", b"application/json"),
+            (b"content-length", str(len(body)).encode()),
+            (b"x-github-event", kind.encode()),
+            (b"x-github-delivery", f"{run}-{kind}-{i}".encode()),
+            (b"x-hub-signature-256", sign(body).encode()),
+        ]
+        bodies.append((headers, body))
+
+    queries = [0]
+
+    def count(conn, cursor, statement, parameters, context, executemany):
+        queries[0] += 1
+
+    await routing_index.ensure_loaded()
+    await event_log_writer.start()
+    await delivery_deduplicator.start()
+    await webhook_inbox.start()
+    await delivery_queue.start()
+
+    event.listen(async_engine.sync_engine, "before_cursor_execute", count)
+    latencies: list[float] = []
+    statuses: Counter[int] = Counter()
+    pending = iter(bodies)
+
+    async def client() -> None:
+        for headers, body in pending:
+            start = time.perf_counter()
+            code = await call_asgi(app, headers, body)
+            latencies.append(time.perf_counter() - start)
+            statuses[code] += 1
+
+    try:
+        started = time.perf_counter()
+        await asyncio.gather(*(client() for _ in range(concurrency)))
+        elapsed = time.perf_counter() - started
+        request_queries = queries[0]
+        await delivery_queue.stop()
+        await webhook_inbox.stop()
+        await event_log_writer.stop()
+        await delivery_deduplicator.stop()
+        drained = time.perf_counter() - started
+    finally:
+        event.remove(async_engine.sync_engine, "before_cursor_execute", count)
+
+    latencies.sort()
+    return {
+        "event": kind,
+        "requests": requests,
+        "concurrency": concurrency,
+        "statuses": {str(code): n for code, n in sorted(statuses.items())},
+        "requests_per_s": round(requests / elapsed, 1),
+        "p50_ms": round(percentile(latencies, 0.50) * 1000, 3),
+        "p95_ms": round(percentile(latencies, 0.95) * 1000, 3),
+        "p99_ms": round(percentile(latencies, 0.99) * 1000, 3),
+        "db_queries_per_request": round(request_queries / requests, 2),
+        "db_queries_per_event": round(queries[0] / requests, 2),
+        "drained_s": round(drained, 3),
+        "events_per_s": round(requests / drained, 1),
+    }
+
+
+def git_revision() -> str | None:
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"],
+            capture_output=True,
+            text=True,
+            check=True,
+            cwd=os.path.dirname(os.path.abspath(__file__)),
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+async def bench(args: argparse.Namespace) -> list[dict[str, Any]]:
+    bot = NoopBot()
+    send_scheduler.bot = bot
+    app = create_fastapi_app()
+    results = []
+    for size in args.sizes:
+        seed(size, args.fanout)
+        routing_index.loaded = False
+        for kind in args.events:
+            result = await run_scenario(app, kind, f"s{size}", args.requests, args.concurrency)
+            result["subscriptions"] = size
+            result["fanout"] = min(args.fanout, size)
+            results.append(result)
+    await async_engine.dispose()
+    return results
+
+
+def compare(results: list[dict[str, Any]], baseline_path: str) -> None:
+    with open(baseline_path, encoding="utf-8") as f:
+        baseline = json.load(f)
+    previous = {(r["subscriptions"], r["event"]): r for r in baseline["results"]}
+
+    def delta(new: float, old: float) -> str:
+        return f"{(new - old) / old * 100:+.1f}%" if old else "n/a"
+
+    print(f"\nvs {baseline_path} (revision {baseline.get('revision')})")
+    print(f"{'subs':>7} {'event':<13} {'req/s':>9} {'p95':>9} {'p99':>9} {'q/req':>9}")
+    for r in results:
+        old = previous.get((r["subscriptions"], r["event"]))
+        if old is None:
+            continue
+        print(
+            f"{r['subscriptions']:>7} {r['event']:<13} "
+            f"{delta(r['requests_per_s'], old['requests_per_s']):>9} "
+            f"{delta(r['p95_ms'], old['p95_ms']):>9} "
+            f"{delta(r['p99_ms'], old['p99_ms']):>9} "
+            f"{delta(r['db_queries_per_request'], old['db_queries_per_request']):>9}"
+        )
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Benchmark the GitHub webhook ingestion path in-process.")
+    parser.add_argument("--sizes", default="10,1000,100000", help="comma-separated subscription counts to seed")
+    parser.add_argument("--fanout", type=int, default=10, help="subscriptions on the repo the webhooks target")
+    parser.add_argument("--events", default=",".join(EVENTS), help="comma-separated events to send")
+    parser.add_argument("--requests", type=int, default=500, help="webhooks per event and size")
+    parser.add_argument("--concurrency", type=int, default=20, help="concurrent in-process clients")
+    parser.add_argument("--json", dest="json_path", help="write results to this file")
+    parser.add_argument("--baseline", help="JSON from a previous run to compare against")
+    parser.add_argument(
+        "--i-know-this-drops-tables",
+        dest="drop_tables",
+        action="store_true",
+        help="confirm that BENCH_DATABASE_URL points at a scratch database",
+    )
+    args = parser.parse_args()
+    if os.getenv("BENCH_DATABASE_URL") and not args.drop_tables:
+        parser.error("BENCH_DATABASE_URL drops every table in that database; pass --i-know-this-drops-tables")
+    args.sizes = [int(s) for s in args.sizes.split(",") if s.strip()]
+    args.events = [e.strip() for e in args.events.split(",") if e.strip()]
+    unknown = set(args.events) - set(EVENTS)
+    if unknown:
+        parser.error(f"unknown events: {', '.join(sorted(unknown))}")
+
+    logging.basicConfig(level=logging.WARNING)
+    try:
+        results = asyncio.run(bench(args))
+    finally:
+        shutil.rmtree(BENCH_DIR, ignore_errors=True)
+
+    print(
+        f"{'subs':>7} {'event':<13} {'req/s':>9} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8} "
+        f"{'q/req':>6} {'q/event':>8} {'events/s':>9} {'statuses'}"
+    )
+    for r in results:
+        print(
+            f"{r['subscriptions']:>7} {r['event']:<13} {r['requests_per_s']:>9} {r['p50_ms']:>8} "
+            f"{r['p95_ms']:>8} {r['p99_ms']:>8} {r['db_queries_per_request']:>6} "
+            f"{r['db_queries_per_event']:>8} {r['events_per_s']:>9} {r['statuses']}"
+        )
+
+    if args.baseline:
+        compare(results, args.baseline)
+
+    if args.json_path:
+        report = {
+            "revision": git_revision(),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "database": os.environ["DATABASE_URL"].split(":", 1)[0],
+            "created_at": datetime.now(timezone.utc).isoformat(),
+            "results": results,
+        }
+        with open(args.json_path, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
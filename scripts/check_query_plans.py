@@ -0,0 +1,134 @@
+import asyncio
+import os
+import re
+import shutil
+import sys
+import tempfile
+from datetime import datetime, timezone
+from typing import Awaitable, Callable
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+PLANS_DIR = tempfile.mkdtemp(prefix="notifier-plans-")
+
+os.environ["DATABASE_URL"] = f"sqlite:///{os.path.join(PLANS_DIR, 'plans.db')}"
+os.environ.pop("ASYNC_DATABASE_URL", None)
+os.environ.setdefault("TELEGRAM_BOT_TOKEN", "0:plans")
+
+from sqlalchemy import event  # noqa: E402
+from sqlalchemy.ext.asyncio import AsyncSession  # noqa: E402
+
+from app import async_crud  # noqa: E402
+from app.chat_cache import ChatRef  # noqa: E402
+from app.db import AsyncSessionLocal, async_engine, engine, init_db  # noqa: E402
+from app.dedup import delivery_deduplicator  # noqa: E402
+from app.digest import DigestCursor, stream_digest_rows  # noqa: E402
+from app.inbox import webhook_inbox  # noqa: E402
+from app.retention import EventLogPruner, parse_retention  # noqa: E402
+from app.rollups import digest_rollups_for_chats_query  # noqa: E402
+from app.routing import RoutingIndex  # noqa: E402
+
+SCAN_RE = re.compile(r"\bSCAN (\w+)")
+EXPLAINED = ("SELECT", "UPDATE", "DELETE", "INSERT")
+
+ALLOWED_SCANS: dict[str, set[str]] = {
+    "RoutingIndex.load_async": {"subscriptions"},
+    # The inbox only holds undelivered entries, claimed in id order.
+    "inbox.claim": {"webhook_inbox"},
+}
+
+Check = Callable[[AsyncSession], Awaitable[object]]
+
+
+async def capture(fn: Check) -> list[tuple[str, object]]:
+    statements: list[tuple[str, object]] = []
+
+    def before(conn, cursor, statement, parameters, context, executemany):
+        if statement.lstrip().upper().startswith(EXPLAINED):
+            statements.append((statement, parameters[0] if executemany else parameters))
+
+    event.listen(async_engine.sync_engine, "before_cursor_execute", before)
+    try:
+        async with AsyncSessionLocal() as db:
+            await fn(db)
+    finally:
+        event.remove(async_engine.sync_engine, "before_cursor_execute", before)
+    return statements
+
+
+async def collect() -> dict[str, list[tuple[str, object]]]:
+    async with AsyncSessionLocal() as db:
+        chat = await async_crud.get_or_create_chat(db, telegram_chat_id=-100, title="plans")
+        repo = await async_crud.get_or_create_repo(db, "plans/repo")
+        await async_crud.subscribe_chat_to_repo(db, chat, repo)
+        chat_ref = ChatRef(chat.id, chat.telegram_chat_id, chat.title)
+        chat_id, repo_id = chat.id, repo.id
+    await webhook_inbox._write_appends(
+        [{"delivery_id": "plans", "event": "push", "body": b"{}", "received_at": datetime.now(timezone.utc), "attempts": 0}]
+    )
+    now = datetime.now(timezone.utc)
+    pruner = EventLogPruner(
+        parse_retention("push=7d,*=30d"), interval=60, chunk_size=100, chunk_pause=0
+    )
+
+    async def digest_page(db: AsyncSession) -> None:
+        cursor = DigestCursor.start(24)._replace(after_ts=now, after_id=1)
+        async for _ in stream_digest_rows(db, chat_id, cursor):
+            pass
+
+    checks: dict[str, Check] = {
+        "get_or_create_chat": lambda db: async_crud.get_or_create_chat(db, telegram_chat_id=-100, title="renamed"),
+        "get_or_create_repo": lambda db: async_crud.get_or_create_repo(db, "plans/repo"),
+        "subscribe_chat_to_repo": lambda db: async_crud.subscribe_chat_to_repo(db, chat_ref, repo),
+        "get_subscriptions_for_chat": lambda db: async_crud.get_subscriptions_for_chat(db, chat_ref),
+        "set_branches_for_subscription": lambda db: async_crud.set_branches_for_subscription(
+            db, chat_ref, "plans/repo", "main"
+        ),
+        "unsubscribe_chat_from_repo": lambda db: async_crud.unsubscribe_chat_from_repo(db, chat_ref, "plans/repo"),
+        "get_digest_rollup_for_chat": lambda db: async_crud.get_digest_rollup_for_chat(db, chat_ref),
+        "get_scheduled_chats": async_crud.get_scheduled_chats,
+        "mark_digests_sent": lambda db: async_crud.mark_digests_sent(db, [chat_id], now),
+        "save_pr_thread_for_ids": lambda db: async_crud.save_pr_thread_for_ids(db, chat_id, repo_id, 1, 10),
+        "get_pr_thread_root_message_id": lambda db: async_crud.get_pr_thread_root_message_id(db, chat_id, repo_id, 1),
+        "save_workflow_run_message": lambda db: async_crud.save_workflow_run_message(
+            db, chat_id, 1, 10, "completed", "hash"
+        ),
+        "get_workflow_run_message": lambda db: async_crud.get_workflow_run_message(db, chat_id, 1),
+        "RoutingIndex.load_async": lambda db: RoutingIndex().load_async(db),
+        "digest_rollups_for_chats_query": lambda db: db.execute(digest_rollups_for_chats_query([chat_id], 24)),
+        "stream_digest_rows": digest_page,
+        "dedup.claim": lambda db: delivery_deduplicator.claim("plans-delivery"),
+        "dedup.warm": lambda db: delivery_deduplicator.warm(),
+        "inbox.claim": lambda db: webhook_inbox.claim("plans", limit=10, ttl=30),
+        "inbox.extend": lambda db: webhook_inbox.extend("plans", [1], ttl=30),
+        "retention.prune_once": lambda db: pruner.prune_once(now),
+    }
+    return {name: await capture(fn) for name, fn in checks.items()}
+
+
+def main() -> int:
+    try:
+        init_db()
+        captured = asyncio.run(collect())
+
+        failures = 0
+        with engine.connect() as conn:
+            for name, statements in captured.items():
+                for statement, params in statements:
+                    plan = conn.exec_driver_sql(f"EXPLAIN QUERY PLAN {statement}", params).all()
+                    details = [row[-1] for row in plan]
+                    scans = {m.group(1) for d in details for m in SCAN_RE.finditer(d)}
+                    bad = scans - ALLOWED_SCANS.get(name, set())
+                    status = "FAIL" if bad else "ok"
+                    failures += bool(bad)
+                    print(f"[{status}] {name}: {' | '.join(details) or statement.split()[0]}")
+    finally:
+        engine.dispose()
+        shutil.rmtree(PLANS_DIR, ignore_errors=True)
+
+    print(f"\n{failures} statement(s) with unexpected full table scans")
+    return 1 if failures else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
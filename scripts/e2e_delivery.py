@@ -0,0 +1,227 @@
+import argparse
+import asyncio
+import hashlib
+import hmac
+import json
+import logging
+import os
+import re
+import shutil
+import sys
+import tempfile
+import time
+from typing import Any
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from fake_telegram_api import FakeTelegramApi, add_config_arguments, config_from_args  # noqa: E402
+
+REPO = "e2e/repo"
+SECRET = "e2e-secret"
+SEQ_RE = re.compile(r"e2e-(\d+)")
+
+
+def parse_args() -> argparse.Namespace:
+    parser = argparse.ArgumentParser(
+        description="Send webhooks through the notifier into a local fake Telegram Bot API and check delivery."
+    )
+    parser.add_argument("--chats", type=int, default=20, help="subscribed chats (positive ids; negative with --groups)")
+    parser.add_argument("--groups", action="store_true", help="subscribe group chats (20 messages/min limit)")
+    parser.add_argument("--events", type=int, default=10, help="push webhooks to send")
+    parser.add_argument("--concurrency", type=int, default=1, help="concurrent webhook senders")
+    parser.add_argument("--delivery-workers", type=int, default=None, help="override DELIVERY_WORKERS")
+    parser.add_argument("--fake-port", type=int, default=18081)
+    parser.add_argument("--api-port", type=int, default=18000)
+    parser.add_argument("--json", dest="json_path", help="write the report to this file")
+    parser.add_argument(
+        "--allow-reorder",
+        action="store_true",
+        help="do not fail on out-of-order messages (with --concurrency > 1 webhooks may arrive reordered)",
+    )
+    add_config_arguments(parser)
+    return parser.parse_args()
+
+
+ARGS = parse_args()
+WORK_DIR = tempfile.mkdtemp(prefix="notifier-e2e-")
+
+os.environ["DATABASE_URL"] = f"sqlite:///{os.path.join(WORK_DIR, 'e2e.db')}"
+os.environ.pop("ASYNC_DATABASE_URL", None)
+os.environ.setdefault("TELEGRAM_BOT_TOKEN", "0:e2e")
+os.environ["TELEGRAM_API_BASE_URL"] = f"http://127.0.0.1:{ARGS.fake_port}"
+os.environ["TELEGRAM_WEBHOOK_URL"] = ""
+os.environ["GITHUB_WEBHOOK_SECRET"] = SECRET
+if ARGS.delivery_workers is not None:
+    os.environ["DELIVERY_WORKERS"] = str(ARGS.delivery_workers)
+
+import aiohttp  # noqa: E402
+import uvicorn  # noqa: E402
+
+from app import async_crud  # noqa: E402
+from app.bot_instance import bot  # noqa: E402
+from app.db import AsyncSessionLocal, async_engine, init_db  # noqa: E402
+from app.dedup import delivery_deduplicator  # noqa: E402
+from app.delivery import delivery_queue  # noqa: E402
+from app.event_log_writer import event_log_writer  # noqa: E402
+from app.inbox import webhook_inbox  # noqa: E402
+from app.main import create_fastapi_app  # noqa: E402
+from app.routing import routing_index  # noqa: E402
+from app.sender import send_scheduler  # noqa: E402
+
+
+async def seed(chat_ids: list[int]) -> None:
+    init_db()
+    async with AsyncSessionLocal() as db:
+        repo = await async_crud.get_or_create_repo(db, REPO)
+        for chat_id in chat_ids:
+            chat = await async_crud.get_or_create_chat(db, telegram_chat_id=chat_id, title=f"e2e {chat_id}")
+            await async_crud.subscribe_chat_to_repo(db, chat, repo)
+
+
+def push_body(i: int) -> bytes:
+    return json.dumps(
+        {
+            "ref": "refs/heads/main",
+            "pusher": {"name": "e2e"},
+            "commits": [{"id": f"{i:040x}", "message": f"e2e-{i}", "author": {"name": "e2e"}}],
+            "repository": {"full_name": REPO},
+        }
+    ).encode("utf-8")
+
+
+async def post_webhooks(events: int, concurrency: int) -> list[int]:
+    statuses: list[int] = []
+    pending = iter(range(events))
+    url = f"http://127.0.0.1:{ARGS.api_port}/webhook/github"
+
+    async with aiohttp.ClientSession() as session:
+
+        async def sender() -> None:
+            for i in pending:
+                body = push_body(i)
+                signature = "sha256=" + hmac.new(SECRET.encode(), body, hashlib.sha256).hexdigest()
+                async with session.post(
+                    url,
+                    data=body,
+                    headers={
+                        "Content-Type": "application/json",
+                        "X-GitHub-Event": "push",
+                        "X-GitHub-Delivery": f"e2e-{i}",
+                        "X-Hub-Signature-256": signature,
+                    },
+                ) as resp:
+                    statuses.append(resp.status)
+
+        await asyncio.gather(*(sender() for _ in range(concurrency)))
+    return statuses
+
+
+def analyze(api: FakeTelegramApi, chat_ids: list[int], events: int, elapsed: float) -> dict[str, Any]:
+    blocked = {c for c in chat_ids if api.is_blocked(c)}
+    expected = {(c, i) for c in chat_ids if c not in blocked for i in range(events)}
+
+    sends = [c for c in api.calls if c.method.lower() == "sendmessage" and c.text]
+    delivered: list[tuple[int, int]] = []
+    throttled: list[tuple[int, int]] = []
+    forbidden: list[tuple[int, int]] = []
+    for call in sends:
+        match = SEQ_RE.search(call.text)
+        if match is None:
+            continue
+        key = (call.chat_id, int(match.group(1)))
+        if call.status == 200:
+            delivered.append(key)
+        elif call.status == 429:
+            throttled.append(key)
+        elif call.status == 403:
+            forbidden.append(key)
+
+    delivered_set = set(delivered)
+    per_chat: dict[int, list[int]] = {}
+    for chat_id, i in delivered:
+        per_chat.setdefault(chat_id, []).append(i)
+    out_of_order = sum(
+        1 for seq in per_chat.values() for a, b in zip(seq, seq[1:]) if b < a
+    )
+
+    return {
+        "chats": len(chat_ids),
+        "blocked_chats": len(blocked),
+        "events": events,
+        "expected_messages": len(expected),
+        "delivered": len(delivered_set & expected),
+        "missing": len(expected - delivered_set),
+        "duplicates": len(delivered) - len(delivered_set),
+        "out_of_order": out_of_order,
+        "throttled_429": len(throttled),
+        "throttled_then_delivered": len({k for k in throttled if k in delivered_set}),
+        "forbidden_403": len(forbidden),
+        "retried_after_403": len(forbidden) - len(set(forbidden)),
+        "elapsed_s": round(elapsed, 3),
+        "messages_per_s": round(len(delivered) / elapsed, 1) if elapsed else None,
+        "fake_api": api.stats(),
+        "sender": send_scheduler.stats(),
+    }
+
+
+async def run() -> dict[str, Any]:
+    api = FakeTelegramApi(config_from_args(ARGS))
+    runner = await api.start(port=ARGS.fake_port)
+
+    sign = -1 if ARGS.groups else 1
+    chat_ids = [sign * i for i in range(1, ARGS.chats + 1)]
+    await seed(chat_ids)
+
+    await routing_index.ensure_loaded()
+    await event_log_writer.start()
+    await delivery_deduplicator.start()
+    await webhook_inbox.start()
+    await delivery_queue.start()
+
+    server = uvicorn.Server(
+        uvicorn.Config(create_fastapi_app(), host="127.0.0.1", port=ARGS.api_port, log_level="warning")
+    )
+    serving = asyncio.create_task(server.serve())
+    try:
+        while not server.started:
+            await asyncio.sleep(0.05)
+
+        started = time.perf_counter()
+        statuses = await post_webhooks(ARGS.events, ARGS.concurrency)
+        await delivery_queue.stop()
+        elapsed = time.perf_counter() - started
+    finally:
+        server.should_exit = True
+        await serving
+        await delivery_queue.stop()
+        await webhook_inbox.stop()
+        await delivery_deduplicator.stop()
+        await event_log_writer.stop()
+        await bot.session.close()
+        await runner.cleanup()
+        await async_engine.dispose()
+
+    report = analyze(api, chat_ids, ARGS.events, elapsed)
+    report["webhook_statuses"] = {str(s): statuses.count(s) for s in sorted(set(statuses))}
+    return report
+
+
+def main() -> None:
+    logging.basicConfig(level=logging.ERROR)
+    try:
+        report = asyncio.run(run())
+    finally:
+        shutil.rmtree(WORK_DIR, ignore_errors=True)
+
+    print(json.dumps(report, indent=2))
+    if ARGS.json_path:
+        with open(ARGS.json_path, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2)
+    if report["missing"] or report["duplicates"] or report["retried_after_403"]:
+        sys.exit(1)
+    if report["out_of_order"] and not ARGS.allow_reorder:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,259 @@
+import argparse
+import asyncio
+import math
+import random
+import time
+from collections import Counter, deque
+from dataclasses import dataclass, field
+from typing import Any
+
+from aiohttp import web
+
+SEND_METHODS = {"sendmessage", "editmessagetext"}
+
+
+@dataclass
+class FakeTelegramConfig:
+    latency_ms: float = 30.0
+    latency_p99_ms: float = 150.0
+    retry_after_rate: float = 0.0
+    retry_after: int = 1
+    blocked_chats: frozenset[int] = frozenset()
+    blocked_rate: float = 0.0
+    chat_rate: int = 1
+    group_rate_per_minute: int = 20
+    global_rate: int = 30
+    seed: int | None = None
+
+
+@dataclass
+class Call:
+    seq: int
+    at: float
+    method: str
+    chat_id: int | None
+    text: str | None
+    status: int
+    retry_after: int | None = None
+    message_id: int | None = None
+
+
+@dataclass
+class SlidingWindow:
+    limit: int
+    period: float
+    hits: deque[float] = field(default_factory=deque)
+
+    def retry_after(self, now: float) -> float:
+        while self.hits and self.hits[0] <= now - self.period:
+            self.hits.popleft()
+        if self.limit <= 0 or len(self.hits) < self.limit:
+            return 0.0
+        return self.hits[0] + self.period - now
+
+    def hit(self, now: float) -> None:
+        self.hits.append(now)
+
+
+class FakeTelegramApi:
+    def __init__(self, config: FakeTelegramConfig) -> None:
+        self.config = config
+        self.random = random.Random(config.seed)
+        self.calls: list[Call] = []
+        self._global = SlidingWindow(config.global_rate, 1.0)
+        self._windows: dict[tuple[str, int], SlidingWindow] = {}
+        self._message_ids: Counter[int] = Counter()
+        self.started = time.monotonic()
+
+    def reset(self) -> None:
+        self.calls.clear()
+        self._global.hits.clear()
+        self._windows.clear()
+        self._message_ids.clear()
+        self.started = time.monotonic()
+
+    def _window(self, kind: str, chat_id: int) -> SlidingWindow:
+        window = self._windows.get((kind, chat_id))
+        if window is None:
+            if kind == "chat":
+                window = SlidingWindow(self.config.chat_rate, 1.0)
+            else:
+                window = SlidingWindow(self.config.group_rate_per_minute, 60.0)
+            self._windows[(kind, chat_id)] = window
+        return window
+
+    def latency(self) -> float:
+        median = self.config.latency_ms / 1000
+        if median <= 0:
+            return 0.0
+        p99 = max(self.config.latency_p99_ms / 1000, median)
+        sigma = math.log(p99 / median) / 2.326
+        return self.random.lognormvariate(math.log(median), sigma)
+
+    def is_blocked(self, chat_id: int) -> bool:
+        if chat_id in self.config.blocked_chats:
+            return True
+        return self.config.blocked_rate > 0 and random.Random(chat_id).random() < self.config.blocked_rate
+
+    def _limited(self, chat_id: int, now: float) -> float:
+        windows = [self._global, self._window("chat", chat_id)]
+        if chat_id < 0:
+            windows.append(self._window("group", chat_id))
+        wait = max(w.retry_after(now) for w in windows)
+        if wait <= 0:
+            for w in windows:
+                w.hit(now)
+        return wait
+
+    def _record(self, method: str, chat_id: int | None, text: str | None, status: int, **extra: Any) -> Call:
+        call = Call(
+            seq=len(self.calls),
+            at=time.monotonic() - self.started,
+            method=method,
+            chat_id=chat_id,
+            text=text,
+            status=status,
+            **extra,
+        )
+        self.calls.append(call)
+        return call
+
+    async def handle(self, request: web.Request) -> web.Response:
+        method = request.match_info["method"]
+        data = await request.post()
+        chat_id = int(data["chat_id"]) if "chat_id" in data else None
+        text = data.get("text")
+
+        await asyncio.sleep(self.latency())
+
+        if method.lower() not in SEND_METHODS or chat_id is None:
+            self._record(method, chat_id, text, 200)
+            return web.json_response({"ok": True, "result": self._other_result(method)})
+
+        if self.is_blocked(chat_id):
+            self._record(method, chat_id, text, 403)
+            return web.json_response(
+                {"ok": False, "error_code": 403, "description": "Forbidden: bot was blocked by the user"},
+                status=403,
+            )
+
+        wait = self._limited(chat_id, time.monotonic())
+        if wait <= 0 and self.config.retry_after_rate > 0 and self.random.random() < self.config.retry_after_rate:
+            wait = self.config.retry_after
+        if wait > 0:
+            retry_after = max(1, math.ceil(wait))
+            self._record(method, chat_id, text, 429, retry_after=retry_after)
+            return web.json_response(
+                {
+                    "ok": False,
+                    "error_code": 429,
+                    "description": f"Too Many Requests: retry after {retry_after}",
+                    "parameters": {"retry_after": retry_after},
+                },
+                status=429,
+            )
+
+        if method.lower() == "editmessagetext":
+            message_id = int(data.get("message_id", 0))
+        else:
+            self._message_ids[chat_id] += 1
+            message_id = self._message_ids[chat_id]
+        self._record(method, chat_id, text, 200, message_id=message_id)
+        return web.json_response(
+            {
+                "ok": True,
+                "result": {
+                    "message_id": message_id,
+                    "date": int(time.time()),
+                    "chat": {"id": chat_id, "type": "group" if chat_id < 0 else "private"},
+                    "text": text or "",
+                },
+            }
+        )
+
+    @staticmethod
+    def _other_result(method: str) -> Any:
+        if method.lower() == "getme":
+            return {"id": 1, "is_bot": True, "first_name": "Fake", "username": "fake_notifier_bot"}
+        return True
+
+    def stats(self) -> dict[str, Any]:
+        statuses = Counter(str(c.status) for c in self.calls)
+        sends = [c for c in self.calls if c.method.lower() in SEND_METHODS]
+        ok = [c for c in sends if c.status == 200]
+        elapsed = (ok[-1].at - ok[0].at) if len(ok) > 1 else 0.0
+        return {
+            "calls": len(self.calls),
+            "statuses": dict(statuses),
+            "sends_ok": len(ok),
+            "sends_per_s": round(len(ok) / elapsed, 1) if elapsed else None,
+            "chats": len({c.chat_id for c in sends}),
+        }
+
+    async def calls_view(self, request: web.Request) -> web.Response:
+        return web.json_response([c.__dict__ for c in self.calls])
+
+    async def stats_view(self, request: web.Request) -> web.Response:
+        return web.json_response(self.stats())
+
+    async def reset_view(self, request: web.Request) -> web.Response:
+        self.reset()
+        return web.json_response({"ok": True})
+
+    def make_app(self) -> web.Application:
+        app = web.Application()
+        app.router.add_get("/_calls", self.calls_view)
+        app.router.add_get("/_stats", self.stats_view)
+        app.router.add_post("/_reset", self.reset_view)
+        app.router.add_post("/bot{token}/{method}", self.handle)
+        return app
+
+    async def start(self, host: str = "127.0.0.1", port: int = 8081) -> web.AppRunner:
+        runner = web.AppRunner(self.make_app())
+        await runner.setup()
+        await web.TCPSite(runner, host, port).start()
+        return runner
+
+
+def add_config_arguments(parser: argparse.ArgumentParser) -> None:
+    parser.add_argument("--latency-ms", type=float, default=30.0, help="median response latency")
+    parser.add_argument("--latency-p99-ms", type=float, default=150.0, help="p99 response latency (lognormal)")
+    parser.add_argument("--retry-after-rate", type=float, default=0.0, help="share of sends answered with 429")
+    parser.add_argument("--retry-after", type=int, default=1, help="retry_after for injected 429s, seconds")
+    parser.add_argument("--blocked-chats", default="", help="comma-separated chat ids answered with 403")
+    parser.add_argument("--blocked-rate", type=float, default=0.0, help="share of chats that blocked the bot")
+    parser.add_argument("--chat-rate", type=int, default=1, help="messages per second per chat, 0 disables")
+    parser.add_argument("--group-rate-per-minute", type=int, default=20, help="messages per minute per group")
+    parser.add_argument("--global-rate", type=int, default=30, help="messages per second overall")
+    parser.add_argument("--seed", type=int, default=None)
+
+
+def config_from_args(args: argparse.Namespace) -> FakeTelegramConfig:
+    return FakeTelegramConfig(
+        latency_ms=args.latency_ms,
+        latency_p99_ms=args.latency_p99_ms,
+        retry_after_rate=args.retry_after_rate,
+        retry_after=args.retry_after,
+        blocked_chats=frozenset(int(c) for c in args.blocked_chats.split(",") if c.strip()),
+        blocked_rate=args.blocked_rate,
+        chat_rate=args.chat_rate,
+        group_rate_per_minute=args.group_rate_per_minute,
+        global_rate=args.global_rate,
+        seed=args.seed,
+    )
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Local stand-in for the Telegram Bot API.")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8081)
+    add_config_arguments(parser)
+    args = parser.parse_args()
+
+    api = FakeTelegramApi(config_from_args(args))
+    print(f"Fake Telegram Bot API on http://{args.host}:{args.port} (set TELEGRAM_API_BASE_URL to it)")
+    web.run_app(api.make_app(), host=args.host, port=args.port, print=None)
+
+
+if __name__ == "__main__":
+    main()